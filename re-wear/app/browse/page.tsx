@@ -13,6 +13,7 @@ import { Search, Filter, Star, Heart, ArrowUpDown } from "lucide-react"
 import Link from "next/link"
 import Image from "next/image"
 import { itemsApi, categoriesApi } from "@/lib/api"
+import { itemImageUrl } from "@/lib/utils"
 import { LoadingPage } from "@/components/loading-spinner"
 import { useToast } from "@/hooks/use-toast"
 
@@ -101,7 +102,7 @@ export default function BrowsePage() {
       <div className="aspect-square relative">
         {item.primary_image ? (
           <Image
-            src={`http://localhost:5001/uploads/items/${item.primary_image}`}
+            src={itemImageUrl(item.primary_image, item.primary_image_variants)}
             alt={item.title}
             fill
             className="object-cover group-hover:scale-105 transition-transform duration-300"
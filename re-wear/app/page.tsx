@@ -7,6 +7,7 @@ import Link from "next/link"
 import Image from "next/image"
 import { useEffect, useState } from "react"
 import { itemsApi } from "@/lib/api"
+import { itemImageUrl } from "@/lib/utils"
 
 export default function LandingPage() {
   const [featuredItems, setFeaturedItems] = useState([])
@@ -160,9 +161,9 @@ export default function LandingPage() {
                 {getVisibleItems().map((item: any) => (
                   <Card key={item.id} className="overflow-hidden hover:shadow-lg transition-shadow">
                     <div className="aspect-square relative">
-                      {item.images && item.images.length > 0 ? (
+                      {item.primary_image ? (
                         <Image
-                          src={`http://localhost:5001/uploads/items/${item.images[0]}`}
+                          src={itemImageUrl(item.primary_image, item.primary_image_variants)}
                           alt={item.title}
                           fill
                           className="object-cover"
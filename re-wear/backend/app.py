@@ -1,48 +1,77 @@
-from flask import Flask, request, jsonify, session
+from flask import Flask, Blueprint, current_app, request, jsonify, session, send_from_directory, g
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.orm import selectinload
 from flask_cors import CORS
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
+from werkzeug.security import safe_join
+from werkzeug.http import is_resource_modified
 import os
-from datetime import datetime
+import re
+import mimetypes
+from datetime import datetime, timezone
+from stat import S_ISREG
 import uuid
 from PIL import Image
 import logging
 from functools import wraps
+from search import ItemSearchIndex
+from visual import VisualSearch
+from jobs import JobQueue
+from imaging import generate_derivatives, is_derivative, derivative_name, DERIVATIVE_SIZES, FORMAT_OPTIONS
+from storage import store_blob, collect_garbage
+from counters import BufferedCounter
+from config import configure_database, RoutingSession
+from migrations import migrate
+from pagination import keyset_page, CachedCount, InvalidCursor
+from stats import AdminStats
+from json_provider import FastJSONProvider
+from compression import Compress
+from ledger import PointsLedger, InsufficientPoints
+from cache import ResponseCache
+from principal import PrincipalCache
+from matching import SwapMatcher
+from recommend import FeedRecommender
+from instrumentation import Instrumentation
+from serializers import Serializer, select_projection, ITEM_PROJECTIONS, SWAP_PROJECTIONS, InvalidProjection
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = Flask(__name__)
+# Extensions are bound to the application in create_app()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+cors = CORS(supports_credentials=True, origins=["http://localhost:3000"])
+search_index = ItemSearchIndex()
 
-# Configuration
-app.config['SECRET_KEY'] = 'your-secret-key-change-in-production'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///rewear.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['UPLOAD_FOLDER'] = 'uploads'
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
-app.config['SESSION_PERMANENT'] = False
-app.config['SESSION_TYPE'] = 'filesystem'
+# Dashboard counters, reconciled against the tables every STATS_RECONCILE_INTERVAL seconds
+admin_stats = AdminStats(interval=float(os.environ.get('STATS_RECONCILE_INTERVAL', 600)))
+response_cache = ResponseCache()
+compress = Compress()  # gzip/brotli for JSON bodies over COMPRESS_MIN_SIZE
+visual_search = VisualSearch()
+image_jobs = JobQueue('image-processing', workers=int(os.environ.get('IMAGE_WORKERS', 2)))
+# Per-user feeds, rescored in the background for users whose signals changed
+feed_recommender = FeedRecommender(
+    visual=visual_search,
+    interval=float(os.environ.get('FEED_RECOMPUTE_INTERVAL', 60)),
+    max_age=float(os.environ.get('FEED_MAX_AGE', 6 * 3600))
+)
 
-# Initialize extensions
-db = SQLAlchemy(app)
-CORS(app, supports_credentials=True, origins=["http://localhost:3000"])
-
-# Create upload directories
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-os.makedirs(os.path.join(app.config['UPLOAD_FOLDER'], 'items'), exist_ok=True)
-os.makedirs(os.path.join(app.config['UPLOAD_FOLDER'], 'bills'), exist_ok=True)
-os.makedirs(os.path.join(app.config['UPLOAD_FOLDER'], 'avatars'), exist_ok=True)
+# Routes and error handlers, registered on the application by create_app()
+api = Blueprint('api', __name__)
 
 # Allowed file extensions
 ALLOWED_IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
 ALLOWED_DOCUMENT_EXTENSIONS = {'pdf', 'png', 'jpg', 'jpeg'}
 
+# Stored uploads are named by a random/content hex id, plus an optional derivative suffix
+CONTENT_UNIQUE_NAME = re.compile(r'^[0-9a-f]{32,64}(_(thumb|card|full))?\.[a-z0-9]+$')
+PENDING_SUFFIX = '.pending'
+
 def allowed_file(filename, allowed_extensions):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in allowed_extensions
 
-# Authentication decorator
+# Authentication decorators; both leave the signed-in user in g.current_user
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -51,6 +80,14 @@ def login_required(f):
                 'success': False,
                 'message': 'Authentication required. Please log in.'
             }), 401
+        
+        if principals.current_user() is None:
+            # The account behind this session no longer exists
+            session.clear()
+            return jsonify({
+                'success': False,
+                'message': 'Authentication required. Please log in.'
+            }), 401
         return f(*args, **kwargs)
     return decorated_function
 
@@ -63,7 +100,7 @@ def admin_required(f):
                 'message': 'Authentication required. Please log in.'
             }), 401
         
-        user = User.query.get(session['user_id'])
+        user = principals.current_user()
         if not user or user.role != 'admin':
             return jsonify({
                 'success': False,
@@ -105,7 +142,7 @@ class User(db.Model):
             'location': self.location,
             'phone': self.phone,
             'address': self.address,
-            'created_at': self.created_at.isoformat() if self.created_at else None
+            'created_at': self.created_at
         }
 
 class Category(db.Model):
@@ -124,6 +161,15 @@ class Category(db.Model):
         }
 
 class Item(db.Model):
+    __table_args__ = (
+        # Browse feed, with and without a category filter, newest first
+        db.Index('ix_item_browse', 'status', 'listing_type', 'created_at'),
+        db.Index('ix_item_browse_category', 'status', 'listing_type', 'category_id', 'created_at'),
+        # Moderation queue and admin counts
+        db.Index('ix_item_status_created', 'status', 'created_at'),
+        db.Index('ix_item_user_created', 'user_id', 'created_at'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text, nullable=False)
@@ -140,6 +186,7 @@ class Item(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     views = db.Column(db.Integer, default=0)
     likes = db.Column(db.Integer, default=0)
+    processing_state = db.Column(db.String(20), default='ready')  # processing, ready, failed
     
     # Relationships
     images = db.relationship('ItemImage', backref='item', lazy=True, cascade='all, delete-orphan')
@@ -159,25 +206,78 @@ class Item(db.Model):
             'listing_type': self.listing_type,
             'views': self.views,
             'likes': self.likes,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'processing_state': self.processing_state,
+            'created_at': self.created_at,
             'owner': self.owner.to_dict() if self.owner else None,
             'images': [img.image_path for img in self.images],
+            'image_variants': [img.variants for img in self.images],
             'tags': [tag.tag for tag in self.tags]
         }
 
+    @property
+    def primary_image(self):
+        """Path of the primary image, resolved from the already-loaded images"""
+        for img in self.images:
+            if img.is_primary:
+                return img.image_path
+        return None
+
+    @property
+    def primary_image_variants(self):
+        for img in self.images:
+            if img.is_primary:
+                return img.variants
+        return None
+
+def flush_item_views(counts):
+    """Apply buffered view increments in one executemany UPDATE"""
+    items = Item.__table__
+    db.session.execute(
+        items.update()
+        .where(items.c.id == db.bindparam('item_id'))
+        # Keep updated_at as is: a view is not a modification of the listing
+        .values(views=items.c.views + db.bindparam('delta'), updated_at=items.c.updated_at),
+        [{'item_id': item_id, 'delta': delta} for item_id, delta in counts.items()]
+    )
+    db.session.commit()
+
+view_counter = BufferedCounter(
+    'item-views', flush_item_views,
+    interval=float(os.environ.get('VIEW_FLUSH_INTERVAL', 5)),
+    threshold=int(os.environ.get('VIEW_FLUSH_THRESHOLD', 500))
+)
+
 class ItemImage(db.Model):
+    __table_args__ = (
+        db.Index('ix_item_image_item_primary', 'item_id', 'is_primary'),
+        db.Index('ix_item_image_path', 'image_path'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     item_id = db.Column(db.Integer, db.ForeignKey('item.id'), nullable=False)
     image_path = db.Column(db.String(255), nullable=False)
     is_primary = db.Column(db.Boolean, default=False)
+    variants = db.Column(db.JSON)  # {size: {format: filename}}, set once processed
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class ItemTag(db.Model):
+    __table_args__ = (
+        db.Index('ix_item_tag_item', 'item_id'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     item_id = db.Column(db.Integer, db.ForeignKey('item.id'), nullable=False)
     tag = db.Column(db.String(50), nullable=False)
 
 class SwapRequest(db.Model):
+    __table_args__ = (
+        # Sent/received history, newest first
+        db.Index('ix_swap_request_requester_created', 'requester_id', 'created_at'),
+        db.Index('ix_swap_request_owner_created', 'owner_id', 'created_at'),
+        # Duplicate pending request check
+        db.Index('ix_swap_request_item_requester_status', 'item_id', 'requester_id', 'status'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     item_id = db.Column(db.Integer, db.ForeignKey('item.id'), nullable=False)
     requester_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -203,8 +303,8 @@ class SwapRequest(db.Model):
             'points_offered': self.points_offered,
             'message': self.message,
             'status': self.status,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at,
             'requester': self.requester.to_dict() if self.requester else None,
             'requested_item': self.requested_item.to_dict() if self.requested_item else None,
             'offered_item': self.offered_item.to_dict() if self.offered_item else None
@@ -219,8 +319,64 @@ class Report(db.Model):
     status = db.Column(db.String(20), default='pending')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+class PointsTransaction(db.Model):
+    """Append-only record of every change to User.points; see ledger.py"""
+    __table_args__ = (
+        db.Index('ix_points_transaction_user_created', 'user_id', 'created_at'),
+        # A retried request finds the entry it already made instead of paying twice
+        db.UniqueConstraint('user_id', 'idempotency_key', name='uq_points_transaction_idempotency'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    delta = db.Column(db.Integer, nullable=False)
+    balance_after = db.Column(db.Integer, nullable=False)
+    kind = db.Column(db.String(30), nullable=False)  # opening_balance, welcome_bonus, approval_bonus, redeem, swap
+    item_id = db.Column(db.Integer, db.ForeignKey('item.id'))
+    swap_request_id = db.Column(db.Integer, db.ForeignKey('swap_request.id'))
+    idempotency_key = db.Column(db.String(100))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'delta': self.delta,
+            'balance_after': self.balance_after,
+            'kind': self.kind,
+            'item_id': self.item_id,
+            'swap_request_id': self.swap_request_id,
+            'created_at': self.created_at
+        }
+
+points_ledger = PointsLedger()
+
+# g.current_user, cached per process for PRINCIPAL_CACHE_TTL seconds between requests
+principals = PrincipalCache()
+points_ledger.balance_listeners.append(principals.invalidate_after_commit)
+
+def _is_admin():
+    user = principals.current_user() if 'user_id' in session else None
+    return user is not None and user.role == 'admin'
+
+# Server-Timing headers, slow-query log, admin-only X-Profile and /metrics; see instrumentation.py
+instrumentation = Instrumentation(can_profile=_is_admin)
+
+# Multi-party swap cycles; runs every SWAP_MATCH_INTERVAL seconds when set, see matching.py
+swap_matcher = SwapMatcher(interval=float(os.environ.get('SWAP_MATCH_INTERVAL', 0)))
+
+# Listing payloads are built from column tuples; see serializers.py
+serializer = Serializer(
+    db, item=Item, user=User, category=Category, image=ItemImage, tag=ItemTag, swap_request=SwapRequest
+)
+
+def requested_projection(projections, allowed, default):
+    """Projection chosen by the ?view= and ?fields= query parameters"""
+    return select_projection(
+        projections, allowed, default, request.args.get('view'), request.args.get('fields')
+    )
+
 # Error Handlers
-@app.errorhandler(400)
+@api.app_errorhandler(400)
 def bad_request(error):
     return jsonify({
         'success': False,
@@ -228,7 +384,7 @@ def bad_request(error):
         'message': 'The request could not be understood by the server.'
     }), 400
 
-@app.errorhandler(401)
+@api.app_errorhandler(401)
 def unauthorized(error):
     return jsonify({
         'success': False,
@@ -236,7 +392,7 @@ def unauthorized(error):
         'message': 'Authentication required to access this resource.'
     }), 401
 
-@app.errorhandler(403)
+@api.app_errorhandler(403)
 def forbidden(error):
     return jsonify({
         'success': False,
@@ -244,7 +400,7 @@ def forbidden(error):
         'message': 'You do not have permission to access this resource.'
     }), 403
 
-@app.errorhandler(404)
+@api.app_errorhandler(404)
 def not_found(error):
     return jsonify({
         'success': False,
@@ -252,7 +408,7 @@ def not_found(error):
         'message': 'The requested resource was not found.'
     }), 404
 
-@app.errorhandler(413)
+@api.app_errorhandler(413)
 def file_too_large(error):
     return jsonify({
         'success': False,
@@ -260,7 +416,7 @@ def file_too_large(error):
         'message': 'The uploaded file is too large. Maximum size is 16MB.'
     }), 413
 
-@app.errorhandler(500)
+@api.app_errorhandler(500)
 def internal_error(error):
     db.session.rollback()
     logger.error(f"Internal server error: {str(error)}")
@@ -271,8 +427,12 @@ def internal_error(error):
     }), 500
 
 # Utility Functions
-def save_file(file, folder, max_size=(800, 800)):
-    """Save uploaded file with proper validation and processing"""
+def save_file(file, folder):
+    """Validate and store an upload as-is; resizing happens in process_image().
+    
+    Uploads are content-addressed, so re-uploading an already stored file
+    reuses it. Returns (filename, created), created being False in that case.
+    """
     try:
         if not file or file.filename == '':
             raise ValueError("No file provided")
@@ -281,33 +441,112 @@ def save_file(file, folder, max_size=(800, 800)):
         if not filename:
             raise ValueError("Invalid filename")
         
-        # Generate unique filename
+        # Store under the content hash of the bytes
         file_ext = filename.rsplit('.', 1)[1].lower()
-        unique_filename = f"{uuid.uuid4().hex}.{file_ext}"
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], folder, unique_filename)
+        folder_path = os.path.join(current_app.app.config['UPLOAD_FOLDER'], folder)
+        unique_filename, created = store_blob(file.stream, folder_path, file_ext)
         
-        # Save file
-        file.save(file_path)
+        # Flag new images until process_image() has rewritten them, so they aren't cached as final
+        if created and file_ext in ALLOWED_IMAGE_EXTENSIONS:
+            open(os.path.join(folder_path, unique_filename + PENDING_SUFFIX), 'w').close()
         
-        # Process image if it's an image file
-        if file_ext in ALLOWED_IMAGE_EXTENSIONS:
-            try:
-                with Image.open(file_path) as img:
-                    # Convert to RGB if necessary
-                    if img.mode in ('RGBA', 'P'):
-                        img = img.convert('RGB')
-                    
-                    # Resize if too large
-                    img.thumbnail(max_size, Image.Resampling.LANCZOS)
-                    img.save(file_path, optimize=True, quality=85)
-            except Exception as e:
-                logger.warning(f"Image processing failed: {str(e)}")
-        
-        return unique_filename
+        return unique_filename, created
     except Exception as e:
         logger.error(f"File save error: {str(e)}")
         raise
 
+def process_image(folder, filename, max_size=(800, 800)):
+    """Convert and downscale a stored image in place"""
+    file_ext = filename.rsplit('.', 1)[1].lower()
+    if file_ext not in ALLOWED_IMAGE_EXTENSIONS:
+        return
+    
+    file_path = os.path.join(current_app.app.config['UPLOAD_FOLDER'], folder, filename)
+    tmp_path = f"{file_path}.{uuid.uuid4().hex}.tmp"
+    try:
+        with Image.open(file_path) as img:
+            # Convert to RGB if necessary
+            if img.mode in ('RGBA', 'P'):
+                img = img.convert('RGB')
+            
+            # Resize if too large
+            img.thumbnail(max_size, Image.Resampling.LANCZOS)
+            
+            # Write beside the original and swap it in, so readers never see a partial file
+            img.save(tmp_path, format=Image.registered_extensions()[f'.{file_ext}'], optimize=True, quality=85)
+        os.replace(tmp_path, file_path)
+    except Exception as e:
+        logger.warning(f"Image processing failed: {str(e)}")
+    finally:
+        if os.path.exists(file_path + PENDING_SUFFIX):
+            os.remove(file_path + PENDING_SUFFIX)
+
+@image_jobs.task
+def process_item_uploads(item_id, images, bill=None):
+    """Background job: resize an item's uploads, then mark the item ready"""
+    item = Item.query.get(item_id)
+    if not item or item.processing_state == 'ready':
+        return
+    
+    try:
+        for filename in images:
+            # Derivatives are cut from the full-resolution upload before it is downscaled
+            try:
+                variants = generate_derivatives(
+                    os.path.join(current_app.app.config['UPLOAD_FOLDER'], 'items', filename)
+                )
+                # Every listing that shares this blob shares its derivatives
+                ItemImage.query.filter_by(image_path=filename).update(
+                    {'variants': variants}
+                )
+            except Exception as e:
+                logger.warning(f"Derivative generation failed for {filename}: {str(e)}")
+            process_image('items', filename)
+        if bill:
+            process_image('bills', bill, max_size=(1200, 1200))
+        item.processing_state = 'ready'
+    except Exception as e:
+        logger.error(f"Processing uploads for item {item_id} failed: {str(e)}")
+        item.processing_state = 'failed'
+    db.session.commit()
+    if item.status == 'approved':
+        # Auto-approved listings are already on cached browse pages as 'processing'
+        response_cache.invalidate('items')
+    
+    # Embed the final, resized photos for visual search
+    visual_search.embed_async(images)
+
+def collect_unreferenced_uploads(grace_seconds=3600):
+    """Delete stored uploads no ItemImage or Item.bill_path refers to any more"""
+    upload_folder = current_app.app.config['UPLOAD_FOLDER']
+    
+    def is_blob(filename):
+        return CONTENT_UNIQUE_NAME.match(filename) is not None and not is_derivative(filename)
+    
+    def related_files(folder):
+        def related(filename):
+            paths = [os.path.join(upload_folder, folder, filename + PENDING_SUFFIX)]
+            for size in DERIVATIVE_SIZES:
+                for fmt in FORMAT_OPTIONS:
+                    paths.append(os.path.join(upload_folder, folder, derivative_name(filename, size, fmt)))
+            return paths
+        return related
+    
+    image_refs = {path for (path,) in db.session.query(ItemImage.image_path).distinct()}
+    bill_refs = {
+        path for (path,) in db.session.query(Item.bill_path).filter(Item.bill_path.isnot(None)).distinct()
+    }
+    
+    deleted = collect_garbage(
+        os.path.join(upload_folder, 'items'), image_refs, grace_seconds,
+        is_blob=is_blob, related=related_files('items')
+    )
+    deleted += collect_garbage(
+        os.path.join(upload_folder, 'bills'), bill_refs, grace_seconds,
+        is_blob=is_blob, related=related_files('bills')
+    )
+    return deleted
+
 def calculate_item_points(condition, category, listing_type):
     """Calculate points for an item based on condition and category"""
     # Donations are always 0 points
@@ -338,7 +577,7 @@ def calculate_item_points(condition, category, listing_type):
     return int(base * multiplier)
 
 # Authentication Routes
-@app.route('/api/auth/register', methods=['POST'])
+@api.route('/api/auth/register', methods=['POST'])
 def register():
     try:
         data = request.get_json()
@@ -384,6 +623,9 @@ def register():
         )
         
         db.session.add(user)
+        db.session.flush()
+        points_ledger.record(user.id, user.points, 'welcome_bonus', user.points)
+        admin_stats.adjust(total_users=1)
         db.session.commit()
         
         # Create session
@@ -406,7 +648,7 @@ def register():
             'message': 'Registration failed. Please try again.'
         }), 500
 
-@app.route('/api/auth/login', methods=['POST'])
+@api.route('/api/auth/login', methods=['POST'])
 def login():
     try:
         data = request.get_json()
@@ -453,7 +695,7 @@ def login():
             'message': 'Login failed. Please try again.'
         }), 500
 
-@app.route('/api/auth/logout', methods=['POST'])
+@api.route('/api/auth/logout', methods=['POST'])
 @login_required
 def logout():
     try:
@@ -469,21 +711,13 @@ def logout():
             'message': 'Logout failed.'
         }), 500
 
-@app.route('/api/auth/me', methods=['GET'])
+@api.route('/api/auth/me', methods=['GET'])
 @login_required
 def get_current_user():
     try:
-        user = User.query.get(session['user_id'])
-        if not user:
-            session.clear()
-            return jsonify({
-                'success': False,
-                'message': 'User not found.'
-            }), 404
-        
         return jsonify({
             'success': True,
-            'user': user.to_dict()
+            'user': g.current_user.to_dict()
         })
     except Exception as e:
         logger.error(f"Get current user error: {str(e)}")
@@ -493,18 +727,12 @@ def get_current_user():
         }), 500
 
 # User Routes
-@app.route('/api/user/profile', methods=['GET'])
+@api.route('/api/user/profile', methods=['GET'])
 @login_required
 def get_profile():
     try:
         user_id = session['user_id']
-        user = User.query.get(user_id)
-        
-        if not user:
-            return jsonify({
-                'success': False,
-                'message': 'User not found.'
-            }), 404
+        user = g.current_user
         
         # Get user statistics
         total_items = Item.query.filter_by(user_id=user_id).count()
@@ -530,18 +758,12 @@ def get_profile():
             'message': 'Failed to fetch profile.'
         }), 500
 
-@app.route('/api/user/profile', methods=['PUT'])
+@api.route('/api/user/profile', methods=['PUT'])
 @login_required
 def update_profile():
     try:
         user_id = session['user_id']
-        user = User.query.get(user_id)
-        
-        if not user:
-            return jsonify({
-                'success': False,
-                'message': 'User not found.'
-            }), 404
+        user = g.current_user
         
         data = request.get_json()
         
@@ -558,6 +780,7 @@ def update_profile():
             user.address = data['address'].strip()
         
         db.session.commit()
+        principals.invalidate(user_id)
         
         return jsonify({
             'success': True,
@@ -573,8 +796,23 @@ def update_profile():
             'message': 'Failed to update profile.'
         }), 500
 
+# Response cache keys; None means the request is not served from the cache
+def anonymous_browse_key():
+    """Key for the first, unfiltered page of a browse listing seen by a signed-out visitor"""
+    if 'user_id' in session:
+        return None
+    args = {k: v for k, v in request.args.items() if v not in ('', 'All')}
+    page = args.pop('page', '1')
+    status = args.pop('status', 'approved')
+    listing_type = args.pop('listing_type', 'swap')
+    per_page = args.pop('per_page', '20')
+    if args or page != '1' or status != 'approved':
+        return None
+    return f"{listing_type}:{per_page}"
+
 # Category Routes
-@app.route('/api/categories', methods=['GET'])
+@api.route('/api/categories', methods=['GET'])
+@response_cache.cached('categories', ttl=300)
 def get_categories():
     try:
         categories = Category.query.all()
@@ -590,7 +828,7 @@ def get_categories():
         }), 500
 
 # Item Routes
-@app.route('/api/items', methods=['POST'])
+@api.route('/api/items', methods=['POST'])
 @login_required
 def create_item():
     try:
@@ -615,7 +853,8 @@ def create_item():
         
         # Get or create category
         category = Category.query.filter_by(name=category_name).first()
-        if not category:
+        new_category = category is None
+        if new_category:
             category = Category(name=category_name)
             db.session.add(category)
             db.session.flush()
@@ -640,8 +879,9 @@ def create_item():
         db.session.add(item)
         db.session.flush()
         
-        # Handle file uploads
-        uploaded_files = []
+        # Handle file uploads; only newly stored files need processing
+        new_images = []
+        new_bill = None
         
         # Handle item images
         if 'images' in request.files:
@@ -655,14 +895,21 @@ def create_item():
             for i, file in enumerate(files):
                 if file and allowed_file(file.filename, ALLOWED_IMAGE_EXTENSIONS):
                     try:
-                        filename = save_file(file, 'items')
+                        filename, created = save_file(file, 'items')
                         item_image = ItemImage(
                             item_id=item.id,
                             image_path=filename,
                             is_primary=(i == 0)
                         )
+                        if created:
+                            new_images.append(filename)
+                        else:
+                            # Re-uploaded photo: reuse the derivatives already cut for it
+                            processed = ItemImage.query.filter(
+                                ItemImage.image_path == filename, ItemImage.variants.isnot(None)
+                            ).first()
+                            item_image.variants = processed.variants if processed else None
                         db.session.add(item_image)
-                        uploaded_files.append(filename)
                     except Exception as e:
                         logger.error(f"Image upload error: {str(e)}")
                         return jsonify({
@@ -675,9 +922,10 @@ def create_item():
             bill_file = request.files['bill']
             if bill_file and allowed_file(bill_file.filename, ALLOWED_DOCUMENT_EXTENSIONS):
                 try:
-                    bill_filename = save_file(bill_file, 'bills', max_size=(1200, 1200))
+                    bill_filename, created = save_file(bill_file, 'bills')
                     item.bill_path = bill_filename
-                    uploaded_files.append(bill_filename)
+                    if created:
+                        new_bill = bill_filename
                 except Exception as e:
                     logger.error(f"Bill upload error: {str(e)}")
                     return jsonify({
@@ -691,8 +939,28 @@ def create_item():
                 item_tag = ItemTag(item_id=item.id, tag=tag.strip().lower())
                 db.session.add(item_tag)
         
+        # Auto-approved donations are searchable straight away
+        if item.status == 'approved':
+            search_index.index_item(item)
+        admin_stats.item_status_changed(None, item.status)
+        feed_recommender.mark_dirty(user_id)
+        
+        # Resizing happens in the background; the raw uploads are already on disk
+        if new_images or new_bill:
+            item.processing_state = 'processing'
+        
         db.session.commit()
         
+        if new_category:
+            response_cache.invalidate('categories')
+        if item.status == 'approved':
+            response_cache.invalidate('items')
+        
+        if new_images or new_bill:
+            image_jobs.enqueue(
+                'process_item_uploads', item_id=item.id, images=new_images, bill=new_bill
+            )
+        
         logger.info(f"New item created: {title} by user {user_id} (type: {listing_type})")
         
         message = 'Item submitted successfully! It will be reviewed by our team.' if listing_type == 'swap' else 'Item donated successfully! It is now available for others to claim.'
@@ -705,18 +973,15 @@ def create_item():
                 'title': item.title,
                 'status': item.status,
                 'points': item.points,
-                'listing_type': item.listing_type
+                'listing_type': item.listing_type,
+                'processing_state': item.processing_state
             }
         }), 201
         
     except Exception as e:
         db.session.rollback()
-        # Clean up uploaded files on error
-        for filename in uploaded_files:
-            try:
-                os.remove(os.path.join(app.config['UPLOAD_FOLDER'], 'items', filename))
-            except:
-                pass
+        # Stored files are not removed here: another listing may already share the
+        # same content. Unreferenced ones are reclaimed by collect_unreferenced_uploads().
         
         logger.error(f"Create item error: {str(e)}")
         return jsonify({
@@ -724,7 +989,25 @@ def create_item():
             'message': 'Failed to create item. Please try again.'
         }), 500
 
-@app.route('/api/items', methods=['GET'])
+# Totals for cursor-paginated listings are cached briefly rather than counted per page
+listing_counts = CachedCount(ttl=int(os.environ.get('LISTING_COUNT_TTL', 60)))
+
+def cursor_pagination_args(default_limit=20):
+    """(cursor, limit) if the request opted into cursor pagination, else None.
+    
+    Opt in with ?paginate=cursor for the first page, then pass the returned
+    next_cursor/prev_cursor back as ?cursor=.
+    """
+    if 'cursor' not in request.args and request.args.get('paginate') != 'cursor':
+        return None
+    limit = min(max(request.args.get('limit', default_limit, type=int), 1), 100)
+    return request.args.get('cursor') or None, limit
+
+def wants_total():
+    return request.args.get('include_total', '').lower() in ('1', 'true', 'yes')
+
+@api.route('/api/items', methods=['GET'])
+@response_cache.cached('items', anonymous_browse_key)
 def get_items():
     try:
         # Get query parameters
@@ -737,6 +1020,9 @@ def get_items():
         status = request.args.get('status', 'approved')
         listing_type = request.args.get('listing_type', 'swap')
         
+        cursor_args = cursor_pagination_args(default_limit=per_page)
+        projection = requested_projection(ITEM_PROJECTIONS, ('card', 'detail'), 'card')
+        
         # Build query
         query = Item.query.filter_by(status=status, listing_type=listing_type)
         
@@ -751,38 +1037,46 @@ def get_items():
         if size and size != 'All':
             query = query.filter_by(size=size)
         
-        if search:
-            search_term = f"%{search}%"
-            query = query.filter(
-                db.or_(
-                    Item.title.ilike(search_term),
-                    Item.description.ilike(search_term)
-                )
-            )
-        
-        # Order by creation date (newest first)
-        query = query.order_by(Item.created_at.desc())
+        # The full-text index only covers approved items
+        search_hits = None
+        if search and status == 'approved' and search_index.ready:
+            search_hits = search_index.ranked_hits(search)
         
-        # Paginate
-        pagination = query.paginate(
-            page=page, per_page=per_page, error_out=False
-        )
-        
-        items = []
-        for item in pagination.items:
-            # Get primary image
-            primary_image = ItemImage.query.filter_by(
-                item_id=item.id, is_primary=True
-            ).first()
+        if search_hits is not None:
+            query = query.join(search_hits, search_hits.c.item_id == Item.id)
+            # Best match first, newest first among equal ranks. Cursor pages
+            # are keyed on (created_at, id), so they list matches newest first.
+            query = query.order_by(search_hits.c.rank, Item.created_at.desc())
+        else:
+            if search:
+                search_term = f"%{search}%"
+                query = query.filter(
+                    db.or_(
+                        Item.title.ilike(search_term),
+                        Item.description.ilike(search_term),
+                        Item.tags.any(ItemTag.tag.ilike(search_term))
+                    )
+                )
             
-            item_data = item.to_dict()
-            item_data['primary_image'] = primary_image.image_path if primary_image else None
-            items.append(item_data)
-        
-        return jsonify({
-            'success': True,
-            'items': items,
-            'pagination': {
+            # Order by creation date (newest first)
+            query = query.order_by(Item.created_at.desc())
+        
+        # Select only the projected columns; images and tags are batched per page
+        query = serializer.item_query(query, projection)
+        
+        if cursor_args:
+            cursor, limit = cursor_args
+            page_items, page_info = keyset_page(query, Item, limit, cursor)
+            if wants_total():
+                key = ('items', status, listing_type, category, condition, size, search)
+                page_info['total'] = listing_counts.get(key, query.order_by(None).count)
+        else:
+            # Paginate
+            pagination = query.paginate(
+                page=page, per_page=per_page, error_out=False
+            )
+            page_items = pagination.items
+            page_info = {
                 'page': pagination.page,
                 'pages': pagination.pages,
                 'per_page': pagination.per_page,
@@ -790,8 +1084,18 @@ def get_items():
                 'has_next': pagination.has_next,
                 'has_prev': pagination.has_prev
             }
+        
+        return jsonify({
+            'success': True,
+            'items': serializer.items(page_items, projection),
+            'pagination': page_info
         })
         
+    except (InvalidCursor, InvalidProjection) as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
     except Exception as e:
         logger.error(f"Get items error: {str(e)}")
         return jsonify({
@@ -799,26 +1103,83 @@ def get_items():
             'message': 'Failed to fetch items.'
         }), 500
 
-@app.route('/api/items/<int:item_id>', methods=['GET'])
+@api.route('/api/feed', methods=['GET'])
+@login_required
+def get_feed():
+    try:
+        user_id = session['user_id']
+        offset = max(request.args.get('offset', 0, type=int), 0)
+        limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+        projection = requested_projection(ITEM_PROJECTIONS, ('card', 'detail'), 'card')
+        
+        # Precomputed by recommend.py; scored on the spot only the first time
+        feed = feed_recommender.feed(user_id)
+        if feed is None:
+            # Use what was just computed; on a replica the new row may not be visible yet
+            feed = feed_recommender.recompute_users([user_id])[user_id]
+        item_ids, computed_at = feed
+        
+        # Items taken since the feed was computed are dropped from the page
+        page_ids = item_ids[offset:offset + limit]
+        rows = serializer.item_query(
+            Item.query.filter(Item.id.in_(page_ids), Item.status == 'approved'), projection
+        ).all()
+        position = {item_id: i for i, item_id in enumerate(page_ids)}
+        rows.sort(key=lambda row: position[row.id])
+        
+        return jsonify({
+            'success': True,
+            'items': serializer.items(rows, projection),
+            'computed_at': computed_at,
+            'pagination': {
+                'offset': offset,
+                'limit': limit,
+                'total': len(item_ids),
+                'has_next': offset + limit < len(item_ids)
+            }
+        })
+        
+    except InvalidProjection as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
+    except Exception as e:
+        logger.error(f"Get feed error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': 'Failed to fetch feed.'
+        }), 500
+
+@api.route('/api/items/<int:item_id>', methods=['GET'])
 def get_item(item_id):
     try:
-        item = Item.query.get(item_id)
+        projection = requested_projection(ITEM_PROJECTIONS, ('card', 'detail'), 'detail')
+        row = serializer.item_query(Item.query.filter(Item.id == item_id), projection).first()
         
-        if not item:
+        if not row:
             return jsonify({
                 'success': False,
                 'message': 'Item not found.'
             }), 404
         
-        # Increment view count
-        item.views += 1
-        db.session.commit()
+        # Views are buffered and written in batches, keeping this read-only
+        view_counter.incr(item_id)
+        
+        item_data = serializer.items([row], projection)[0]
+        if 'views' in item_data:
+            item_data['views'] = (item_data['views'] or 0) + view_counter.pending(item_id)
         
         return jsonify({
             'success': True,
-            'item': item.to_dict()
+            'item': item_data
         })
         
+    except InvalidProjection as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
     except Exception as e:
         logger.error(f"Get item error: {str(e)}")
         return jsonify({
@@ -826,18 +1187,38 @@ def get_item(item_id):
             'message': 'Failed to fetch item details.'
         }), 500
 
-@app.route('/api/items/user', methods=['GET'])
+@api.route('/api/items/user', methods=['GET'])
 @login_required
 def get_user_items():
     try:
         user_id = session['user_id']
-        items = Item.query.filter_by(user_id=user_id).order_by(Item.created_at.desc()).all()
+        projection = requested_projection(ITEM_PROJECTIONS, ('card', 'detail'), 'detail')
+        query = serializer.item_query(Item.query.filter_by(user_id=user_id), projection)
+        
+        cursor_args = cursor_pagination_args()
+        if not cursor_args:
+            rows = query.order_by(Item.created_at.desc()).all()
+            return jsonify({
+                'success': True,
+                'items': serializer.items(rows, projection)
+            })
+        
+        cursor, limit = cursor_args
+        rows, page_info = keyset_page(query, Item, limit, cursor)
+        if wants_total():
+            page_info['total'] = listing_counts.get(('user_items', user_id), query.order_by(None).count)
         
         return jsonify({
             'success': True,
-            'items': [item.to_dict() for item in items]
+            'items': serializer.items(rows, projection),
+            'pagination': page_info
         })
         
+    except (InvalidCursor, InvalidProjection) as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
     except Exception as e:
         logger.error(f"Get user items error: {str(e)}")
         return jsonify({
@@ -845,13 +1226,115 @@ def get_user_items():
             'message': 'Failed to fetch your items.'
         }), 500
 
+def visually_similar_items(matches, exclude_item_id=None, limit=10):
+    """Map (image filename, score) matches to distinct approved items, best first"""
+    scores = {}
+    filenames = [filename for filename, _ in matches]
+    images = ItemImage.query.filter(ItemImage.image_path.in_(filenames)).all()
+    item_ids = {img.image_path: img.item_id for img in images}
+    
+    for filename, score in matches:
+        item_id = item_ids.get(filename)
+        if item_id and item_id != exclude_item_id and item_id not in scores:
+            scores[item_id] = score
+    
+    projection = ITEM_PROJECTIONS['card']
+    rows = serializer.item_query(
+        Item.query.filter(Item.id.in_(list(scores)), Item.status == 'approved'), projection
+    ).all()
+    rows.sort(key=lambda row: scores[row.id], reverse=True)
+    
+    results = serializer.items(rows[:limit], projection)
+    for item_data in results:
+        item_data['similarity'] = round(scores[item_data['id']], 4)
+    return results
+
+@api.route('/api/items/<int:item_id>/similar', methods=['GET'])
+def get_similar_items(item_id):
+    try:
+        if not visual_search.enabled:
+            return jsonify({
+                'success': False,
+                'message': 'Visual search is not available.'
+            }), 503
+        
+        limit = min(request.args.get('limit', 8, type=int), 50)
+        
+        item = Item.query.options(selectinload(Item.images)).get(item_id)
+        if not item:
+            return jsonify({
+                'success': False,
+                'message': 'Item not found.'
+            }), 404
+        
+        if not item.primary_image:
+            return jsonify({
+                'success': True,
+                'items': []
+            })
+        
+        # Over-fetch: several matches may be photos of the same or unavailable items
+        matches = visual_search.similar_to_image(item.primary_image, top_k=limit * 4)
+        
+        return jsonify({
+            'success': True,
+            'items': visually_similar_items(matches, exclude_item_id=item.id, limit=limit)
+        })
+        
+    except Exception as e:
+        logger.error(f"Get similar items error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': 'Failed to fetch similar items.'
+        }), 500
+
+@api.route('/api/search/by-image', methods=['POST'])
+def search_by_image():
+    temp_path = None
+    try:
+        if not visual_search.enabled:
+            return jsonify({
+                'success': False,
+                'message': 'Visual search is not available.'
+            }), 503
+        
+        file = request.files.get('image')
+        if not file or not allowed_file(file.filename, ALLOWED_IMAGE_EXTENSIONS):
+            return jsonify({
+                'success': False,
+                'message': 'Please upload a valid image.'
+            }), 400
+        
+        limit = min(request.args.get('limit', 8, type=int), 50)
+        
+        # Query images are only needed for the duration of the request
+        file_ext = secure_filename(file.filename).rsplit('.', 1)[1].lower()
+        temp_path = os.path.join(current_app.app.config['UPLOAD_FOLDER'], 'tmp', f"{uuid.uuid4().hex}.{file_ext}")
+        file.save(temp_path)
+        
+        matches = visual_search.similar_to_file(temp_path, top_k=limit * 4)
+        
+        return jsonify({
+            'success': True,
+            'items': visually_similar_items(matches, limit=limit)
+        })
+        
+    except Exception as e:
+        logger.error(f"Search by image error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': 'Image search failed. Please try again.'
+        }), 500
+    finally:
+        if temp_path and os.path.exists(temp_path):
+            os.remove(temp_path)
+
 # Donation claim route
-@app.route('/api/items/<int:item_id>/claim', methods=['POST'])
+@api.route('/api/items/<int:item_id>/claim', methods=['POST'])
 @login_required
 def claim_donation_item(item_id):
     try:
         user_id = session['user_id']
-        user = User.query.get(user_id)
         
         item = Item.query.get(item_id)
         if not item:
@@ -878,8 +1361,18 @@ def claim_donation_item(item_id):
                 'message': 'This item is not available for claiming.'
             }), 400
         
-        # Process claim
-        item.status = 'claimed'
+        # Process claim; the conditional update lets exactly one claimant win
+        if not points_ledger.transition(Item.__table__, item.id, 'approved', 'claimed'):
+            db.session.rollback()
+            return jsonify({
+                'success': False,
+                'message': 'This item has already been claimed.'
+            }), 409
+        
+        admin_stats.item_status_changed('approved', 'claimed')
+        admin_stats.adjust(total_swaps=1)
+        search_index.remove_item(item.id)
+        feed_recommender.mark_dirty(user_id)
         
         # Create a swap request record for tracking
         swap_request = SwapRequest(
@@ -893,6 +1386,7 @@ def claim_donation_item(item_id):
         
         db.session.add(swap_request)
         db.session.commit()
+        response_cache.invalidate('items')
         
         logger.info(f"Donation claimed: {item_id} by user {user_id}")
         
@@ -915,30 +1409,26 @@ def claim_donation_item(item_id):
         }), 500
 
 # Admin Routes
-@app.route('/api/admin/items/pending', methods=['GET'])
+@api.route('/api/admin/items/pending', methods=['GET'])
 @admin_required
 def get_pending_items():
     try:
-        items = Item.query.filter_by(status='pending').order_by(Item.created_at.desc()).all()
-        
-        pending_items = []
-        for item in items:
-            # Get primary image
-            primary_image = ItemImage.query.filter_by(
-                item_id=item.id, is_primary=True
-            ).first()
-            
-            item_data = item.to_dict()
-            item_data['primary_image'] = primary_image.image_path if primary_image else None
-            item_data['has_bill'] = bool(item.bill_path)
-            item_data['bill_path'] = item.bill_path  # Add bill path for viewing
-            pending_items.append(item_data)
+        # The admin view adds the bill and the owner's contact details for review
+        projection = requested_projection(ITEM_PROJECTIONS, ('card', 'detail', 'admin'), 'admin')
+        rows = serializer.item_query(
+            Item.query.filter_by(status='pending'), projection
+        ).order_by(Item.created_at.desc()).all()
         
         return jsonify({
             'success': True,
-            'items': pending_items
+            'items': serializer.items(rows, projection)
         })
         
+    except InvalidProjection as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
     except Exception as e:
         logger.error(f"Get pending items error: {str(e)}")
         return jsonify({
@@ -946,7 +1436,7 @@ def get_pending_items():
             'message': 'Failed to fetch pending items.'
         }), 500
 
-@app.route('/api/admin/items/<int:item_id>/approve', methods=['POST'])
+@api.route('/api/admin/items/<int:item_id>/approve', methods=['POST'])
 @admin_required
 def approve_item(item_id):
     try:
@@ -963,14 +1453,22 @@ def approve_item(item_id):
                 'message': 'Item is not pending approval.'
             }), 400
         
-        item.status = 'approved'
-        item.updated_at = datetime.utcnow()
+        if not points_ledger.transition(Item.__table__, item.id, 'pending', 'approved'):
+            db.session.rollback()
+            return jsonify({
+                'success': False,
+                'message': 'Item is not pending approval.'
+            }), 400
+        admin_stats.item_status_changed('pending', 'approved')
         
         # Award points to the user for approved swaps
         if item.listing_type == 'swap':
-            item.owner.points += 5  # Bonus for approved item
+            points_ledger.credit(item.user_id, 5, 'approval_bonus', item_id=item.id)  # Bonus for approved item
+        
+        search_index.index_item(item)
         
         db.session.commit()
+        response_cache.invalidate('items')
         
         logger.info(f"Item approved: {item.title} (ID: {item.id}) by admin {session['user_id']}")
         
@@ -987,7 +1485,7 @@ def approve_item(item_id):
             'message': 'Failed to approve item.'
         }), 500
 
-@app.route('/api/admin/items/<int:item_id>/reject', methods=['POST'])
+@api.route('/api/admin/items/<int:item_id>/reject', methods=['POST'])
 @admin_required
 def reject_item(item_id):
     try:
@@ -1007,10 +1505,13 @@ def reject_item(item_id):
                 'message': 'Item is not pending approval.'
             }), 400
         
+        admin_stats.item_status_changed(item.status, 'rejected')
         item.status = 'rejected'
         item.updated_at = datetime.utcnow()
+        search_index.remove_item(item.id)
         
         db.session.commit()
+        response_cache.invalidate('items')
         
         logger.info(f"Item rejected: {item.title} (ID: {item.id}) by admin {session['user_id']}")
         
@@ -1027,17 +1528,12 @@ def reject_item(item_id):
             'message': 'Failed to reject item.'
         }), 500
 
-@app.route('/api/admin/stats', methods=['GET'])
+@api.route('/api/admin/stats', methods=['GET'])
 @admin_required
 def get_admin_stats():
     try:
-        stats = {
-            'pending_items': Item.query.filter_by(status='pending').count(),
-            'approved_items': Item.query.filter_by(status='approved').count(),
-            'total_users': User.query.filter_by(is_active=True).count(),
-            'total_swaps': SwapRequest.query.filter_by(status='completed').count(),
-            'reports': Report.query.filter_by(status='pending').count()
-        }
+        # Maintained by the routes that change them; see stats.py
+        stats = admin_stats.read()
         
         return jsonify({
             'success': True,
@@ -1051,14 +1547,108 @@ def get_admin_stats():
             'message': 'Failed to fetch admin statistics.'
         }), 500
 
+@api.route('/api/admin/cache-stats', methods=['GET'])
+@admin_required
+def get_cache_stats():
+    return jsonify({
+        'success': True,
+        'cache': response_cache.metrics()
+    })
+
+@api.route('/api/admin/swap-cycles', methods=['GET'])
+@admin_required
+def get_swap_cycles():
+    return jsonify({
+        'success': True,
+        'run': swap_matcher.last_run
+    })
+
+@api.route('/api/admin/swap-cycles', methods=['POST'])
+@admin_required
+def run_swap_matching():
+    try:
+        data = request.get_json(silent=True) or {}
+        max_length = data.get('max_length')
+        max_imbalance = data.get('max_imbalance')
+        if max_length is not None and (not isinstance(max_length, int) or not 2 <= max_length <= 6):
+            return jsonify({
+                'success': False,
+                'message': 'max_length must be an integer from 2 to 6.'
+            }), 400
+        if max_imbalance is not None and (not isinstance(max_imbalance, int) or max_imbalance < 0):
+            return jsonify({
+                'success': False,
+                'message': 'max_imbalance must be a non-negative integer.'
+            }), 400
+        
+        run = swap_matcher.run(max_length=max_length, max_imbalance=max_imbalance)
+        
+        return jsonify({
+            'success': True,
+            'run': run
+        })
+        
+    except Exception as e:
+        logger.error(f"Swap matching error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': 'Failed to run swap matching.'
+        }), 500
+
 # File serving route
-@app.route('/uploads/<path:filename>')
+@api.route('/uploads/<path:filename>')
 def uploaded_file(filename):
-    from flask import send_from_directory
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    # Resolved the same way send_from_directory() resolves a relative folder
+    upload_folder = os.path.join(current_app.app.root_path, current_app.app.config['UPLOAD_FOLDER'])
+    file_path = safe_join(upload_folder, filename)
+    if file_path is None or filename.endswith(('.tmp', PENDING_SUFFIX)):
+        return not_found(None)
+    
+    # Bills are personal documents: cacheable by the browser, never by shared proxies
+    scope = 'private' if filename.startswith('bills/') else 'public'
+    immutable = (
+        CONTENT_UNIQUE_NAME.match(os.path.basename(filename)) is not None
+        and not os.path.exists(file_path + PENDING_SUFFIX)
+    )
+    
+    if immutable:
+        cache_control = f"{scope}, max-age={current_app.config['UPLOADS_CACHE_MAX_AGE']}, immutable"
+    else:
+        cache_control = f"{scope}, no-cache"
+    
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return not_found(None)
+    if not S_ISREG(stat.st_mode):
+        return not_found(None)
+    # Blobs are rewritten in place once processed, so validators are checked
+    # against the file as it is now; a 304 is answered without opening it
+    etag = f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+    last_modified = datetime.fromtimestamp(stat.st_mtime, timezone.utc)
+    if (request.if_none_match or request.if_modified_since) and not is_resource_modified(
+        request.environ, etag=etag, last_modified=last_modified
+    ):
+        response = current_app.app.response_class(status=304)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = cache_control
+        return response
+    
+    accel_prefix = current_app.app.config['UPLOADS_ACCEL_REDIRECT']
+    if accel_prefix:
+        response = current_app.app.response_class(
+            mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        )
+        response.headers['X-Accel-Redirect'] = accel_prefix.rstrip('/') + '/' + filename
+    else:
+        # conditional=True gives ETag/Last-Modified validation and Range support
+        response = send_from_directory(upload_folder, filename, conditional=True, etag=etag)
+    
+    response.headers['Cache-Control'] = cache_control
+    return response
 
 # Swap Request Routes
-@app.route('/api/swap-requests', methods=['POST'])
+@api.route('/api/swap-requests', methods=['POST'])
 @login_required
 def create_swap_request():
     try:
@@ -1104,7 +1694,7 @@ def create_swap_request():
             }), 400
         
         # Check if user has enough points for points-based swap
-        user = User.query.get(user_id)
+        user = g.current_user
         if request_type == 'points' and user.points < item.points:
             return jsonify({
                 'success': False,
@@ -1135,6 +1725,7 @@ def create_swap_request():
         )
         
         db.session.add(swap_request)
+        feed_recommender.mark_dirty(user_id)
         db.session.commit()
         
         logger.info(f"Swap request created: {swap_request.id} by user {user_id}")
@@ -1153,12 +1744,13 @@ def create_swap_request():
             'message': 'Failed to create swap request.'
         }), 500
 
-@app.route('/api/swap-requests/user', methods=['GET'])
+@api.route('/api/swap-requests/user', methods=['GET'])
 @login_required
 def get_user_swap_requests():
     try:
         user_id = session['user_id']
         request_type = request.args.get('type', 'all')  # 'sent', 'received', 'all'
+        projection = requested_projection(SWAP_PROJECTIONS, ('swap-summary',), 'swap-summary')
         
         query = SwapRequest.query
         
@@ -1174,13 +1766,33 @@ def get_user_swap_requests():
                 )
             )
         
-        swap_requests = query.order_by(SwapRequest.created_at.desc()).all()
+        query = serializer.swap_query(query, projection)
+        
+        cursor_args = cursor_pagination_args()
+        if not cursor_args:
+            rows = query.order_by(SwapRequest.created_at.desc()).all()
+            return jsonify({
+                'success': True,
+                'swap_requests': serializer.swap_requests(rows, projection)
+            })
+        
+        cursor, limit = cursor_args
+        rows, page_info = keyset_page(query, SwapRequest, limit, cursor)
+        if wants_total():
+            key = ('swap_requests', user_id, request_type)
+            page_info['total'] = listing_counts.get(key, query.order_by(None).count)
         
         return jsonify({
             'success': True,
-            'swap_requests': [req.to_dict() for req in swap_requests]
+            'swap_requests': serializer.swap_requests(rows, projection),
+            'pagination': page_info
         })
         
+    except (InvalidCursor, InvalidProjection) as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
     except Exception as e:
         logger.error(f"Get user swap requests error: {str(e)}")
         return jsonify({
@@ -1188,7 +1800,28 @@ def get_user_swap_requests():
             'message': 'Failed to fetch swap requests.'
         }), 500
 
-@app.route('/api/swap-requests/<int:request_id>/accept', methods=['POST'])
+def accepted_swap_response(swap_request):
+    # Return contact information for coordination
+    requester = swap_request.requester
+    owner = swap_request.owner_user
+    return jsonify({
+        'success': True,
+        'message': 'Swap request accepted successfully!',
+        'contact_info': {
+            'requester': {
+                'name': requester.name,
+                'location': requester.location,
+                'phone': requester.phone
+            },
+            'owner': {
+                'name': owner.name,
+                'location': owner.location,
+                'phone': owner.phone
+            }
+        }
+    })
+
+@api.route('/api/swap-requests/<int:request_id>/accept', methods=['POST'])
 @login_required
 def accept_swap_request(request_id):
     try:
@@ -1207,57 +1840,61 @@ def accept_swap_request(request_id):
                 'message': 'You can only accept requests for your own items.'
             }), 403
         
+        # Accepting is idempotent: a retry after success gets the same answer
+        if swap_request.status == 'accepted':
+            return accepted_swap_response(swap_request)
+        
         if swap_request.status != 'pending':
             return jsonify({
                 'success': False,
                 'message': 'This request has already been processed.'
             }), 400
         
-        # Process the swap
+        # Process the swap. Each step is a conditional update, so a request
+        # accepted twice, or two requests for the same item, have one winner.
         item = swap_request.requested_item
-        requester = swap_request.requester
-        owner = User.query.get(swap_request.owner_id)
+        
+        if not points_ledger.transition(SwapRequest.__table__, swap_request.id, 'pending', 'accepted'):
+            db.session.rollback()
+            swap_request = SwapRequest.query.get(request_id)
+            if swap_request.status == 'accepted':
+                return accepted_swap_response(swap_request)
+            return jsonify({
+                'success': False,
+                'message': 'This request has already been processed.'
+            }), 409
+        
+        if not points_ledger.transition(Item.__table__, item.id, 'approved', 'swapped'):
+            db.session.rollback()
+            return jsonify({
+                'success': False,
+                'message': 'This item is no longer available.'
+            }), 409
         
         if swap_request.points_offered > 0:
             # Points-based swap
-            if requester.points < swap_request.points_offered:
+            try:
+                points_ledger.transfer(
+                    swap_request.requester_id, swap_request.owner_id, swap_request.points_offered,
+                    'swap', item_id=item.id, swap_request_id=swap_request.id
+                )
+            except InsufficientPoints:
+                db.session.rollback()
                 return jsonify({
                     'success': False,
                     'message': 'Requester has insufficient points.'
                 }), 400
-            
-            # Transfer points
-            requester.points -= swap_request.points_offered
-            owner.points += swap_request.points_offered
         
-        # Update swap request status
-        swap_request.status = 'accepted'
-        swap_request.updated_at = datetime.utcnow()
-        
-        # Mark item as swapped
-        item.status = 'swapped'
+        admin_stats.item_status_changed('approved', 'swapped')
+        search_index.remove_item(item.id)
+        feed_recommender.mark_dirty(swap_request.requester_id)
         
         db.session.commit()
+        response_cache.invalidate('items')
         
         logger.info(f"Swap request accepted: {request_id}")
         
-        # Return contact information for coordination
-        return jsonify({
-            'success': True,
-            'message': 'Swap request accepted successfully!',
-            'contact_info': {
-                'requester': {
-                    'name': requester.name,
-                    'location': requester.location,
-                    'phone': requester.phone
-                },
-                'owner': {
-                    'name': owner.name,
-                    'location': owner.location,
-                    'phone': owner.phone
-                }
-            }
-        })
+        return accepted_swap_response(swap_request)
         
     except Exception as e:
         db.session.rollback()
@@ -1267,7 +1904,7 @@ def accept_swap_request(request_id):
             'message': 'Failed to accept swap request.'
         }), 500
 
-@app.route('/api/swap-requests/<int:request_id>/reject', methods=['POST'])
+@api.route('/api/swap-requests/<int:request_id>/reject', methods=['POST'])
 @login_required
 def reject_swap_request(request_id):
     try:
@@ -1312,13 +1949,29 @@ def reject_swap_request(request_id):
             'message': 'Failed to reject swap request.'
         }), 500
 
+def redemption_response(item, remaining_points):
+    return jsonify({
+        'success': True,
+        'message': f'Item redeemed successfully for {item.points} points!',
+        'remaining_points': remaining_points,
+        'contact_info': {
+            'owner': {
+                'name': item.owner.name,
+                'location': item.owner.location,
+                'phone': item.owner.phone
+            }
+        }
+    })
+
 # Points redemption route
-@app.route('/api/items/<int:item_id>/redeem', methods=['POST'])
+@api.route('/api/items/<int:item_id>/redeem', methods=['POST'])
 @login_required
 def redeem_item_with_points(item_id):
     try:
         user_id = session['user_id']
-        user = User.query.get(user_id)
+        user = g.current_user
+        # Clients may send an Idempotency-Key so a retried redemption is not charged twice
+        idempotency_key = request.headers.get('Idempotency-Key')
         
         item = Item.query.get(item_id)
         if not item:
@@ -1327,6 +1980,15 @@ def redeem_item_with_points(item_id):
                 'message': 'Item not found.'
             }), 404
         
+        previous = points_ledger.find(user_id, idempotency_key)
+        if previous is not None:
+            if previous.item_id != item_id:
+                return jsonify({
+                    'success': False,
+                    'message': 'This Idempotency-Key was already used for another request.'
+                }), 422
+            return redemption_response(item, previous.balance_after)
+        
         if item.user_id == user_id:
             return jsonify({
                 'success': False,
@@ -1351,10 +2013,18 @@ def redeem_item_with_points(item_id):
                 'message': f'Insufficient points. You need {item.points} points but have {user.points}.'
             }), 400
         
-        # Process redemption
-        user.points -= item.points
-        item.owner.points += item.points
-        item.status = 'swapped'
+        # Process redemption: the item changes hands only if it is still
+        # approved, and points move only if the balance still covers them
+        if not points_ledger.transition(Item.__table__, item.id, 'approved', 'swapped'):
+            db.session.rollback()
+            # Lost the race, possibly to an earlier attempt of this same request
+            previous = points_ledger.find(user_id, idempotency_key)
+            if previous is not None and previous.item_id == item_id:
+                return redemption_response(item, previous.balance_after)
+            return jsonify({
+                'success': False,
+                'message': 'This item is no longer available.'
+            }), 409
         
         # Create a swap request record for tracking
         swap_request = SwapRequest(
@@ -1365,24 +2035,32 @@ def redeem_item_with_points(item_id):
             message='Direct redemption with points',
             status='completed'
         )
-        
         db.session.add(swap_request)
+        db.session.flush()
+        
+        try:
+            remaining_points = points_ledger.transfer(
+                user_id, item.user_id, item.points, 'redeem', idempotency_key,
+                item_id=item.id, swap_request_id=swap_request.id
+            )
+        except InsufficientPoints:
+            db.session.rollback()
+            return jsonify({
+                'success': False,
+                'message': f'Insufficient points. You need {item.points} points.'
+            }), 400
+        
+        admin_stats.item_status_changed('approved', 'swapped')
+        admin_stats.adjust(total_swaps=1)
+        search_index.remove_item(item.id)
+        feed_recommender.mark_dirty(user_id)
+        
         db.session.commit()
+        response_cache.invalidate('items')
         
         logger.info(f"Item redeemed: {item_id} by user {user_id} for {item.points} points")
         
-        return jsonify({
-            'success': True,
-            'message': f'Item redeemed successfully for {item.points} points!',
-            'remaining_points': user.points,
-            'contact_info': {
-                'owner': {
-                    'name': item.owner.name,
-                    'location': item.owner.location,
-                    'phone': item.owner.phone
-                }
-            }
-        })
+        return redemption_response(item, remaining_points)
         
     except Exception as e:
         db.session.rollback()
@@ -1393,7 +2071,7 @@ def redeem_item_with_points(item_id):
         }), 500
 
 # Messages/Chat routes
-@app.route('/api/messages', methods=['POST'])
+@api.route('/api/messages', methods=['POST'])
 @login_required
 def send_message():
     try:
@@ -1435,14 +2113,80 @@ def send_message():
             'message': 'Failed to send message.'
         }), 500
 
+def create_app(config=None):
+    """Build the application, with settings from the environment and then config.
+
+    Extensions and routes live at module level and are bound to the app
+    here. Their state (caches, counters, job queues) is per process, so
+    build one application per process.
+    """
+    app = Flask(__name__)
+    # orjson when installed; datetimes are serialized as ISO 8601 by the provider
+    app.json = FastJSONProvider(app)
+    
+    # Configuration
+    app.config['SECRET_KEY'] = 'your-secret-key-change-in-production'
+    configure_database(app)  # DATABASE_URL, DATABASE_REPLICA_URL, DB_POOL_* from the environment
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['UPLOAD_FOLDER'] = 'uploads'
+    app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+    app.config['SESSION_PERMANENT'] = False
+    app.config['SESSION_TYPE'] = 'filesystem'
+    app.config['UPLOADS_CACHE_MAX_AGE'] = 365 * 24 * 3600  # Content-unique uploads never change
+    # Let a local reverse proxy serve upload bytes: X-Sendfile (Apache/lighttpd) or
+    # X-Accel-Redirect to an internal nginx location such as '/protected-uploads/'
+    app.config['USE_X_SENDFILE'] = os.environ.get('UPLOADS_X_SENDFILE') == '1'
+    app.config['UPLOADS_ACCEL_REDIRECT'] = os.environ.get('UPLOADS_ACCEL_REDIRECT')
+    # Anonymous browse responses; set a Redis URL to share them between processes
+    app.config['RESPONSE_CACHE_TTL'] = int(os.environ.get('RESPONSE_CACHE_TTL', 60))
+    app.config['RESPONSE_CACHE_REDIS_URL'] = os.environ.get('RESPONSE_CACHE_REDIS_URL')
+    # Compress JSON responses of at least this many bytes when the client accepts it
+    app.config['COMPRESS_MIN_SIZE'] = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+    app.config['PRINCIPAL_CACHE_TTL'] = float(os.environ.get('PRINCIPAL_CACHE_TTL', 5))
+    app.config['INSTRUMENT_SLOW_QUERY_MS'] = float(os.environ.get('INSTRUMENT_SLOW_QUERY_MS', 200))
+    app.config['INSTRUMENT_SLOW_REQUEST_MS'] = float(os.environ.get('INSTRUMENT_SLOW_REQUEST_MS', 1000))
+    app.config['INSTRUMENT_PROFILE_SAMPLE_RATE'] = float(os.environ.get('INSTRUMENT_PROFILE_SAMPLE_RATE', 0))
+    app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+    app.config['SWAP_CYCLE_MAX_LENGTH'] = int(os.environ.get('SWAP_CYCLE_MAX_LENGTH', 3))
+    if os.environ.get('SWAP_CYCLE_MAX_IMBALANCE'):
+        app.config['SWAP_CYCLE_MAX_IMBALANCE'] = int(os.environ['SWAP_CYCLE_MAX_IMBALANCE'])
+    if config:
+        app.config.update(config)
+    
+    # Initialize extensions
+    db.init_app(app)
+    cors.init_app(app)
+    search_index.init_app(app, db)
+    admin_stats.init_app(app, db)
+    response_cache.init_app(app)
+    compress.init_app(app)
+    visual_search.init_app(app)
+    image_jobs.init_app(app, journal_dir=os.path.join(app.instance_path, 'jobs'))
+    feed_recommender.init_app(app, db, visual=visual_search)
+    view_counter.init_app(app)
+    points_ledger.init_app(app, db, users=User.__table__, transactions=PointsTransaction.__table__)
+    principals.init_app(app, db, User)
+    instrumentation.init_app(app, db)
+    swap_matcher.init_app(app, db, swap_requests=SwapRequest.__table__, items=Item.__table__)
+    app.register_blueprint(api)
+    
+    # Create upload directories
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    os.makedirs(os.path.join(app.config['UPLOAD_FOLDER'], 'items'), exist_ok=True)
+    os.makedirs(os.path.join(app.config['UPLOAD_FOLDER'], 'bills'), exist_ok=True)
+    os.makedirs(os.path.join(app.config['UPLOAD_FOLDER'], 'avatars'), exist_ok=True)
+    os.makedirs(os.path.join(app.config['UPLOAD_FOLDER'], 'tmp'), exist_ok=True)
+    return app
+
 # Initialize database
-def create_tables():
+def create_tables(app):
     with app.app_context():
-        # Drop all tables first to avoid foreign key issues
-        db.drop_all()
+        # Bring the schema up to date; existing data is kept
+        migrate(db, app)
         
-        # Create all tables
-        db.create_all()
+        # Sample data is only seeded into an empty database
+        if User.query.first() is not None:
+            return
         
         # Create default categories
         default_categories = [
@@ -1532,8 +2276,12 @@ def create_tables():
                 db.session.add(item)
         
         db.session.commit()
+        search_index.rebuild()
+        admin_stats.reconcile()
+        points_ledger.open_balances()
         print("Database initialized with sample data including donations!")
 
 if __name__ == '__main__':
-    create_tables()
+    app = create_app()
+    create_tables(app)
     app.run(debug=True, host='0.0.0.0', port=5000)
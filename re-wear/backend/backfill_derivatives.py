@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Generate thumb/card/full derivatives for item photos uploaded before the
+derivative pipeline existed, and record them on their ItemImage rows.
+
+    python backfill_derivatives.py [--workers N] [--force]
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from app import create_app, db, allowed_file, ItemImage, ALLOWED_IMAGE_EXTENSIONS, CONTENT_UNIQUE_NAME, PENDING_SUFFIX
+from imaging import generate_derivatives, is_derivative
+
+
+def build(path):
+    return os.path.basename(path), generate_derivatives(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill item image derivatives")
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--force', action='store_true', help='Regenerate images that already have derivatives')
+    args = parser.parse_args()
+
+    app = create_app()
+    folder = os.path.join(app.config['UPLOAD_FOLDER'], 'items')
+    with app.app_context():
+        done = set()
+        if not args.force:
+            done = {
+                path for (path,) in db.session.query(ItemImage.image_path)
+                .filter(ItemImage.variants.isnot(None))
+            }
+
+        # Stored photos only: no .pending markers, upload temp files or derivatives.
+        # Photos still marked pending get their derivatives from the processing job.
+        names = set(os.listdir(folder))
+        pending = [
+            os.path.join(folder, name) for name in sorted(names)
+            if CONTENT_UNIQUE_NAME.match(name) and allowed_file(name, ALLOWED_IMAGE_EXTENSIONS)
+            and not is_derivative(name) and name + PENDING_SUFFIX not in names and name not in done
+        ]
+        print(f"Backfilling {len(pending)} images with {args.workers} workers...")
+
+        started = time.perf_counter()
+        completed = failed = 0
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            futures = [pool.submit(build, path) for path in pending]
+            for future in as_completed(futures):
+                try:
+                    filename, variants = future.result()
+                except Exception as e:
+                    failed += 1
+                    print(f"Failed: {str(e)}")
+                    continue
+                ItemImage.query.filter_by(image_path=filename).update({'variants': variants})
+                completed += 1
+                if completed % 100 == 0:
+                    db.session.commit()
+                    print(f"  {completed}/{len(pending)}")
+        db.session.commit()
+
+        elapsed = time.perf_counter() - started
+        print(f"Done: {completed} images ({failed} failed) in {elapsed:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,552 @@
+#!/usr/bin/env python3
+"""
+API benchmark suite: seeds a synthetic dataset, drives a scenario mix of
+requests and reports latency percentiles, throughput and SQL statements per
+endpoint.
+
+    # In-process, through the Flask test client
+    python benchmarks/bench_api.py run --mix browse --requests 2000 --out results/browse.json
+
+    # Over HTTP against a real local (threaded werkzeug) server
+    python benchmarks/bench_api.py run --mode server --mix mixed --duration 30 --concurrency 8
+
+    # Regressions between two saved runs (exits 1 past --threshold)
+    python benchmarks/bench_api.py compare results/before.json results/after.json
+
+Each run uses a fresh SQLite database and upload folder in a temporary
+directory unless --database-url is given. Mixes: browse, write, admin, mixed.
+"""
+import argparse
+import http.client
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.append(BACKEND_DIR)
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+SQL_HEADER = 'X-Bench-SQL'
+SQL_TIME_HEADER = 'X-Bench-SQL-Ms'
+
+
+# Operations: each returns (label, method, path, body) for a user, or None to skip.
+# body is None, {'json': ...} or {'form': ..., 'files': ...}
+def op_browse(rng, data, pool):
+    params = f"?page={rng.randint(1, 5)}"
+    if rng.random() < 0.3:
+        params += f"&category={rng.choice(data.categories)}"
+    if rng.random() < 0.5:
+        params += f"&listing_type={rng.choice(('swap', 'donation'))}"
+    return 'GET /api/items', 'GET', f"/api/items{params}", None
+
+
+def op_search(rng, data, pool):
+    return 'GET /api/items?search', 'GET', f"/api/items?search={rng.choice(data.words)}", None
+
+
+def op_detail(rng, data, pool):
+    return 'GET /api/items/<id>', 'GET', f"/api/items/{rng.choice(data.approved_items)}", None
+
+
+def op_categories(rng, data, pool):
+    return 'GET /api/categories', 'GET', '/api/categories', None
+
+
+def op_feed(rng, data, pool):
+    return 'GET /api/feed', 'GET', '/api/feed?limit=20', None
+
+
+def op_my_requests(rng, data, pool):
+    return 'GET /api/swap-requests/user', 'GET', '/api/swap-requests/user', None
+
+
+def op_create_item(rng, data, pool):
+    form = {
+        'title': ' '.join(rng.sample(data.words, 3)).title(), 'description': 'Benchmark listing',
+        'category': rng.choice(data.categories), 'type': 'Casual', 'size': 'M',
+        'condition': 'Good', 'listing_type': 'swap', 'tags[]': rng.sample(data.words, 2)
+    }
+    return 'POST /api/items', 'POST', '/api/items', {'form': form, 'files': {'images': pool.image(rng)}}
+
+
+def op_swap_request(rng, data, pool):
+    body = {'json': {'item_id': rng.choice(data.approved_items), 'type': 'points', 'message': 'Swap?'}}
+    return 'POST /api/swap-requests', 'POST', '/api/swap-requests', body
+
+
+def op_redeem(rng, data, pool):
+    return 'POST /api/items/<id>/redeem', 'POST', f"/api/items/{rng.choice(data.approved_items)}/redeem", None
+
+
+def op_accept(rng, data, pool):
+    taken = pool.take('pending_requests')
+    if taken is None:
+        return None
+    request_id, owner_id = taken
+    return ('POST /api/swap-requests/<id>/accept', 'POST', f"/api/swap-requests/{request_id}/accept",
+            {'as_user': owner_id})
+
+
+def op_admin_stats(rng, data, pool):
+    return 'GET /api/admin/stats', 'GET', '/api/admin/stats', {'as_admin': True}
+
+
+def op_admin_pending(rng, data, pool):
+    return 'GET /api/admin/items/pending', 'GET', '/api/admin/items/pending', {'as_admin': True}
+
+
+def op_approve(rng, data, pool):
+    item_id = pool.take('pending_items')
+    if item_id is None:
+        return None
+    return ('POST /api/admin/items/<id>/approve', 'POST', f"/api/admin/items/{item_id}/approve",
+            {'as_admin': True})
+
+
+MIXES = {
+    'browse': [(40, op_browse), (25, op_detail), (15, op_search), (10, op_categories), (10, op_feed)],
+    'write': [(20, op_create_item), (30, op_swap_request), (20, op_redeem), (20, op_accept), (10, op_approve)],
+    'admin': [(40, op_admin_stats), (30, op_admin_pending), (30, op_approve)],
+    'mixed': [(30, op_browse), (20, op_detail), (10, op_search), (5, op_categories), (10, op_feed),
+              (5, op_my_requests), (6, op_swap_request), (4, op_redeem), (4, op_accept),
+              (3, op_create_item), (2, op_admin_stats), (1, op_approve)],
+}
+
+
+class Pool:
+    """Shared, consumable parts of the dataset (each pending request is accepted once)"""
+
+    def __init__(self, data, rng):
+        self._lock = threading.Lock()
+        self._items = {
+            'pending_requests': rng.sample(data.pending_requests, len(data.pending_requests)),
+            'pending_items': rng.sample(data.pending_items, len(data.pending_items)),
+        }
+        from synthetic import jpeg_bytes
+
+        self._images = [jpeg_bytes(rng, (320, 320)) for _ in range(8)]
+
+    def take(self, name):
+        with self._lock:
+            return self._items[name].pop() if self._items[name] else None
+
+    def image(self, rng):
+        return ('upload.jpg', rng.choice(self._images))
+
+
+def install_sql_counter(app, db):
+    """Report the SQL statements each request ran in response headers"""
+    from flask import g, has_request_context
+    from sqlalchemy import event
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if has_request_context():
+            g.bench_sql = g.get('bench_sql', 0) + 1
+            conn.info.setdefault('bench_started', []).append(time.perf_counter())
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get('bench_started')
+        if started and has_request_context():
+            g.bench_sql_time = g.get('bench_sql_time', 0.0) + time.perf_counter() - started.pop()
+
+    with app.app_context():
+        for engine in db.engines.values():
+            event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', after_cursor_execute)
+
+    @app.after_request
+    def sql_headers(response):
+        response.headers[SQL_HEADER] = str(g.get('bench_sql', 0))
+        response.headers[SQL_TIME_HEADER] = f"{g.get('bench_sql_time', 0.0) * 1000:.3f}"
+        return response
+
+
+class ClientDriver:
+    """Requests through app.test_client(); one client (cookie jar) per user"""
+
+    def __init__(self, app):
+        self.app = app
+        self._clients = threading.local()
+
+    def _client(self, user_id):
+        clients = self._clients.__dict__.setdefault('by_user', {})
+        if user_id not in clients:
+            client = self.app.test_client()
+            with client.session_transaction() as sess:
+                sess['user_id'] = user_id
+            clients[user_id] = client
+        return clients[user_id]
+
+    def request(self, user_id, method, path, body):
+        kwargs = {}
+        if body and 'json' in body:
+            kwargs['json'] = body['json']
+        elif body and 'form' in body:
+            form = dict(body['form'])
+            for field, (filename, content) in body['files'].items():
+                form[field] = (io.BytesIO(content), filename)
+            kwargs['data'] = form
+            kwargs['content_type'] = 'multipart/form-data'
+        response = self._client(user_id).open(path, method=method, **kwargs)
+        response.get_data()
+        return response.status_code, response.headers
+
+
+class ServerDriver:
+    """Requests over HTTP with one keep-alive connection per thread.
+
+    Session cookies are signed locally with the app's secret key, as the
+    test client does, so the password hashing in /api/auth/login is not part
+    of any timing. The target server must share that key.
+    """
+
+    def __init__(self, app, host, port):
+        self.host = host
+        self.port = port
+        self._cookie_name = app.config['SESSION_COOKIE_NAME']
+        self._signer = app.session_interface.get_signing_serializer(app)
+        self._cookies = {}
+        self._local = threading.local()
+
+    def _connection(self):
+        if getattr(self._local, 'conn', None) is None:
+            self._local.conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+        return self._local.conn
+
+    def _send(self, method, path, body=b'', headers=None):
+        for attempt in (0, 1):
+            conn = self._connection()
+            try:
+                conn.request(method, path, body=body, headers=headers or {})
+                response = conn.getresponse()
+                response.read()
+                return response
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                self._local.conn = None
+                if attempt:
+                    raise
+
+    def _cookie(self, user_id):
+        if user_id not in self._cookies:
+            self._cookies[user_id] = f"{self._cookie_name}={self._signer.dumps({'user_id': user_id})}"
+        return self._cookies[user_id]
+
+    def request(self, user_id, method, path, body):
+        from werkzeug.test import encode_multipart
+
+        headers = {'Cookie': self._cookie(user_id), 'Accept-Encoding': 'gzip'}
+        payload = b''
+        if body and 'json' in body:
+            payload = json.dumps(body['json']).encode()
+            headers['Content-Type'] = 'application/json'
+        elif body and 'form' in body:
+            from werkzeug.datastructures import FileStorage, MultiDict
+
+            values = MultiDict()
+            for key, value in body['form'].items():
+                for item in (value if isinstance(value, list) else [value]):
+                    values.add(key, item)
+            for field, (filename, content) in body['files'].items():
+                values.add(field, FileStorage(io.BytesIO(content), filename=filename, content_type='image/jpeg'))
+            boundary, payload = encode_multipart(values)
+            headers['Content-Type'] = f"multipart/form-data; boundary={boundary}"
+        response = self._send(method, path, payload, headers)
+        return response.status, response.headers
+
+
+def start_local_server(app):
+    from werkzeug.serving import make_server
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, name='bench-server', daemon=True)
+    thread.start()
+    return server
+
+
+def worker(driver, data, pool, ops, weights, deadline, budget, seed, results, lock):
+    rng = random.Random(seed)
+    local = defaultdict(lambda: {'latencies': [], 'sql': [], 'sql_ms': [], 'statuses': Counter()})
+    while time.monotonic() < deadline and budget.take():
+        op = rng.choices(ops, weights=weights)[0]
+        planned = op(rng, data, pool)
+        if planned is None:
+            continue
+        label, method, path, body = planned
+        user_id = rng.choice(data.users)
+        if body and body.get('as_admin'):
+            user_id, body = rng.choice(data.admins), None
+        elif body and 'as_user' in body:
+            user_id, body = body['as_user'], None
+        start = time.perf_counter()
+        try:
+            status, headers = driver.request(user_id, method, path, body)
+        except Exception as e:
+            local[label]['statuses'][f"error: {type(e).__name__}"] += 1
+            continue
+        elapsed = time.perf_counter() - start
+        stats = local[label]
+        stats['latencies'].append(elapsed)
+        stats['statuses'][status] += 1
+        if headers.get(SQL_HEADER) is not None:
+            stats['sql'].append(int(headers.get(SQL_HEADER)))
+            stats['sql_ms'].append(float(headers.get(SQL_TIME_HEADER) or 0))
+    with lock:
+        for label, stats in local.items():
+            merged = results[label]
+            merged['latencies'].extend(stats['latencies'])
+            merged['sql'].extend(stats['sql'])
+            merged['sql_ms'].extend(stats['sql_ms'])
+            merged['statuses'].update(stats['statuses'])
+
+
+class Budget:
+    def __init__(self, total):
+        self.remaining = total
+        self._lock = threading.Lock()
+
+    def take(self):
+        if self.remaining is None:
+            return True
+        with self._lock:
+            if self.remaining <= 0:
+                return False
+            self.remaining -= 1
+            return True
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(int(len(values) * q), len(values) - 1)] if values else None
+
+
+def summarize(label_stats, elapsed):
+    endpoints = {}
+    all_latencies = []
+    for label, stats in sorted(label_stats.items()):
+        latencies = stats['latencies']
+        all_latencies.extend(latencies)
+        server_errors = sum(n for status, n in stats['statuses'].items()
+                            if not isinstance(status, int) or status >= 500)
+        endpoints[label] = {
+            'requests': len(latencies),
+            'throughput': round(len(latencies) / elapsed, 2),
+            'p50_ms': _ms(percentile(latencies, 0.50)),
+            'p95_ms': _ms(percentile(latencies, 0.95)),
+            'p99_ms': _ms(percentile(latencies, 0.99)),
+            'mean_ms': _ms(sum(latencies) / len(latencies)) if latencies else None,
+            'sql_mean': round(sum(stats['sql']) / len(stats['sql']), 2) if stats['sql'] else None,
+            'sql_max': max(stats['sql']) if stats['sql'] else None,
+            'sql_ms_mean': round(sum(stats['sql_ms']) / len(stats['sql_ms']), 3) if stats['sql_ms'] else None,
+            'errors': server_errors,
+            'statuses': {str(status): n for status, n in sorted(stats['statuses'].items(), key=str)}
+        }
+    overall = {
+        'requests': len(all_latencies),
+        'elapsed_s': round(elapsed, 3),
+        'throughput': round(len(all_latencies) / elapsed, 2) if elapsed else None,
+        'p50_ms': _ms(percentile(all_latencies, 0.50)),
+        'p95_ms': _ms(percentile(all_latencies, 0.95)),
+        'p99_ms': _ms(percentile(all_latencies, 0.99)),
+        'errors': sum(e['errors'] for e in endpoints.values())
+    }
+    return overall, endpoints
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 3) if seconds is not None else None
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(result):
+    overall = result['overall']
+    print(f"\n{result['meta']['mix']} mix, {result['meta']['mode']} mode, "
+          f"concurrency {result['meta']['concurrency']}: {overall['requests']} requests in "
+          f"{overall['elapsed_s']}s ({overall['throughput']} req/s), "
+          f"p50 {overall['p50_ms']} / p95 {overall['p95_ms']} / p99 {overall['p99_ms']} ms, "
+          f"{overall['errors']} errors")
+    print(f"{'endpoint':<40}{'n':>7}{'req/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'sql':>7}{'sql ms':>8}  statuses")
+    for label, e in result['endpoints'].items():
+        statuses = ' '.join(f"{status}:{n}" for status, n in e['statuses'].items())
+        print(f"{label:<40}{e['requests']:>7}{e['throughput']:>9}{_fmt(e['p50_ms']):>9}{_fmt(e['p95_ms']):>9}"
+              f"{_fmt(e['p99_ms']):>9}{_fmt(e['sql_mean']):>7}{_fmt(e['sql_ms_mean']):>8}  {statuses}")
+
+
+def _fmt(value):
+    return '-' if value is None else f"{value:.1f}"
+
+
+def run(args):
+    tmp = tempfile.TemporaryDirectory()
+    os.environ['DATABASE_URL'] = args.database_url or f"sqlite:///{os.path.join(tmp.name, 'bench.db')}"
+    for name, value in (('STATS_RECONCILE_INTERVAL', '0'), ('FEED_RECOMPUTE_INTERVAL', '0'),
+                        ('SWAP_MATCH_INTERVAL', '0')):
+        os.environ.setdefault(name, value)
+    # Uploads are written relative to the working directory
+    os.chdir(tmp.name)
+
+    from app import create_app, create_tables, db, image_jobs
+    from synthetic import seed
+
+    app = create_app()
+    create_tables(app)
+    start = time.perf_counter()
+    data = seed(app, users=args.users, items=args.items, requests=args.swap_requests,
+                      reports=args.reports, seed=args.seed)
+    print(f"Seeded {args.users} users, {args.items} items, {len(data.pending_requests)} pending "
+          f"requests in {time.perf_counter() - start:.1f}s")
+    install_sql_counter(app, db)
+
+    server = None
+    if args.mode == 'client':
+        driver = ClientDriver(app)
+    elif args.url:
+        host, _, port = args.url.replace('http://', '').partition(':')
+        driver = ServerDriver(app, host, int(port or 80))
+    else:
+        server = start_local_server(app)
+        driver = ServerDriver(app, '127.0.0.1', server.server_port)
+
+    rng = random.Random(args.seed)
+    pool = Pool(data, rng)
+    ops, weights = zip(*[(op, weight) for weight, op in MIXES[args.mix]])
+    results = defaultdict(lambda: {'latencies': [], 'sql': [], 'sql_ms': [], 'statuses': Counter()})
+    lock = threading.Lock()
+    budget = Budget(args.requests if not args.duration else None)
+    deadline = time.monotonic() + (args.duration or 10 ** 9)
+
+    threads = [
+        threading.Thread(target=worker, args=(driver, data, pool, ops, weights, deadline, budget,
+                                              args.seed + i, results, lock))
+        for i in range(args.concurrency)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    if server is not None:
+        server.shutdown()
+    # Let queued image processing finish so nothing is left half-done in the journal
+    image_jobs.join(timeout=60)
+
+    overall, endpoints = summarize(results, elapsed)
+    result = {
+        'meta': {
+            'revision': git_revision(), 'timestamp': datetime.utcnow().isoformat(),
+            'mode': args.mode, 'mix': args.mix, 'concurrency': args.concurrency,
+            'dataset': {'users': args.users, 'items': args.items, 'swap_requests': args.swap_requests,
+                        'reports': args.reports, 'seed': args.seed},
+            'python': platform.python_version(), 'platform': platform.platform(),
+            'database': 'sqlite' if os.environ['DATABASE_URL'].startswith('sqlite') else 'other'
+        },
+        'overall': overall,
+        'endpoints': endpoints
+    }
+    print_report(result)
+    if args.out:
+        out = os.path.abspath(os.path.join(args.cwd, args.out))
+        os.makedirs(os.path.dirname(out), exist_ok=True)
+        with open(out, 'w') as f:
+            json.dump(result, f, indent=2)
+        print(f"\nWrote {out}")
+    os.chdir(args.cwd)
+    tmp.cleanup()
+    return result
+
+
+def compare(args):
+    with open(args.baseline) as f:
+        before = json.load(f)
+    with open(args.candidate) as f:
+        after = json.load(f)
+    print(f"{before['meta'].get('revision')} -> {after['meta'].get('revision')} "
+          f"({after['meta']['mix']} mix, {after['meta']['mode']} mode)")
+    regressions = []
+
+    def row(label, old, new):
+        cells = []
+        for metric, higher_is_better in (('throughput', True), ('p50_ms', False), ('p95_ms', False),
+                                         ('p99_ms', False), ('sql_mean', False)):
+            a, b = old.get(metric), new.get(metric)
+            if a is None or b is None or a == 0:
+                cells.append(f"{'-':>16}")
+                continue
+            change = (b - a) / a
+            worse = change < -args.threshold if higher_is_better else change > args.threshold
+            # Statement counts barely vary between runs, so half a statement more is a regression
+            if metric == 'sql_mean':
+                worse = b - a >= 0.5
+            if worse:
+                regressions.append(f"{label} {metric}: {a} -> {b} ({change:+.0%})")
+            cells.append(f"{b:>8.1f} {change:>+6.0%}{'!' if worse else ' '}")
+        print(f"{label:<40}" + ''.join(cells))
+
+    print(f"{'endpoint':<40}" + ''.join(f"{name:>16}" for name in ('req/s', 'p50 ms', 'p95 ms', 'p99 ms', 'sql')))
+    row('overall', before['overall'], after['overall'])
+    for label in sorted(set(before['endpoints']) | set(after['endpoints'])):
+        if label in before['endpoints'] and label in after['endpoints']:
+            row(label, before['endpoints'][label], after['endpoints'][label])
+    if regressions:
+        print(f"\n{len(regressions)} regressions over {args.threshold:.0%}:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    print("\nNo regressions")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ReWear API benchmark suite")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='Seed a dataset and run a scenario mix')
+    run_parser.add_argument('--mode', choices=('client', 'server'), default='client')
+    run_parser.add_argument('--url', help='Benchmark an already running server instead (server mode)')
+    run_parser.add_argument('--mix', choices=sorted(MIXES), default='mixed')
+    run_parser.add_argument('--requests', type=int, default=2000, help='Total requests (ignored with --duration)')
+    run_parser.add_argument('--duration', type=float, help='Run for this many seconds instead')
+    run_parser.add_argument('--concurrency', type=int, default=4)
+    run_parser.add_argument('--users', type=int, default=500)
+    run_parser.add_argument('--items', type=int, default=5000)
+    run_parser.add_argument('--swap-requests', type=int, default=2000)
+    run_parser.add_argument('--reports', type=int, default=100)
+    run_parser.add_argument('--seed', type=int, default=42)
+    run_parser.add_argument('--database-url', help='Use this (empty) database instead of a temporary SQLite file')
+    run_parser.add_argument('--out', help='Write the results as JSON to this path')
+
+    compare_parser = commands.add_parser('compare', help='Compare two saved runs')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('candidate')
+    compare_parser.add_argument('--threshold', type=float, default=0.10,
+                                help='Relative change that counts as a regression')
+
+    args = parser.parse_args()
+    args.cwd = os.getcwd()
+    if args.command == 'run':
+        run(args)
+    else:
+        sys.exit(compare(args))
+
+
+if __name__ == '__main__':
+    main()
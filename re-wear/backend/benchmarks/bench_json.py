@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+JSON encoding and compression cost for get_items()-shaped payloads.
+
+Compares the stdlib provider (Flask's default settings, sorted keys) with
+json_provider.FastJSONProvider, then the size/time trade-off of each
+compression setting on the encoded body.
+
+    python benchmarks/bench_json.py --items 20 50 100 --repeat 200
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from flask import Flask
+
+import json_provider
+from compression import brotli
+from json_provider import FastJSONProvider
+from serializers import CARD_FIELDS
+
+WORDS = 'vintage denim cotton linen summer winter jacket dress scarf blue black red'.split()
+
+
+def card(i, now):
+    """One item in the card projection, with realistic value types"""
+    values = {
+        'id': i, 'title': ' '.join(random.choices(WORDS, k=4)).title(), 'category': 'Outerwear',
+        'type': 'Casual', 'size': random.choice('SML'), 'condition': 'Good', 'points': 20,
+        'status': 'approved', 'listing_type': 'swap', 'views': random.randrange(500),
+        'likes': random.randrange(50), 'processing_state': 'ready',
+        'created_at': now - timedelta(minutes=i),
+        'owner': {'id': i % 40, 'name': f"User {i % 40}", 'avatar': None,
+                  'location': 'New York, NY', 'created_at': now - timedelta(days=i)},
+        'images': [f"{random.getrandbits(128):032x}.jpg" for _ in range(3)],
+        'tags': random.sample(WORDS, 3),
+    }
+    primary = values['images'][0].rsplit('.', 1)[0]
+    values['primary_image'] = values['images'][0]
+    values['primary_image_variants'] = {
+        size: {'webp': f"{primary}_{size}.webp"} for size in ('thumb', 'card', 'full')
+    }
+    return {name: values[name] for name in CARD_FIELDS}
+
+
+def page(items):
+    now = datetime.utcnow()
+    return {
+        'success': True,
+        'items': [card(i, now) for i in range(items)],
+        'pagination': {'page': 1, 'pages': 10, 'per_page': items, 'total': items * 10,
+                       'has_next': True, 'has_prev': False}
+    }
+
+
+def timed(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return (time.perf_counter() - start) / repeat * 1e6, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON encoding/compression benchmark")
+    parser.add_argument('--items', type=int, nargs='+', default=[20, 50, 100])
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    stdlib = FastJSONProvider(app)
+    stdlib.sort_keys = True  # Flask's default provider sorts keys
+    fast = FastJSONProvider(app)
+    orjson = json_provider.orjson
+
+    for items in args.items:
+        payload = page(items)
+        print(f"\n{items} items")
+        print(f"{'encoder':<24}{'us/page':>10}{'bytes':>10}")
+
+        json_provider.orjson = None
+        us, body = timed(lambda: stdlib.dumps(payload, separators=(',', ':')), args.repeat)
+        print(f"{'stdlib json':<24}{us:>10.0f}{len(body.encode()):>10}")
+        json_provider.orjson = orjson
+        if orjson:
+            us, body = timed(lambda: fast.dumps(payload), args.repeat)
+            print(f"{'orjson':<24}{us:>10.0f}{len(body.encode()):>10}")
+        assert json.loads(body)['items'][0]['created_at'] == payload['items'][0]['created_at'].isoformat()
+
+        data = body.encode()
+        print(f"{'compression':<24}{'us/page':>10}{'bytes':>10}{'ratio':>8}")
+        settings = [(f"gzip -{level}", lambda level=level: gzip.compress(data, compresslevel=level))
+                    for level in (1, 6, 9)]
+        if brotli:
+            settings += [(f"brotli q{quality}", lambda quality=quality: brotli.compress(data, quality=quality))
+                         for quality in (1, 4, 11)]
+        for label, func in settings:
+            us, compressed = timed(func, max(args.repeat // 10, 5))
+            print(f"{label:<24}{us:>10.0f}{len(compressed):>10}{len(data) / len(compressed):>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Payload size and serialization time: ORM to_dict() vs the column-tuple
+projections in serializers.py, for a browse page and a swap request history.
+
+Runs against a throwaway SQLite database seeded with synthetic listings.
+
+    python benchmarks/bench_serialization.py --items 2000 --page-size 50 --repeat 20
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_tmp.name, 'bench.db')}"
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy import event
+from sqlalchemy.orm import joinedload, selectinload
+
+from app import create_app, db, create_tables, Item, ItemImage, ItemTag, SwapRequest, User, Category, serializer
+from serializers import ITEM_PROJECTIONS, SWAP_PROJECTIONS
+
+app = create_app()
+
+
+def seed(items, users=50):
+    owners = [
+        User(email=f"user{i}@bench.test", name=f"User {i}", password_hash='x', points=500,
+             bio='Loves vintage denim. ' * 10, location='Somewhere', phone='+1 555 0100',
+             address='1 Long Street, Some City')
+        for i in range(users)
+    ]
+    db.session.add_all(owners)
+    db.session.flush()
+    categories = Category.query.all()
+    for i in range(items):
+        item = Item(
+            title=f"Item {i}", description='A well kept piece of clothing. ' * 8,
+            category_id=categories[i % len(categories)].id, type='Casual', size='M',
+            condition='Good', points=20, status='approved', listing_type='swap',
+            user_id=owners[i % users].id
+        )
+        db.session.add(item)
+        db.session.flush()
+        for n in range(3):
+            db.session.add(ItemImage(
+                item_id=item.id, image_path=f"{i:032x}{n}.jpg", is_primary=(n == 0),
+                variants={size: {'webp': f"{i:032x}{n}_{size}.webp"} for size in ('thumb', 'card', 'full')}
+            ))
+        for tag in ('denim', 'vintage', 'blue'):
+            db.session.add(ItemTag(item_id=item.id, tag=tag))
+        db.session.add(SwapRequest(
+            item_id=item.id, requester_id=owners[(i + 1) % users].id, owner_id=item.user_id,
+            offered_item_id=item.id - 1 if i else None, points_offered=5, message='Swap?'
+        ))
+    db.session.commit()
+
+
+def orm_page(page_size):
+    items = Item.query.filter_by(status='approved').options(
+        joinedload(Item.category_ref), joinedload(Item.owner),
+        selectinload(Item.images), selectinload(Item.tags)
+    ).order_by(Item.created_at.desc()).limit(page_size).all()
+    results = []
+    for item in items:
+        item_data = item.to_dict()
+        item_data['primary_image'] = item.primary_image
+        item_data['primary_image_variants'] = item.primary_image_variants
+        results.append(item_data)
+    return results
+
+
+def projected_page(page_size, view):
+    projection = ITEM_PROJECTIONS[view]
+    rows = serializer.item_query(
+        Item.query.filter_by(status='approved'), projection
+    ).order_by(Item.created_at.desc()).limit(page_size).all()
+    return serializer.items(rows, projection)
+
+
+def orm_swaps(user_id):
+    requests = SwapRequest.query.filter(
+        db.or_(SwapRequest.requester_id == user_id, SwapRequest.owner_id == user_id)
+    ).order_by(SwapRequest.created_at.desc()).all()
+    return [req.to_dict() for req in requests]
+
+
+def projected_swaps(user_id):
+    projection = SWAP_PROJECTIONS['swap-summary']
+    rows = serializer.swap_query(SwapRequest.query.filter(
+        db.or_(SwapRequest.requester_id == user_id, SwapRequest.owner_id == user_id)
+    ), projection).order_by(SwapRequest.created_at.desc()).all()
+    return serializer.swap_requests(rows, projection)
+
+
+def measure(func, repeat, counter):
+    timings = []
+    for _ in range(repeat):
+        db.session.expunge_all()
+        counter[0] = 0
+        start = time.perf_counter()
+        payload = func()
+        body = app.json.dumps(payload)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return {
+        'rows': len(payload),
+        'bytes': len(body.encode()),
+        'median_ms': timings[len(timings) // 2] * 1000,
+        'queries': counter[0]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serialization benchmark")
+    parser.add_argument('--items', type=int, default=2000)
+    parser.add_argument('--page-size', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    create_tables(app)
+    with app.app_context():
+        seed(args.items)
+        counter = [0]
+        event.listen(db.engine, 'before_cursor_execute', lambda *a: counter.__setitem__(0, counter[0] + 1))
+        user_id = User.query.filter_by(email='user1@bench.test').first().id
+
+        cases = [
+            ('browse: to_dict', lambda: orm_page(args.page_size)),
+            ('browse: card', lambda: projected_page(args.page_size, 'card')),
+            ('browse: detail', lambda: projected_page(args.page_size, 'detail')),
+            ('swaps: to_dict', lambda: orm_swaps(user_id)),
+            ('swaps: swap-summary', lambda: projected_swaps(user_id)),
+        ]
+        print(f"{'case':<22}{'rows':>6}{'bytes':>10}{'bytes/row':>11}{'median ms':>11}{'queries':>9}")
+        for label, func in cases:
+            result = measure(func, args.repeat, counter)
+            print(f"{label:<22}{result['rows']:>6}{result['bytes']:>10}"
+                  f"{result['bytes'] // max(result['rows'], 1):>11}{result['median_ms']:>11.2f}{result['queries']:>9}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Concurrent reader/writer throughput on SQLite, default settings vs the
+tuned pragmas from config.py (WAL, synchronous=NORMAL, mmap, cache, busy_timeout).
+
+Readers run the browse-page query shape; writers insert items and bump
+view counts, each in its own transaction.
+
+    python benchmarks/bench_sqlite_concurrency.py --readers 8 --writers 2 --seconds 10
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from config import SQLITE_PRAGMAS, apply_sqlite_pragmas
+
+SCHEMA = """
+CREATE TABLE item (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL,
+    status TEXT NOT NULL,
+    listing_type TEXT NOT NULL,
+    views INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL
+);
+CREATE INDEX ix_item_browse ON item (status, listing_type, created_at);
+"""
+
+BROWSE = ("SELECT id, title, views FROM item WHERE status = 'approved' AND listing_type = 'swap' "
+          "ORDER BY created_at DESC LIMIT 20 OFFSET ?")
+
+
+def seed(path, rows):
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    now = time.time()
+    conn.executemany(
+        "INSERT INTO item (title, status, listing_type, created_at) VALUES (?, ?, ?, ?)",
+        [(f"Item {i}", random.choice(('approved', 'approved', 'pending')),
+          random.choice(('swap', 'donation')), now - i) for i in range(rows)]
+    )
+    conn.commit()
+    conn.close()
+
+
+def connect(path, tuned):
+    # The default driver timeout is what an untuned app gets; tuned runs rely on busy_timeout
+    conn = sqlite3.connect(path, timeout=5.0 if not tuned else 0, check_same_thread=False)
+    if tuned:
+        apply_sqlite_pragmas(conn, SQLITE_PRAGMAS)
+    else:
+        conn.execute("PRAGMA journal_mode = DELETE")
+    return conn
+
+
+def run(path, tuned, readers, writers, seconds, rows):
+    stop = time.perf_counter() + seconds
+    counts = {'reads': 0, 'writes': 0, 'errors': 0}
+    lock = threading.Lock()
+
+    def reader():
+        conn = connect(path, tuned)
+        done = errors = 0
+        while time.perf_counter() < stop:
+            try:
+                conn.execute(BROWSE, (random.randrange(0, 50) * 20,)).fetchall()
+                done += 1
+            except sqlite3.OperationalError:
+                errors += 1
+        with lock:
+            counts['reads'] += done
+            counts['errors'] += errors
+
+    def writer():
+        conn = connect(path, tuned)
+        done = errors = 0
+        while time.perf_counter() < stop:
+            try:
+                with conn:
+                    conn.execute("UPDATE item SET views = views + 1 WHERE id = ?", (random.randrange(1, rows),))
+                    conn.execute(
+                        "INSERT INTO item (title, status, listing_type, created_at) VALUES ('new', 'pending', 'swap', ?)",
+                        (time.time(),)
+                    )
+                done += 1
+            except sqlite3.OperationalError:
+                errors += 1
+        with lock:
+            counts['writes'] += done
+            counts['errors'] += errors
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    threads += [threading.Thread(target=writer) for _ in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {k: v / seconds if k != 'errors' else v for k, v in counts.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLite concurrency benchmark")
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--rows', type=int, default=50000)
+    args = parser.parse_args()
+
+    print(f"{'mode':<10}{'reads/s':>12}{'writes/s':>12}{'errors':>10}")
+    for tuned in (False, True):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'bench.db')
+            seed(path, args.rows)
+            result = run(path, tuned, args.readers, args.writers, args.seconds, args.rows)
+        mode = 'tuned' if tuned else 'default'
+        print(f"{mode:<10}{result['reads']:>12.0f}{result['writes']:>12.0f}{result['errors']:>10}")
+
+
+if __name__ == '__main__':
+    main()
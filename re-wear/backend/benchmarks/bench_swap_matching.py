@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Swap cycle matching on synthetic want-graphs.
+
+Generates open requests between users whose popularity follows a Zipf-like
+curve (a few sought-after closets, a long tail), then times SCC detection
+and matching.find_cycles() and checks every cycle it returns:
+
+  * users (and so items) appear in at most one cycle
+  * each participant receives from the next and gives to the previous
+  * lengths and points balances stay within the limits
+
+    python benchmarks/bench_swap_matching.py --users 20000 --requests 100000 --max-length 3 4
+
+Exits non-zero if a cycle is invalid.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from matching import Want, build_graph, find_cycles, strongly_connected_components
+
+ITEM_POINTS = (10, 15, 20, 25, 30, 40)
+
+
+def synthetic_wants(users, requests, skew, seed):
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) ** skew for rank in range(users)]
+    owners = rng.choices(range(users), weights=weights, k=requests)
+    # A few listings per user, so several requests can target the same item
+    items = {user: [user * 4 + k for k in range(4)] for user in range(users)}
+    points = {item: rng.choice(ITEM_POINTS) for listing in items.values() for item in listing}
+    wants = []
+    for request_id, owner in enumerate(owners, start=1):
+        requester = rng.randrange(users)
+        item_id = rng.choice(items[owner])
+        wants.append(Want(requester, owner, item_id, points[item_id], request_id))
+    return wants
+
+
+def check(cycles, max_length, max_imbalance):
+    failures = []
+    seen = set()
+    for cycle in cycles:
+        users = cycle.users
+        if seen.intersection(users) or len(set(users)) != len(users):
+            failures.append(f"user reused: {users}")
+        seen.update(users)
+        if not 2 <= len(users) <= max_length:
+            failures.append(f"bad length {len(users)}")
+        for position, want in enumerate(cycle.wants):
+            if want.owner != cycle.wants[(position + 1) % len(cycle.wants)].requester:
+                failures.append(f"broken cycle: {cycle.wants}")
+        if max_imbalance is not None and any(abs(b) > max_imbalance for b in cycle.balances().values()):
+            failures.append(f"imbalanced: {cycle.balances()}")
+    return failures, len(seen)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Swap cycle matching benchmark")
+    parser.add_argument('--users', type=int, default=20000)
+    parser.add_argument('--requests', type=int, default=100000)
+    parser.add_argument('--skew', type=float, default=0.8, help='Zipf exponent of owner popularity')
+    parser.add_argument('--max-length', type=int, nargs='+', default=[2, 3, 4])
+    parser.add_argument('--max-imbalance', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    wants = synthetic_wants(args.users, args.requests, args.skew, args.seed)
+    print(f"{len(wants)} open requests between {args.users} users "
+          f"(generated in {time.perf_counter() - start:.2f}s)")
+
+    start = time.perf_counter()
+    graph = build_graph(wants)
+    components = [c for c in strongly_connected_components(graph) if len(c) > 1]
+    elapsed = time.perf_counter() - start
+    in_components = sum(len(c) for c in components)
+    print(f"graph + SCC: {elapsed * 1000:.0f} ms, {len(components)} components, "
+          f"{in_components} users can be in a cycle, largest {max(map(len, components), default=0)}")
+
+    print(f"{'max length':<12}{'ms':>10}{'cycles':>10}{'matched':>10}{'share':>8}")
+    failed = False
+    for max_length in args.max_length:
+        start = time.perf_counter()
+        cycles = find_cycles(wants, max_length=max_length, max_imbalance=args.max_imbalance)
+        elapsed = time.perf_counter() - start
+        failures, matched = check(cycles, max_length, args.max_imbalance)
+        print(f"{max_length:<12}{elapsed * 1000:>10.0f}{len(cycles):>10}{matched:>10}"
+              f"{matched / args.users:>8.1%}")
+        for failure in failures[:5]:
+            print(f"FAIL: {failure}")
+        failed = failed or bool(failures)
+    if failed:
+        sys.exit(1)
+    print("OK: cycles are disjoint, closed and within limits")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Regression check: the number of SQL statements behind a listing page must
+not grow with the page size.
+
+Seeds a throwaway SQLite database with synthetic listings, requests each
+listing endpoint at 5, 50 and 100 items per page (after one warm-up request
+that fills the per-process caches) and compares the statement counts.
+
+    python benchmarks/check_query_counts.py
+
+Exits non-zero if any endpoint issues more statements for a bigger page.
+"""
+import os
+import sys
+import tempfile
+from collections import Counter
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_tmp.name, 'queries.db')}"
+for _name in ('STATS_RECONCILE_INTERVAL', 'FEED_RECOMPUTE_INTERVAL', 'SWAP_MATCH_INTERVAL'):
+    os.environ.setdefault(_name, '0')
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.dirname(__file__))
+# Uploads are written relative to the working directory
+os.chdir(_tmp.name)
+
+from sqlalchemy import event
+
+from app import create_app, db, create_tables, Item
+from synthetic import seed
+
+app = create_app()
+
+PAGE_SIZES = (5, 50, 100)
+
+# (label, path template, who asks); {n} is the page size
+CASES = [
+    ('items, card', '/api/items?per_page={n}', 'owner'),
+    ('items, detail', '/api/items?per_page={n}&view=detail', 'owner'),
+    ('items, page 2', '/api/items?per_page={n}&page=2', 'owner'),
+    ('items, search', '/api/items?per_page={n}&search=denim', 'owner'),
+    ('items, cursor', '/api/items?paginate=cursor&limit={n}&include_total=1', 'owner'),
+    ('items, anonymous', '/api/items?per_page={n}&condition=Good', None),
+    ('user items, cursor', '/api/items/user?paginate=cursor&limit={n}', 'owner'),
+    ('user items, detail', '/api/items/user?paginate=cursor&limit={n}&view=detail', 'owner'),
+]
+
+
+def main():
+    create_tables(app)
+    data = seed(app, users=20, items=2000, requests=0, reports=0, images=5)
+    with app.app_context():
+        owner = Counter(user_id for (user_id,) in db.session.query(Item.user_id)).most_common(1)[0][0]
+        statements = [0]
+        event.listen(db.engine, 'before_cursor_execute',
+                     lambda *args: statements.__setitem__(0, statements[0] + 1))
+
+    clients = {None: app.test_client(), 'owner': app.test_client()}
+    with clients['owner'].session_transaction() as sess:
+        sess['user_id'] = owner
+
+    failures = 0
+    print(f"{'case':<22}" + ''.join(f"{f'n={n}':>8}" for n in PAGE_SIZES))
+    for label, path, who in CASES:
+        client = clients[who]
+        client.get(path.format(n=1))
+        counts = []
+        for n in PAGE_SIZES:
+            statements[0] = 0
+            response = client.get(path.format(n=n))
+            if response.status_code != 200:
+                print(f"{label}: {path.format(n=n)} returned {response.status_code}")
+                failures += 1
+            counts.append(statements[0])
+        grew = counts[-1] > counts[0]
+        failures += grew
+        print(f"{label:<22}" + ''.join(f"{count:>8}" for count in counts) + ('  GREW' if grew else ''))
+
+    if failures:
+        print(f"{failures} listing(s) failed")
+        sys.exit(1)
+    print(f"Statement counts are independent of page size ({len(data.approved_items)} approved items)")
+
+
+if __name__ == '__main__':
+    main()
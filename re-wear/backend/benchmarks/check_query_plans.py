@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Regression check: every hot query in migrations.HOT_QUERIES is served by an
+index.
+
+Migrates a throwaway SQLite database, runs EXPLAIN QUERY PLAN on each hot
+query and prints the plans.
+
+    python benchmarks/check_query_plans.py
+
+Exits non-zero if any plan scans a table or sorts through a temp B-tree.
+"""
+import os
+import sys
+import tempfile
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_tmp.name, 'plans.db')}"
+for _name in ('STATS_RECONCILE_INTERVAL', 'FEED_RECOMPUTE_INTERVAL', 'SWAP_MATCH_INTERVAL'):
+    os.environ.setdefault(_name, '0')
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+# Uploads are written relative to the working directory
+os.chdir(_tmp.name)
+
+from app import create_app, db, create_tables
+
+app = create_app()
+from migrations import explain_hot_queries, unindexed_hot_queries
+
+
+def main():
+    create_tables(app)
+    with app.app_context():
+        plans = explain_hot_queries(db)
+        failures = unindexed_hot_queries(db)
+
+    for label, plan in plans.items():
+        print(f"{'FAIL' if label in failures else 'ok':<6}{label}")
+        for line in plan:
+            print(f"        {line}")
+
+    if failures:
+        print(f"{len(failures)} hot queries are not served by an index: {', '.join(failures)}")
+        sys.exit(1)
+    print(f"All {len(plans)} hot queries use an index")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Consistency check for the buffered item view counter: no increment is lost.
+
+Threads call view_counter.incr() (and GET /api/items/<id>) while the
+background flusher runs with a small threshold. Some flushes fail on
+purpose, either before writing or after the UPDATE but before the commit,
+which exercises the merge-back path. After a final flush(), the views in
+the database must have grown by exactly the number of increments.
+
+    python benchmarks/check_view_counts.py --threads 8 --increments 5000
+
+Exits non-zero if the totals differ.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_tmp.name, 'views.db')}"
+os.environ.setdefault('STATS_RECONCILE_INTERVAL', '0')
+os.environ['VIEW_FLUSH_INTERVAL'] = '0.05'
+os.environ['VIEW_FLUSH_THRESHOLD'] = '200'
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy import func
+
+from app import create_app, db, create_tables, flush_item_views, view_counter, Item
+
+app = create_app()
+
+
+class InjectedFailure(Exception):
+    pass
+
+
+def flaky(flush, fail_every):
+    """flush_func that fails every fail_every-th call, alternating where it fails"""
+    calls = [0]
+    failures = [0]
+    items = Item.__table__
+
+    def flaky_flush(counts):
+        calls[0] += 1
+        if calls[0] % fail_every:
+            return flush(counts)
+        failures[0] += 1
+        if failures[0] % 2:
+            raise InjectedFailure('before the write')
+        # Apply the deltas but never commit; the app context teardown rolls back
+        db.session.execute(
+            items.update().where(items.c.id == db.bindparam('item_id'))
+            .values(views=items.c.views + db.bindparam('delta')),
+            [{'item_id': item_id, 'delta': delta} for item_id, delta in counts.items()]
+        )
+        raise InjectedFailure('before the commit')
+
+    return flaky_flush, calls, failures
+
+
+def total_views():
+    with app.app_context():
+        return db.session.query(func.coalesce(func.sum(Item.views), 0)).scalar()
+
+
+def worker(item_ids, increments, seed, done):
+    rng = random.Random(seed)
+    client = app.test_client()
+    count = 0
+    for i in range(increments):
+        item_id = rng.choice(item_ids)
+        if i % 50 == 0:
+            # Through the endpoint, which also reads the pending count
+            if client.get(f'/api/items/{item_id}').status_code == 200:
+                count += 1
+        else:
+            view_counter.incr(item_id)
+            count += 1
+    done.append(count)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Buffered view counter consistency check")
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--increments', type=int, default=5000, help='Per thread')
+    parser.add_argument('--fail-every', type=int, default=3, help='Fail every Nth flush')
+    args = parser.parse_args()
+
+    create_tables(app)
+    with app.app_context():
+        item_ids = [item_id for (item_id,) in db.session.query(Item.id).filter(Item.status == 'approved')]
+    before = total_views()
+
+    view_counter.flush_func, calls, failures = flaky(flush_item_views, args.fail_every)
+    done = []
+    threads = [
+        threading.Thread(target=worker, args=(item_ids, args.increments, i, done))
+        for i in range(args.threads)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Drain whatever the failures left behind
+    view_counter.flush_func = flush_item_views
+    view_counter.flush()
+    increments = sum(done)
+    added = total_views() - before
+    leftover = sum(view_counter.pending(item_id) for item_id in item_ids)
+
+    print(f"{increments} increments, {calls[0]} flushes ({failures[0]} failed on purpose)")
+    print(f"views in the database grew by {added}, {leftover} still buffered")
+    if added != increments or leftover:
+        print("Lost or duplicated increments")
+        sys.exit(1)
+    if not failures[0]:
+        print("No flush failed; raise --increments or lower --fail-every to cover the merge-back path")
+        sys.exit(1)
+    print("No increments lost")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Requests/sec of the gunicorn setup as the number of workers grows.
+
+For each worker count, starts `gunicorn -c gunicorn.conf.py wsgi:app` on a
+free port against a fresh SQLite database (seeded by create_tables()), drives
+it with keep-alive client threads for a fixed time and prints throughput and
+latency percentiles.
+
+    python benchmarks/load_workers.py --workers 1 2 4 --clients 16 --duration 10
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# (weight, path); {item} is replaced by a seeded item id
+MIX = [
+    (5, '/api/items?listing_type=swap'),
+    (3, '/api/items/{item}'),
+    (1, '/api/categories'),
+    (1, '/api/items?search=denim'),
+]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_up(port, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            conn.request('GET', '/api/categories')
+            if conn.getresponse().status == 200:
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def start_server(workers, threads, port, database_url):
+    env = dict(
+        os.environ, WEB_CONCURRENCY=str(workers), GUNICORN_THREADS=str(threads),
+        PORT=str(port), HOST='127.0.0.1', DATABASE_URL=database_url,
+        STATS_RECONCILE_INTERVAL='0', FEED_RECOMPUTE_INTERVAL='0'
+    )
+    return subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+
+def item_ids(port):
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    conn.request('GET', '/api/items?per_page=50')
+    return [item['id'] for item in json.loads(conn.getresponse().read())['items']] or [1]
+
+
+def client(port, ids, deadline, latencies, errors, lock):
+    paths = [path for weight, path in MIX for _ in range(weight)]
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    local, failed = [], 0
+    while time.monotonic() < deadline:
+        path = random.choice(paths).format(item=random.choice(ids))
+        start = time.perf_counter()
+        try:
+            conn.request('GET', path, headers={'Accept-Encoding': 'gzip'})
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                failed += 1
+        except (OSError, http.client.HTTPException):
+            failed += 1
+            conn.close()
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+            continue
+        local.append(time.perf_counter() - start)
+    with lock:
+        latencies.extend(local)
+        errors.append(failed)
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(int(len(values) * q), len(values) - 1)] if values else 0.0
+
+
+def run(workers, args):
+    port = free_port()
+    with tempfile.TemporaryDirectory() as tmp:
+        server = start_server(workers, args.threads, port, f"sqlite:///{os.path.join(tmp, 'load.db')}")
+        try:
+            if not wait_until_up(port):
+                raise RuntimeError(f"gunicorn with {workers} workers did not start")
+            ids = item_ids(port)
+            latencies, errors, lock = [], [], threading.Lock()
+            deadline = time.monotonic() + args.duration
+            clients = [
+                threading.Thread(target=client, args=(port, ids, deadline, latencies, errors, lock))
+                for _ in range(args.clients)
+            ]
+            for thread in clients:
+                thread.start()
+            for thread in clients:
+                thread.join()
+        finally:
+            server.terminate()
+            server.wait(timeout=60)
+    return len(latencies) / args.duration, latencies, sum(errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="gunicorn worker scaling load test")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--threads', type=int, default=4, help='Threads per worker')
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds per worker count')
+    args = parser.parse_args()
+
+    print(f"{args.clients} clients, {args.threads} threads per worker, {args.duration:.0f}s each")
+    print(f"{'workers':<10}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}{'scaling':>9}")
+    baseline = None
+    for workers in args.workers:
+        throughput, latencies, errors = run(workers, args)
+        baseline = baseline or throughput
+        print(f"{workers:<10}{throughput:>10.0f}"
+              f"{percentile(latencies, 0.50) * 1000:>10.1f}"
+              f"{percentile(latencies, 0.95) * 1000:>10.1f}"
+              f"{percentile(latencies, 0.99) * 1000:>10.1f}"
+              f"{errors:>8}{throughput / baseline:>8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Concurrency stress test for redeem/claim against the points ledger.
+
+Buyer threads race to redeem (and claim) the same small set of items through
+the Flask test client, some retrying with the same Idempotency-Key. Afterwards
+it checks the invariants and prints throughput:
+
+  * at most one winner per item
+  * no negative balances, and total points unchanged
+  * every balance equals the sum of its ledger entries
+  * an Idempotency-Key is scoped to the user who sent it: two buyers, and
+    then the seller they paid, can each use the same key for their own
+    redemption
+
+    python benchmarks/stress_points_ledger.py --threads 16 --items 50 --requests 200
+
+Exits non-zero if an invariant is broken.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_tmp.name, 'stress.db')}"
+os.environ.setdefault('STATS_RECONCILE_INTERVAL', '0')
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy import func
+
+from app import create_app, db, create_tables, points_ledger, Item, SwapRequest, User, Category
+
+app = create_app()
+
+ITEM_POINTS = 20
+
+
+def seed(buyers, items):
+    seller = User(email='seller@stress.test', name='Seller', password_hash='x', points=0)
+    db.session.add(seller)
+    users = [
+        # Enough for a few redemptions, so the insufficient-points path is hit too
+        User(email=f"buyer{i}@stress.test", name=f"Buyer {i}", password_hash='x', points=ITEM_POINTS * 3)
+        for i in range(buyers)
+    ]
+    db.session.add_all(users)
+    db.session.flush()
+    category_id = Category.query.first().id
+    for i in range(items):
+        db.session.add(Item(
+            title=f"Item {i}", description='x', category_id=category_id, type='x', size='M',
+            condition='Good', points=ITEM_POINTS, status='approved',
+            listing_type='swap' if i % 2 == 0 else 'donation', user_id=seller.id
+        ))
+    db.session.commit()
+    points_ledger.open_balances()
+    actions = {'swap': 'redeem', 'donation': 'claim'}
+    return [user.id for user in users], {
+        item.id: actions[item.listing_type] for item in Item.query.filter(Item.user_id == seller.id)
+    }
+
+
+def seed_shared_keys():
+    """Two buyers paying one seller, who in turn buys from one of them"""
+    seller = User(email='shared-seller@stress.test', name='Shared Seller', password_hash='x', points=0)
+    buyers = [
+        User(email=f"shared-buyer{i}@stress.test", name=f"Shared Buyer {i}", password_hash='x',
+             points=ITEM_POINTS)
+        for i in range(2)
+    ]
+    db.session.add_all([seller] + buyers)
+    db.session.flush()
+    category_id = Category.query.first().id
+    items = [
+        Item(title=title, description='x', category_id=category_id, type='x', size='M',
+             condition='Good', points=ITEM_POINTS, status='approved', listing_type='swap', user_id=owner.id)
+        for title, owner in (('Shared 0', seller), ('Shared 1', seller), ('Shared 2', buyers[0]))
+    ]
+    db.session.add_all(items)
+    db.session.commit()
+    points_ledger.open_balances()
+    return [
+        # (user, item, expected status); the last is a retry of the first
+        (buyers[0].id, items[0].id, 200),
+        (buyers[1].id, items[1].id, 200),
+        (seller.id, items[2].id, 200),
+        (buyers[0].id, items[0].id, 200),
+    ]
+
+
+def check_shared_keys(steps, key='shared-key'):
+    failures = []
+    clients = {}
+    for user_id, item_id, expected in steps:
+        if user_id not in clients:
+            clients[user_id] = app.test_client()
+            with clients[user_id].session_transaction() as sess:
+                sess['user_id'] = user_id
+                sess['user_role'] = 'user'
+        response = clients[user_id].post(f"/api/items/{item_id}/redeem", headers={'Idempotency-Key': key})
+        if response.status_code != expected:
+            failures.append(f"user {user_id} redeeming item {item_id} with a shared key: "
+                            f"{response.status_code} ({response.get_json().get('message')})")
+    return failures
+
+
+def worker(user_id, item_actions, requests, retry_rate, results, lock):
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = user_id
+        sess['user_role'] = 'user'
+    statuses = Counter()
+    item_ids = list(item_actions)
+    last_key = None
+    for _ in range(requests):
+        item_id = random.choice(item_ids)
+        if last_key and random.random() < retry_rate:
+            key, item_id = last_key  # a client retrying its previous request
+        else:
+            key = uuid.uuid4().hex
+        action = item_actions[item_id]
+        response = client.post(f"/api/items/{item_id}/{action}", headers={'Idempotency-Key': key})
+        statuses[(action, response.status_code)] += 1
+        last_key = (key, item_id)
+    with lock:
+        results.update(statuses)
+
+
+def check_invariants(initial_total):
+    failures = []
+    winners = db.session.query(SwapRequest.item_id, func.count()).filter(
+        SwapRequest.status == 'completed'
+    ).group_by(SwapRequest.item_id).having(func.count() > 1).all()
+    if winners:
+        failures.append(f"items with more than one winner: {winners}")
+    negative = User.query.filter(User.points < 0).count()
+    if negative:
+        failures.append(f"{negative} users with a negative balance")
+    total = db.session.query(func.sum(User.points)).scalar()
+    if total != initial_total:
+        failures.append(f"total points changed: {initial_total} -> {total}")
+    mismatched = points_ledger.mismatched_balances()
+    if mismatched:
+        failures.append(f"balances disagree with the ledger: {mismatched[:5]}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Points ledger stress test")
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--items', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=200, help='Requests per thread')
+    parser.add_argument('--retry-rate', type=float, default=0.2)
+    args = parser.parse_args()
+
+    create_tables(app)
+    with app.app_context():
+        user_ids, item_actions = seed(args.threads, args.items)
+        shared_key_steps = seed_shared_keys()
+        initial_total = db.session.query(func.sum(User.points)).scalar()
+
+    results = Counter()
+    lock = threading.Lock()
+    threads = [
+        threading.Thread(target=worker, args=(user_id, item_actions, args.requests, args.retry_rate, results, lock))
+        for user_id in user_ids
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    total_requests = sum(results.values())
+    print(f"{total_requests} requests from {args.threads} threads in {elapsed:.2f}s "
+          f"({total_requests / elapsed:.0f} req/s)")
+    for (action, status), count in sorted(results.items()):
+        print(f"  {action:<7}{status:>5}{count:>8}")
+
+    # Outside an app context, so each request gets its own g like the workers'
+    failures = check_shared_keys(shared_key_steps)
+    with app.app_context():
+        taken = Item.query.filter(Item.id.in_(list(item_actions)), Item.status != 'approved').count()
+        print(f"items taken: {taken}/{len(item_actions)}")
+        failures += check_invariants(initial_total)
+    if failures:
+        for failure in failures:
+            print(f"FAIL: {failure}")
+        sys.exit(1)
+    print("OK: one winner per item, no negative balances, ledger matches balances, "
+          "idempotency keys scoped per user")
+
+
+if __name__ == '__main__':
+    main()
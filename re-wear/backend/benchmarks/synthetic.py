@@ -0,0 +1,141 @@
+"""
+Synthetic data for benchmarks: users, items with images and tags, swap
+requests and reports, bulk-inserted so 100k-row datasets seed in seconds.
+
+seed() takes the application from app.create_app(), built after DATABASE_URL
+etc. are set.
+"""
+import io
+import os
+import random
+import uuid
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from PIL import Image
+from werkzeug.security import generate_password_hash
+
+PASSWORD = 'benchmark'
+WORDS = ('vintage denim cotton linen wool silk summer winter casual formal oversized '
+         'slim floral striped leather suede knit retro classic blue black red green white').split()
+SIZES = ('XS', 'S', 'M', 'L', 'XL')
+CONDITIONS = ('New', 'Like New', 'Good', 'Fair')
+TYPES = ('Casual', 'Formal', 'Sports', 'Party')
+
+# What the benchmark scenarios pick from; ids only, so it is cheap to share between threads
+Dataset = namedtuple('Dataset', 'users admins categories approved_items pending_items '
+                                'pending_requests words images')
+
+
+def jpeg_bytes(rng, size=(64, 64)):
+    colour = tuple(rng.randrange(256) for _ in range(3))
+    buffer = io.BytesIO()
+    Image.new('RGB', size, colour).save(buffer, 'JPEG', quality=80)
+    return buffer.getvalue()
+
+
+def write_images(upload_folder, count, rng):
+    """A pool of small stored images, named the way uploads are"""
+    folder = os.path.join(upload_folder, 'items')
+    os.makedirs(folder, exist_ok=True)
+    names = []
+    for _ in range(count):
+        name = f"{uuid.UUID(int=rng.getrandbits(128)).hex}.jpg"
+        with open(os.path.join(folder, name), 'wb') as f:
+            f.write(jpeg_bytes(rng))
+        names.append(name)
+    return names
+
+
+def seed(app, users=500, items=5000, requests=2000, reports=100, images=50, pending_share=0.1, seed=42):
+    """Fill an empty database (after create_tables(app)) and return a Dataset"""
+    from app import (db, admin_stats, points_ledger, search_index, Category, Item, ItemImage,
+                     ItemTag, Report, SwapRequest, User)
+
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    with app.app_context():
+        categories = [category.id for category in Category.query.order_by(Category.id)]
+        image_names = write_images(app.config['UPLOAD_FOLDER'], images, rng)
+        password_hash = generate_password_hash(PASSWORD)
+
+        first_user = (db.session.query(db.func.max(User.id)).scalar() or 0) + 1
+        db.session.execute(User.__table__.insert(), [
+            {'email': f"user{i}@bench.test", 'name': f"Bench User {i}", 'password_hash': password_hash,
+             'points': rng.randrange(0, 300), 'role': 'admin' if i < 2 else 'user',
+             'location': rng.choice(('New York, NY', 'Austin, TX', 'Portland, OR')),
+             'is_active': True, 'created_at': now - timedelta(days=rng.randrange(365))}
+            for i in range(users)
+        ])
+        user_ids = list(range(first_user, first_user + users))
+
+        first_item = (db.session.query(db.func.max(Item.id)).scalar() or 0) + 1
+        rows = []
+        for i in range(items):
+            status = 'pending' if rng.random() < pending_share else 'approved'
+            rows.append({
+                'title': ' '.join(rng.sample(WORDS, 3)).title(),
+                'description': ' '.join(rng.choices(WORDS, k=20)),
+                'category_id': rng.choice(categories), 'type': rng.choice(TYPES),
+                'size': rng.choice(SIZES), 'condition': rng.choice(CONDITIONS),
+                'points': rng.choice((10, 15, 20, 25, 30)), 'status': status,
+                'listing_type': 'donation' if rng.random() < 0.2 else 'swap',
+                'user_id': rng.choice(user_ids), 'processing_state': 'ready',
+                'views': int(rng.paretovariate(1.5) * 10), 'likes': rng.randrange(20),
+                'created_at': now - timedelta(minutes=i * 7)
+            })
+        db.session.execute(Item.__table__.insert(), rows)
+        item_ids = list(range(first_item, first_item + items))
+        owners = {item_id: row['user_id'] for item_id, row in zip(item_ids, rows)}
+
+        db.session.execute(ItemImage.__table__.insert(), [
+            {'item_id': item_id, 'image_path': name, 'is_primary': position == 0, 'created_at': now}
+            for item_id in item_ids
+            for position, name in enumerate(rng.sample(image_names, rng.randint(1, 3)))
+        ])
+        db.session.execute(ItemTag.__table__.insert(), [
+            {'item_id': item_id, 'tag': tag}
+            for item_id in item_ids for tag in rng.sample(WORDS, 3)
+        ])
+
+        swap_items = [item_id for item_id, row in zip(item_ids, rows)
+                      if row['status'] == 'approved' and row['listing_type'] == 'swap']
+        request_rows = []
+        for _ in range(requests if swap_items else 0):
+            item_id = rng.choice(swap_items)
+            requester = rng.choice(user_ids)
+            if requester != owners[item_id]:
+                request_rows.append({
+                    'item_id': item_id, 'requester_id': requester, 'owner_id': owners[item_id],
+                    'points_offered': 0, 'message': 'Interested!', 'status': 'pending',
+                    'created_at': now, 'updated_at': now
+                })
+        if request_rows:
+            db.session.execute(SwapRequest.__table__.insert(), request_rows)
+        if reports:
+            db.session.execute(Report.__table__.insert(), [
+                {'item_id': rng.choice(item_ids), 'reporter_id': rng.choice(user_ids),
+                 'reason': 'spam', 'status': 'pending', 'created_at': now}
+                for _ in range(reports)
+            ])
+        db.session.commit()
+
+        points_ledger.open_balances()
+        admin_stats.reconcile()
+        search_index.rebuild()
+
+        pending_requests = [
+            (request_id, owner_id) for request_id, owner_id in db.session.query(
+                SwapRequest.id, SwapRequest.owner_id
+            ).filter(SwapRequest.status == 'pending', SwapRequest.requester_id.in_(user_ids))
+        ]
+        return Dataset(
+            users=user_ids[2:],
+            admins=user_ids[:2],
+            categories=[name for (name,) in db.session.query(Category.name)],
+            approved_items=[i for i, row in zip(item_ids, rows) if row['status'] == 'approved'],
+            pending_items=[i for i, row in zip(item_ids, rows) if row['status'] == 'pending'],
+            pending_requests=pending_requests,
+            words=list(WORDS),
+            images=image_names
+        )
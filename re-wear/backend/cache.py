@@ -0,0 +1,189 @@
+"""
+Response cache for public, visitor-independent GET endpoints.
+
+Entries live in an in-process LRU with a TTL, or in Redis when
+RESPONSE_CACHE_REDIS_URL is set and the redis package is installed. Each
+namespace has a generation number that is part of every key, so invalidating
+a namespace is one increment and stale entries simply stop being read.
+"""
+import importlib.util
+import json
+import logging
+import threading
+import time
+from collections import Counter, OrderedDict
+from functools import wraps
+
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryBackend:
+    """Thread-safe LRU with per-entry expiry; local to the process"""
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._generations = Counter()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def generation(self, namespace):
+        with self._lock:
+            return self._generations[namespace]
+
+    def bump(self, namespace):
+        with self._lock:
+            self._generations[namespace] += 1
+            # Entries of older generations can never be read again
+            prefix = f"{namespace}:"
+            for key in [k for k in self._entries if k.startswith(prefix)]:
+                del self._entries[key]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RedisBackend:
+    """Shares cached responses and invalidations between worker processes"""
+
+    prefix = 'rewear:cache:'
+
+    def __init__(self, url):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, json.dumps(value), ex=max(int(ttl), 1))
+
+    def generation(self, namespace):
+        return int(self.client.get(f"{self.prefix}gen:{namespace}") or 0)
+
+    def bump(self, namespace):
+        self.client.incr(f"{self.prefix}gen:{namespace}")
+
+    def __len__(self):
+        return sum(1 for _ in self.client.scan_iter(match=f"{self.prefix}*", count=500))
+
+
+class ResponseCache:
+    """Caches successful JSON responses per namespace and normalized key.
+
+    Views opt in with @cache.cached(namespace, key_func); key_func returns the
+    key for the current request, or None when the response must not be cached
+    (e.g. a signed-in visitor or a filtered query).
+    """
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.ttl = 60
+        self.enabled = True
+        self._metrics = {'hits': Counter(), 'misses': Counter(), 'bypass': Counter()}
+        self._metrics_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.ttl = app.config.setdefault('RESPONSE_CACHE_TTL', 60)
+        self.enabled = app.config.setdefault('RESPONSE_CACHE_ENABLED', True)
+        redis_url = app.config.setdefault('RESPONSE_CACHE_REDIS_URL', None)
+        if redis_url and importlib.util.find_spec('redis'):
+            self.backend = RedisBackend(redis_url)
+        else:
+            if redis_url:
+                logger.warning("redis package not installed; using the in-process response cache")
+            self.backend = MemoryBackend(app.config.setdefault('RESPONSE_CACHE_MAX_ENTRIES', 512))
+        app.extensions['response_cache'] = self
+
+    def _count(self, kind, namespace):
+        with self._metrics_lock:
+            self._metrics[kind][namespace] += 1
+
+    def cached(self, namespace, key_func=lambda: '', ttl=None):
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                key = key_func() if self.enabled else None
+                if key is None:
+                    self._count('bypass', namespace)
+                    return view(*args, **kwargs)
+
+                try:
+                    full_key = f"{namespace}:{self.backend.generation(namespace)}:{key}"
+                    entry = self.backend.get(full_key)
+                except Exception as e:
+                    logger.error(f"Response cache read error: {str(e)}")
+                    return view(*args, **kwargs)
+                if entry is not None:
+                    self._count('hits', namespace)
+                    response = current_app.response_class(
+                        entry['body'], status=entry['status'], mimetype=entry['mimetype']
+                    )
+                    response.headers['X-Cache'] = 'HIT'
+                    return response
+
+                self._count('misses', namespace)
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code == 200 and not response.direct_passthrough:
+                    try:
+                        self.backend.set(full_key, {
+                            'body': response.get_data(as_text=True),
+                            'status': response.status_code,
+                            'mimetype': response.mimetype
+                        }, ttl or self.ttl)
+                    except Exception as e:
+                        logger.error(f"Response cache write error: {str(e)}")
+                response.headers['X-Cache'] = 'MISS'
+                return response
+            return wrapper
+        return decorator
+
+    def invalidate(self, *namespaces):
+        """Drop every cached response in the namespaces; call after the commit"""
+        for namespace in namespaces:
+            try:
+                self.backend.bump(namespace)
+            except Exception as e:
+                logger.error(f"Response cache invalidation error: {str(e)}")
+
+    def metrics(self):
+        with self._metrics_lock:
+            namespaces = set().union(*self._metrics.values())
+            per_namespace = {
+                ns: {kind: counts[ns] for kind, counts in self._metrics.items()}
+                for ns in sorted(namespaces)
+            }
+        hits = sum(m['hits'] for m in per_namespace.values())
+        misses = sum(m['misses'] for m in per_namespace.values())
+        return {
+            'backend': type(self.backend).__name__,
+            'entries': len(self.backend),
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / (hits + misses), 4) if hits + misses else None,
+            'namespaces': per_namespace
+        }
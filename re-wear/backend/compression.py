@@ -0,0 +1,96 @@
+"""
+Response compression negotiated from Accept-Encoding: brotli when the
+brotli package is installed, otherwise gzip
+"""
+import gzip
+import importlib.util
+import logging
+
+from flask import request
+
+logger = logging.getLogger(__name__)
+
+if importlib.util.find_spec('brotli'):
+    import brotli
+else:
+    brotli = None
+
+COMPRESSIBLE_TYPES = {
+    'application/json', 'application/javascript', 'image/svg+xml',
+    'text/html', 'text/css', 'text/plain', 'text/csv', 'text/xml'
+}
+
+
+def compress_body(data, encoding, level):
+    if encoding == 'br':
+        return brotli.compress(data, quality=level)
+    return gzip.compress(data, compresslevel=level)
+
+
+class Compress:
+    """after_request hook that compresses buffered text responses.
+
+    Files sent with send_file/send_from_directory (direct_passthrough),
+    streamed responses, ranges and bodies under COMPRESS_MIN_SIZE bytes are
+    left alone.
+    """
+
+    def __init__(self, app=None):
+        self.min_size = 1024
+        self.levels = {'gzip': 6, 'br': 4}
+        self.encodings = ('gzip',)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.min_size = app.config.setdefault('COMPRESS_MIN_SIZE', 1024)
+        self.levels = {
+            'gzip': app.config.setdefault('COMPRESS_GZIP_LEVEL', 6),
+            'br': app.config.setdefault('COMPRESS_BR_LEVEL', 4)
+        }
+        # Preferred first when the client weighs them equally
+        self.encodings = ('br', 'gzip') if brotli else ('gzip',)
+        if app.config.setdefault('COMPRESS_ENABLED', True):
+            app.after_request(self.after_request)
+        app.extensions['compress'] = self
+
+    def negotiate(self):
+        accepted = request.accept_encodings
+        best = None
+        for encoding in self.encodings:
+            quality = accepted[encoding]
+            if quality and (best is None or quality > best[1]):
+                best = (encoding, quality)
+        return best[0] if best else None
+
+    def after_request(self, response):
+        if (
+            response.direct_passthrough
+            or response.is_streamed
+            or response.mimetype not in COMPRESSIBLE_TYPES
+        ):
+            return response
+        # Whether or not this body is compressed, the choice depends on the header
+        response.vary.add('Accept-Encoding')
+        if (
+            response.status_code != 200
+            or 'Content-Encoding' in response.headers
+            or (response.content_length or 0) < self.min_size
+        ):
+            return response
+        encoding = self.negotiate()
+        if encoding is None:
+            return response
+
+        try:
+            body = compress_body(response.get_data(), encoding, self.levels[encoding])
+        except Exception as e:
+            logger.error(f"Response compression error: {str(e)}")
+            return response
+
+        response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+        # The representation changed, so a strong validator no longer applies
+        if response.headers.get('ETag') and not response.headers['ETag'].startswith('W/'):
+            response.headers['ETag'] = f"W/{response.headers['ETag']}"
+        return response
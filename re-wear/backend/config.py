@@ -0,0 +1,87 @@
+"""
+Database configuration: engine URL and pool settings from the environment,
+SQLite connection tuning, and read-replica routing for GET requests
+"""
+import os
+import sqlite3
+
+from flask import has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.sql import Select
+
+READ_METHODS = ('GET', 'HEAD')
+
+# Applied to every new SQLite connection. WAL lets readers proceed while a
+# writer holds the lock; synchronous=NORMAL is durable in WAL mode except for
+# the last transactions on power loss.
+# busy_timeout goes first so the remaining pragmas wait out concurrent writers.
+SQLITE_PRAGMAS = {
+    'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000)),
+    'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+    'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+    'cache_size': int(os.environ.get('SQLITE_CACHE_SIZE', -64000)),  # negative = KiB, i.e. 64MB
+    'temp_store': 'MEMORY'
+}
+
+
+def engine_options(url):
+    """Engine options for url, with pool sizing taken from the environment"""
+    if url.startswith('sqlite'):
+        # SQLite connections are cheap; the busy_timeout pragma handles lock waits
+        return {'connect_args': {'check_same_thread': False}}
+    return {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 20)),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': True
+    }
+
+
+def configure_database(app):
+    """Fill in SQLALCHEMY_* settings from DATABASE_URL / DATABASE_REPLICA_URL"""
+    url = os.environ.get('DATABASE_URL', 'sqlite:///rewear.db')
+    app.config['SQLALCHEMY_DATABASE_URI'] = url
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(url)
+
+    replica_url = os.environ.get('DATABASE_REPLICA_URL')
+    if replica_url:
+        app.config['SQLALCHEMY_BINDS'] = {
+            'replica': dict(engine_options(replica_url), url=replica_url)
+        }
+
+
+def apply_sqlite_pragmas(dbapi_connection, pragmas=None):
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in (pragmas or SQLITE_PRAGMAS).items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+    finally:
+        cursor.close()
+
+
+@event.listens_for(Engine, 'connect')
+def _tune_sqlite_connection(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        apply_sqlite_pragmas(dbapi_connection)
+
+
+class RoutingSession(Session):
+    """Sends plain SELECTs issued while serving GET/HEAD requests to the
+    'replica' bind when one is configured; everything else uses the primary.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (
+            bind is None
+            and 'replica' in self._db.engines
+            and isinstance(clause, Select)
+            and not self._flushing
+            and has_request_context()
+            and request.method in READ_METHODS
+        ):
+            return self._db.engines['replica']
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
@@ -0,0 +1,96 @@
+"""
+Write-behind counters: hot-path increments are buffered in memory and
+written to the database in batches
+"""
+import atexit
+import logging
+import threading
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+
+class BufferedCounter:
+    """Accumulates per-key increments and flushes them in one batched write.
+
+    flush_func(counts) receives a {key: delta} dict and runs inside an app
+    context; it must apply the deltas atomically (e.g. one transaction of
+    UPDATE ... SET n = n + :delta). A flush happens every `interval` seconds,
+    as soon as `threshold` increments are buffered, and at interpreter exit.
+    If flush_func fails, the deltas are merged back and retried later, so no
+    increment is dropped.
+    """
+
+    def __init__(self, name, flush_func, app=None, interval=5.0, threshold=500):
+        self.name = name
+        self.flush_func = flush_func
+        self.interval = interval
+        self.threshold = threshold
+        self.app = None
+        self._pending = Counter()
+        self._inflight = Counter()
+        self._buffered = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions.setdefault('counters', {})[self.name] = self
+        atexit.register(self.flush)
+
+    def _ensure_started(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(
+                        target=self._run, name=f"{self.name}-flusher", daemon=True
+                    )
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Flushing {self.name} failed: {str(e)}")
+
+    def incr(self, key, amount=1):
+        self._ensure_started()
+        with self._lock:
+            self._pending[key] += amount
+            self._buffered += amount
+            if self._buffered >= self.threshold:
+                self._wakeup.set()
+
+    def pending(self, key):
+        """Increments for key that are not in the database yet"""
+        with self._lock:
+            return self._pending.get(key, 0) + self._inflight.get(key, 0)
+
+    def flush(self):
+        """Write all buffered increments; returns the number of keys written"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, Counter()
+                self._inflight = batch
+                self._buffered = 0
+            if not batch:
+                return 0
+            try:
+                with self.app.app_context():
+                    self.flush_func(dict(batch))
+            except Exception:
+                with self._lock:
+                    self._pending.update(batch)
+                    self._buffered += sum(batch.values())
+                raise
+            finally:
+                with self._lock:
+                    self._inflight = Counter()
+            return len(batch)
@@ -0,0 +1,21 @@
+#!/usr/bin/env python3
+"""
+Delete stored uploads (and their derivatives) that no listing refers to.
+
+    python gc_uploads.py [--grace-seconds N]
+"""
+import argparse
+
+from app import create_app, collect_unreferenced_uploads
+
+app = create_app()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Garbage-collect unreferenced uploads")
+    parser.add_argument('--grace-seconds', type=int, default=3600,
+                        help='Keep files younger than this, they may belong to an upload in flight')
+    args = parser.parse_args()
+
+    with app.app_context():
+        deleted = collect_unreferenced_uploads(args.grace_seconds)
+    print(f"Removed {len(deleted)} unreferenced uploads")
@@ -0,0 +1,39 @@
+"""
+gunicorn settings for running the API in production:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+WEB_CONCURRENCY worker processes, each with GUNICORN_THREADS threads. The app
+is imported once in the master (preload_app), so the schema migration and
+warm-up in wsgi.production_app() run once, before forking.
+"""
+import multiprocessing
+import os
+
+bind = f"{os.environ.get('HOST', '0.0.0.0')}:{os.environ.get('PORT', 5001)}"
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+# Requests mostly wait on SQLite/disk, so a few threads per worker help
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+preload_app = True
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+# Time a worker gets on shutdown to flush counters and finish queued jobs
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+# Recycle workers now and then so slow leaks in image processing stay bounded
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 10000))
+max_requests_jitter = max_requests // 10
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG')
+errorlog = '-'
+
+
+def post_fork(server, worker):
+    from wsgi import init_worker
+
+    init_worker()
+
+
+def worker_exit(server, worker):
+    from wsgi import shutdown_worker
+
+    shutdown_worker(timeout=max(graceful_timeout - 5, 1))
@@ -0,0 +1,69 @@
+"""
+Resized, modern-format derivatives of uploaded item photos
+"""
+import logging
+import os
+
+from PIL import Image, features
+
+logger = logging.getLogger(__name__)
+
+# Longest-edge bounds per use: browse grid, carousel/cards, detail page
+DERIVATIVE_SIZES = {
+    'thumb': (320, 320),
+    'card': (640, 640),
+    'full': (1280, 1280)
+}
+
+FORMAT_OPTIONS = {
+    'avif': {'format': 'AVIF', 'quality': 60},
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4}
+}
+
+
+def available_formats():
+    """Derivative formats this Pillow build can write, best compression first"""
+    # Older Pillow builds don't know the 'avif' feature name at all
+    supported = features.get_supported()
+    return [fmt for fmt in ('avif', 'webp') if fmt in supported]
+
+
+def is_derivative(filename):
+    stem = filename.rsplit('.', 1)[0]
+    return any(stem.endswith(f'_{size}') for size in DERIVATIVE_SIZES)
+
+
+def derivative_name(filename, size, fmt):
+    return f"{filename.rsplit('.', 1)[0]}_{size}.{fmt}"
+
+
+def generate_derivatives(source_path, formats=None):
+    """Write every size/format derivative next to source_path.
+
+    Returns {size: {format: filename}} for the files written. Derivatives are
+    never upscaled, so a small source yields same-sized files per size.
+    """
+    formats = available_formats() if formats is None else formats
+    folder, filename = os.path.split(source_path)
+    variants = {}
+
+    with Image.open(source_path) as img:
+        img.load()
+        if img.mode not in ('RGB', 'RGBA'):
+            img = img.convert('RGBA' if 'transparency' in img.info else 'RGB')
+
+        # Largest first, so each smaller size is resampled from a smaller image
+        current = img
+        for size, bounds in sorted(DERIVATIVE_SIZES.items(), key=lambda kv: -kv[1][0]):
+            current = current.copy()
+            current.thumbnail(bounds, Image.Resampling.LANCZOS)
+            for fmt in formats:
+                name = derivative_name(filename, size, fmt)
+                path = os.path.join(folder, name)
+                tmp_path = f"{path}.tmp"
+                current.save(tmp_path, **FORMAT_OPTIONS[fmt])
+                os.replace(tmp_path, path)
+                variants.setdefault(size, {})[fmt] = name
+
+    return variants
+
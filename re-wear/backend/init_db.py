@@ -8,9 +8,9 @@ import os
 # Add the backend directory to the path
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
 
-from app import app, create_tables
+from app import create_app, create_tables
 
 if __name__ == '__main__':
     print("Initializing database...")
-    create_tables()
+    create_tables(create_app())
     print("Database initialization complete!")
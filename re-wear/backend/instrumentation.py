@@ -0,0 +1,306 @@
+"""
+Request instrumentation: timing and SQL counts per request, a slow-query
+log, on-demand cProfile runs and Prometheus metrics at /metrics
+"""
+import cProfile
+import io
+import logging
+import os
+import pstats
+import random
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from flask import Response, g, has_request_context, request
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds, in seconds, of the request duration histogram buckets
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Upper bounds of the SQL statements-per-request histogram buckets
+STATEMENT_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+
+PROFILE_HEADER = 'X-Profile'
+
+# Who may read /metrics when no METRICS_TOKEN is configured, besides admins
+LOCAL_ADDRESSES = ('127.0.0.1', '::1')
+
+
+def parameter_shape(parameters, executemany=False):
+    """The types of bound parameters, never their values (they may be personal data)"""
+    if executemany and parameters:
+        return f"{len(parameters)} x {parameter_shape(parameters[0])}"
+    if isinstance(parameters, dict):
+        return '{' + ', '.join(f"{key}: {type(value).__name__}" for key, value in parameters.items()) + '}'
+    if isinstance(parameters, (list, tuple)):
+        return '(' + ', '.join(type(value).__name__ for value in parameters) + ')'
+    return type(parameters).__name__
+
+
+class Histogram:
+    """Cumulative Prometheus-style buckets, plus sum and count"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+    def samples(self, name, labels):
+        for bound, count in zip(self.buckets, self.counts):
+            yield f"{name}_bucket{_labels(labels, le=_number(bound))} {count}"
+        yield f"{name}_bucket{_labels(labels, le='+Inf')} {self.count}"
+        yield f"{name}_sum{_labels(labels)} {_number(self.sum)}"
+        yield f"{name}_count{_labels(labels)} {self.count}"
+
+
+class Metrics:
+    """Per-route request metrics for this process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = defaultdict(int)  # (method, route, status) -> count
+        self.durations = {}               # (method, route) -> Histogram
+        self.statements = {}              # (method, route) -> Histogram
+        self.db_seconds = defaultdict(float)
+        self.slow_queries = 0
+        self.profiles = 0
+
+    def observe(self, method, route, status, duration, statements, db_seconds):
+        key = (method, route)
+        with self._lock:
+            self.requests[(method, route, str(status))] += 1
+            self.durations.setdefault(key, Histogram(DURATION_BUCKETS)).observe(duration)
+            self.statements.setdefault(key, Histogram(STATEMENT_BUCKETS)).observe(statements)
+            self.db_seconds[key] += db_seconds
+
+    def count_slow_query(self):
+        with self._lock:
+            self.slow_queries += 1
+
+    def count_profile(self):
+        with self._lock:
+            self.profiles += 1
+
+    def render(self, prefix='rewear'):
+        """The Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            lines += [f"# HELP {prefix}_http_requests_total Requests handled, by route and status.",
+                      f"# TYPE {prefix}_http_requests_total counter"]
+            for (method, route, status), count in sorted(self.requests.items()):
+                lines.append(f"{prefix}_http_requests_total"
+                             f"{_labels({'method': method, 'route': route, 'status': status})} {count}")
+            lines += [f"# HELP {prefix}_http_request_duration_seconds Request duration, by route.",
+                      f"# TYPE {prefix}_http_request_duration_seconds histogram"]
+            for (method, route), histogram in sorted(self.durations.items()):
+                lines += histogram.samples(f"{prefix}_http_request_duration_seconds",
+                                           {'method': method, 'route': route})
+            lines += [f"# HELP {prefix}_db_statements_per_request SQL statements run per request, by route.",
+                      f"# TYPE {prefix}_db_statements_per_request histogram"]
+            for (method, route), histogram in sorted(self.statements.items()):
+                lines += histogram.samples(f"{prefix}_db_statements_per_request",
+                                           {'method': method, 'route': route})
+            lines += [f"# HELP {prefix}_db_seconds_total Time spent in SQL statements, by route.",
+                      f"# TYPE {prefix}_db_seconds_total counter"]
+            for (method, route), seconds in sorted(self.db_seconds.items()):
+                lines.append(f"{prefix}_db_seconds_total"
+                             f"{_labels({'method': method, 'route': route})} {_number(seconds)}")
+            lines += [f"# HELP {prefix}_db_slow_queries_total Statements slower than the slow-query threshold.",
+                      f"# TYPE {prefix}_db_slow_queries_total counter",
+                      f"{prefix}_db_slow_queries_total {self.slow_queries}",
+                      f"# HELP {prefix}_profiles_total Requests profiled.",
+                      f"# TYPE {prefix}_profiles_total counter",
+                      f"{prefix}_profiles_total {self.profiles}"]
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(labels, **extra):
+    labels = dict(labels, **extra)
+    escaped = (
+        f'{key}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+        for key, value in labels.items()
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Instrumentation:
+    """Times every request and the SQL it runs.
+
+    Each response gets a Server-Timing header (total and database time,
+    statement count). Statements slower than INSTRUMENT_SLOW_QUERY_MS are
+    logged with their SQL and parameter types, requests slower than
+    INSTRUMENT_SLOW_REQUEST_MS with their statement count. Sending
+    `X-Profile: 1` runs the request under cProfile when can_profile()
+    allows it and saves the profile to INSTRUMENT_PROFILE_DIR; `text`
+    returns the top of the profile instead of the response, `pyinstrument`
+    a pyinstrument HTML report (when it is installed).
+    INSTRUMENT_PROFILE_SAMPLE_RATE saves profiles of that fraction of all
+    requests.
+
+    /metrics requires `Authorization: Bearer <METRICS_TOKEN>` when a token
+    is configured; otherwise only local scrapers and can_profile() users
+    may read it.
+
+    Metrics are per process; under gunicorn each worker serves its own
+    /metrics, so scrape them with a per-process label or run one worker
+    per container.
+    """
+
+    def __init__(self, app=None, db=None, can_profile=None):
+        self.metrics = Metrics()
+        self.can_profile = can_profile or (lambda: False)
+        self.slow_query_seconds = 0.2
+        self.slow_request_seconds = 1.0
+        self.profile_sample_rate = 0.0
+        self.profile_dir = None
+        self.metrics_token = None
+        if app is not None:
+            self.init_app(app, db, can_profile)
+
+    def init_app(self, app, db, can_profile=None):
+        if can_profile is not None:
+            self.can_profile = can_profile
+        self.slow_query_seconds = app.config.setdefault('INSTRUMENT_SLOW_QUERY_MS', 200) / 1000
+        self.slow_request_seconds = app.config.setdefault('INSTRUMENT_SLOW_REQUEST_MS', 1000) / 1000
+        self.profile_sample_rate = app.config.setdefault('INSTRUMENT_PROFILE_SAMPLE_RATE', 0.0)
+        self.profile_dir = app.config.setdefault(
+            'INSTRUMENT_PROFILE_DIR', os.path.join(app.instance_path, 'profiles')
+        )
+        self.metrics_token = app.config.setdefault('METRICS_TOKEN', None)
+
+        with app.app_context():
+            for engine in db.engines.values():
+                event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+                event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+        # First in, last out: the timing wraps every other hook
+        app.before_request_funcs.setdefault(None, []).insert(0, self._before_request)
+        app.after_request(self._after_request)
+        app.add_url_rule('/metrics', 'metrics', self.metrics_view)
+        app.extensions['instrumentation'] = self
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        # On the execution context, which is dropped along with a statement
+        # that raises, so a failure cannot leave a stale start time behind
+        if context is not None:
+            context._instrument_started = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, '_instrument_started', None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        route = None
+        if has_request_context():
+            g.sql_statements = g.get('sql_statements', 0) + 1
+            g.sql_seconds = g.get('sql_seconds', 0.0) + elapsed
+            route = _route()
+        if elapsed >= self.slow_query_seconds:
+            self.metrics.count_slow_query()
+            logger.warning(
+                f"Slow query ({elapsed * 1000:.0f} ms{', ' + route if route else ''}): "
+                f"{' '.join(statement.split())[:1000]} params={parameter_shape(parameters, executemany)}"
+            )
+
+    def _before_request(self):
+        g.request_started = time.perf_counter()
+        g.sql_statements = 0
+        g.sql_seconds = 0.0
+        mode = request.headers.get(PROFILE_HEADER)
+        sampled = self.profile_sample_rate and random.random() < self.profile_sample_rate
+        if (mode and self.can_profile()) or sampled:
+            g.profile_mode = mode if mode else 'sample'
+            g.profiler = _start_profiler(g.profile_mode)
+
+    def _after_request(self, response):
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            if g.profile_mode == 'pyinstrument':
+                profiler.stop()
+            else:
+                profiler.disable()
+            response = self._profile_response(profiler, g.pop('profile_mode'), response)
+
+        started = g.get('request_started')
+        if started is None:
+            return response
+        duration = time.perf_counter() - started
+        statements = g.get('sql_statements', 0)
+        db_seconds = g.get('sql_seconds', 0.0)
+        route = _route()
+        self.metrics.observe(request.method, route, response.status_code, duration, statements, db_seconds)
+        response.headers.add(
+            'Server-Timing',
+            f'app;dur={duration * 1000:.1f}, db;dur={db_seconds * 1000:.1f};desc="{statements} queries"'
+        )
+        if duration >= self.slow_request_seconds:
+            logger.warning(
+                f"Slow request: {request.method} {request.full_path.rstrip('?')} "
+                f"{response.status_code} in {duration * 1000:.0f} ms "
+                f"({statements} queries, {db_seconds * 1000:.0f} ms in the database)"
+            )
+        return response
+
+    def _profile_response(self, profiler, mode, response):
+        self.metrics.count_profile()
+        if mode == 'pyinstrument':
+            return Response(profiler.output_html(), mimetype='text/html')
+        stats = io.StringIO()
+        pstats.Stats(profiler, stream=stats).sort_stats('cumulative').print_stats(40)
+        if mode == 'text':
+            return Response(stats.getvalue(), mimetype='text/plain')
+        try:
+            os.makedirs(self.profile_dir, exist_ok=True)
+            endpoint = (request.endpoint or 'unmatched').replace('.', '_')
+            path = os.path.join(
+                self.profile_dir, f"{datetime.utcnow():%Y%m%dT%H%M%S%f}-{endpoint}.prof"
+            )
+            profiler.dump_stats(path)
+            response.headers[PROFILE_HEADER] = os.path.basename(path)
+        except OSError as e:
+            logger.error(f"Saving profile failed: {str(e)}")
+        return response
+
+    def metrics_view(self):
+        if self.metrics_token:
+            allowed = request.headers.get('Authorization') == f"Bearer {self.metrics_token}"
+        else:
+            allowed = request.remote_addr in LOCAL_ADDRESSES or self.can_profile()
+        if not allowed:
+            return Response('Forbidden\n', status=403, mimetype='text/plain')
+        return Response(self.metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+def _start_profiler(mode):
+    if mode == 'pyinstrument':
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            g.profile_mode = 'text'
+        else:
+            profiler = Profiler()
+            profiler.start()
+            return profiler
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def _route():
+    # The URL rule, not the path, so ids do not create a series each
+    rule = request.url_rule
+    return rule.rule if rule is not None else 'unmatched'
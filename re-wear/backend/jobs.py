@@ -0,0 +1,236 @@
+"""
+Background job queue for work that should not hold up a request
+"""
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+
+try:
+    import fcntl
+except ImportError:  # Windows: owners are told apart by pid and token only
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueue:
+    """Runs jobs on a few daemon threads inside an app context.
+
+    submit() takes any callable and keeps it in memory only. Tasks registered
+    with @queue.task are enqueued by name with JSON-serializable arguments;
+    when the queue has a journal_dir each such job is written to disk before
+    it is queued and removed once it finishes, so jobs interrupted by a crash
+    or restart are picked up again by recover().
+
+    Worker threads (and recovery) are started on first use, so a queue
+    created at import time is safe to use from forked server workers.
+    Journal files carry the owner id of the process running them, its pid
+    plus a random token, and each owner holds an flock on `<owner>.lock` for
+    as long as it lives. recover() only takes over jobs whose owner's lock
+    is free, so workers sharing a journal_dir never run the same job twice,
+    and jobs left by an earlier process are recovered even when a new one
+    gets the same pid (as happens on every container restart).
+    """
+
+    def __init__(self, name, app=None, workers=1, journal_dir=None):
+        self.name = name
+        self.workers = workers
+        self.journal_dir = journal_dir
+        self.app = None
+        self.tasks = {}
+        self._queue = queue.Queue()
+        self._threads = []
+        self._recovered = False
+        self._start_lock = threading.Lock()
+        self._owner = None
+        self._owner_pid = None
+        self._owner_lock = threading.Lock()
+        self._lock_file = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app, journal_dir=None):
+        self.app = app
+        if journal_dir is not None:
+            self.journal_dir = journal_dir
+        app.extensions.setdefault('job_queues', {})[self.name] = self
+        if self.journal_dir:
+            os.makedirs(self.journal_dir, exist_ok=True)
+            # Resume journaled work as soon as the process serves traffic
+            app.before_request(self._ensure_started)
+
+    def task(self, func):
+        """Register func so it can be enqueued by name with enqueue()"""
+        self.tasks[func.__name__] = func
+        return func
+
+    def _ensure_started(self):
+        if len(self._threads) < self.workers or not self._recovered:
+            self._start()
+
+    def _start(self):
+        with self._start_lock:
+            self._threads = [t for t in self._threads if t.is_alive()]
+            for i in range(len(self._threads), self.workers):
+                thread = threading.Thread(
+                    target=self._run, name=f"{self.name}-{i}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+            if not self._recovered:
+                self._recovered = True
+                self.recover()
+
+    def _run(self):
+        while True:
+            func, args, kwargs, journal_path = self._queue.get()
+            try:
+                with self.app.app_context():
+                    func(*args, **kwargs)
+            except Exception as e:
+                logger.error(f"Background job {self.name} failed: {str(e)}")
+            finally:
+                if journal_path:
+                    try:
+                        os.remove(journal_path)
+                    except OSError:
+                        pass
+                self._queue.task_done()
+
+    def submit(self, func, *args, **kwargs):
+        self._ensure_started()
+        self._queue.put((func, args, kwargs, None))
+
+    def enqueue(self, task_name, **payload):
+        """Queue a registered task, journaling it first if the queue is durable"""
+        func = self.tasks[task_name]
+        journal_path = None
+        if self.journal_dir:
+            journal_path = os.path.join(self.journal_dir, f"{uuid.uuid4().hex}.{self._owner_id()}.json")
+            tmp_path = journal_path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump({'task': task_name, 'payload': payload}, f)
+            os.replace(tmp_path, journal_path)
+        self._ensure_started()
+        self._queue.put((func, (), payload, journal_path))
+
+    def recover(self):
+        """Re-queue journaled jobs left over from a previous process"""
+        if not self.journal_dir:
+            return 0
+        recovered = 0
+        for filename in sorted(os.listdir(self.journal_dir)):
+            if not filename.endswith('.json'):
+                continue
+            journal_path = self._claim(filename)
+            if journal_path is None:
+                continue
+            try:
+                with open(journal_path) as f:
+                    job = json.load(f)
+                func = self.tasks[job['task']]
+            except (OSError, ValueError, KeyError) as e:
+                logger.error(f"Dropping unreadable job {filename}: {str(e)}")
+                os.remove(journal_path)
+                continue
+            self._queue.put((func, (), job['payload'], journal_path))
+            recovered += 1
+        if recovered:
+            logger.info(f"Recovered {recovered} {self.name} jobs")
+        self._remove_stale_locks()
+        return recovered
+
+    def _owner_id(self):
+        """This process's owner id, created (and its lock taken) on first use after a fork"""
+        pid = os.getpid()
+        if self._owner_pid != pid:
+            with self._owner_lock:
+                if self._owner_pid != pid:
+                    owner = f"{pid}-{uuid.uuid4().hex[:12]}"
+                    if fcntl is not None:
+                        # Locked before it appears under its real name, so a lock
+                        # file that exists but is free always means a dead owner
+                        tmp_path = self._lock_path(owner) + '.tmp'
+                        lock_file = open(tmp_path, 'w')
+                        fcntl.flock(lock_file, fcntl.LOCK_EX)
+                        os.replace(tmp_path, self._lock_path(owner))
+                        self._lock_file = lock_file
+                    self._owner, self._owner_pid = owner, pid
+        return self._owner
+
+    def _lock_path(self, owner):
+        return os.path.join(self.journal_dir, f"{owner}.lock")
+
+    def _owner_alive(self, owner):
+        pid, _, token = owner.partition('-')
+        if not pid.isdigit():
+            return False
+        if token and fcntl is not None:
+            try:
+                lock_file = open(self._lock_path(owner), 'a')
+            except FileNotFoundError:
+                return False
+            with lock_file:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    return True
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+                return False
+        # A pid equal to ours belonged to an earlier process: ours is self._owner
+        return int(pid) != os.getpid() and _process_alive(int(pid))
+
+    def _remove_stale_locks(self):
+        if fcntl is None:
+            return
+        mine = self._owner_id()
+        for filename in os.listdir(self.journal_dir):
+            owner = filename[:-len('.lock')]
+            if filename.endswith('.lock') and owner != mine and not self._owner_alive(owner):
+                try:
+                    os.remove(os.path.join(self.journal_dir, filename))
+                except OSError:
+                    pass
+
+    def _claim(self, filename):
+        """Take over a journaled job left by an exited process; its new path, or None"""
+        job_id, _, owner = filename[:-len('.json')].partition('.')
+        mine = self._owner_id()
+        if owner == mine or self._owner_alive(owner):
+            return None
+        claimed = os.path.join(self.journal_dir, f"{job_id}.{mine}.json")
+        try:
+            os.rename(os.path.join(self.journal_dir, filename), claimed)
+        except FileNotFoundError:
+            return None  # Another worker claimed it first
+        return claimed
+
+    def join(self, timeout=None):
+        """Block until every submitted job has finished; False if timeout ran out first"""
+        if timeout is None:
+            self._queue.join()
+            return True
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    @property
+    def pending(self):
+        return self._queue.qsize()
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
@@ -0,0 +1,137 @@
+"""
+Points ledger: every change to a user's balance is a conditional UPDATE on
+the user row plus an append-only transaction row, in the caller's transaction
+"""
+import logging
+from datetime import datetime
+
+from sqlalchemy import func, select
+
+logger = logging.getLogger(__name__)
+
+
+class LedgerError(Exception):
+    pass
+
+
+class InsufficientPoints(LedgerError):
+    pass
+
+
+class PointsLedger:
+    """Balance changes that stay correct under concurrent requests.
+
+    Debits only apply `WHERE points >= :amount`, and status changes only
+    apply `WHERE status = :expected`. The database decides the winner, so
+    two requests that both passed their Python-side checks cannot both
+    succeed. Entries can carry an idempotency key, unique per user, so a
+    retried request can find the transaction it already made.
+
+    Callables in balance_listeners are called with the user id of every
+    balance change, inside the transaction that makes it.
+    """
+
+    def __init__(self, app=None, db=None, users=None, transactions=None):
+        self.db = db
+        self.users = users
+        self.transactions = transactions
+        self.balance_listeners = []
+        if app is not None:
+            self.init_app(app, db, users, transactions)
+
+    def init_app(self, app, db, users, transactions):
+        self.db = db
+        self.users = users
+        self.transactions = transactions
+        app.extensions['points_ledger'] = self
+
+    def transition(self, table, row_id, from_status, to_status, **values):
+        """Move a row from one status to another; False if it was no longer in from_status"""
+        result = self.db.session.execute(
+            table.update()
+            .where(table.c.id == row_id, table.c.status == from_status)
+            .values(status=to_status, **values)
+        )
+        return result.rowcount == 1
+
+    def _apply(self, user_id, delta, condition=None):
+        users = self.users
+        statement = users.update().where(users.c.id == user_id).values(points=users.c.points + delta)
+        if condition is not None:
+            statement = statement.where(condition)
+        for listener in self.balance_listeners:
+            listener(user_id)
+        if self.db.engine.dialect.update_returning:
+            row = self.db.session.execute(statement.returning(users.c.points)).first()
+            return row[0] if row else None
+        if self.db.session.execute(statement).rowcount != 1:
+            return None
+        return self.db.session.execute(
+            select(users.c.points).where(users.c.id == user_id)
+        ).scalar()
+
+    def record(self, user_id, delta, kind, balance_after, idempotency_key=None, **refs):
+        """Append a transaction row; use directly when the balance was set elsewhere"""
+        self.db.session.execute(self.transactions.insert().values(
+            user_id=user_id, delta=delta, balance_after=balance_after, kind=kind,
+            idempotency_key=idempotency_key, created_at=datetime.utcnow(), **refs
+        ))
+
+    def credit(self, user_id, amount, kind, idempotency_key=None, **refs):
+        """Add points; returns the new balance"""
+        balance = self._apply(user_id, amount)
+        if balance is None:
+            raise LedgerError(f"User {user_id} not found")
+        self.record(user_id, amount, kind, balance, idempotency_key, **refs)
+        return balance
+
+    def debit(self, user_id, amount, kind, idempotency_key=None, **refs):
+        """Remove points if the balance covers them; returns the new balance"""
+        balance = self._apply(user_id, -amount, self.users.c.points >= amount)
+        if balance is None:
+            raise InsufficientPoints(f"User {user_id} has fewer than {amount} points")
+        self.record(user_id, -amount, kind, balance, idempotency_key, **refs)
+        return balance
+
+    def transfer(self, payer_id, payee_id, amount, kind, idempotency_key=None, **refs):
+        """Move points between users; returns the payer's new balance.
+
+        The idempotency key belongs to the payer's request, so only the debit
+        carries it; the payee's keys stay free for their own requests.
+        """
+        balance = self.debit(payer_id, amount, kind, idempotency_key, **refs)
+        self.credit(payee_id, amount, kind, **refs)
+        return balance
+
+    def find(self, user_id, idempotency_key):
+        """The user's transaction made under idempotency_key, if any"""
+        if not idempotency_key:
+            return None
+        txns = self.transactions
+        return self.db.session.execute(
+            select(txns).where(txns.c.user_id == user_id, txns.c.idempotency_key == idempotency_key)
+        ).first()
+
+    def open_balances(self):
+        """Record an opening entry for every user that has no ledger history yet"""
+        users, txns = self.users, self.transactions
+        has_entries = select(txns.c.id).where(txns.c.user_id == users.c.id).exists()
+        rows = self.db.session.execute(
+            select(users.c.id, users.c.points).where(~has_entries)
+        ).fetchall()
+        for user_id, points in rows:
+            self.record(user_id, points or 0, 'opening_balance', points or 0)
+        self.db.session.commit()
+        return len(rows)
+
+    def mismatched_balances(self):
+        """(user_id, points, ledger total) for users whose balance disagrees with the ledger"""
+        users, txns = self.users, self.transactions
+        totals = select(
+            txns.c.user_id, func.sum(txns.c.delta).label('total')
+        ).group_by(txns.c.user_id).subquery()
+        return self.db.session.execute(
+            select(users.c.id, users.c.points, func.coalesce(totals.c.total, 0))
+            .outerjoin(totals, totals.c.user_id == users.c.id)
+            .where(users.c.points != func.coalesce(totals.c.total, 0))
+        ).fetchall()
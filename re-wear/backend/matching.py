@@ -0,0 +1,295 @@
+"""
+Multi-party swap matching: finds disjoint exchange cycles (A wants B's item,
+B wants C's, C wants A's) in the want-graph built from pending swap requests
+"""
+import logging
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import and_, func, select
+
+logger = logging.getLogger(__name__)
+
+# requester wants item_id (worth points) from owner, as asked in request_id
+Want = namedtuple('Want', 'requester owner item_id points request_id')
+
+
+class SwapCycle(namedtuple('SwapCycle', 'wants')):
+    """Each participant receives the item of the next want and gives one item to the previous"""
+
+    __slots__ = ()
+
+    @property
+    def users(self):
+        return [want.requester for want in self.wants]
+
+    def balances(self):
+        """Points each participant receives minus points they give"""
+        gives = {want.owner: want.points for want in self.wants}
+        return {want.requester: want.points - gives[want.requester] for want in self.wants}
+
+    def to_dict(self):
+        balances = self.balances()
+        givers = {want.owner: want.item_id for want in self.wants}
+        return {
+            'length': len(self.wants),
+            'participants': [
+                {
+                    'user_id': want.requester,
+                    'receives_item_id': want.item_id,
+                    'gives_item_id': givers[want.requester],
+                    'request_id': want.request_id,
+                    'points_balance': balances[want.requester]
+                }
+                for want in self.wants
+            ]
+        }
+
+
+def build_graph(wants):
+    """requester -> {owner: want}; of several wants between a pair, the oldest request wins"""
+    graph = {}
+    for want in wants:
+        if want.requester == want.owner:
+            continue
+        edges = graph.setdefault(want.requester, {})
+        current = edges.get(want.owner)
+        if current is None or want.request_id < current.request_id:
+            edges[want.owner] = want
+    return graph
+
+
+def strongly_connected_components(graph):
+    """Tarjan's algorithm, iterative so 100k-node graphs do not hit the recursion limit"""
+    index = {}
+    lowlink = {}
+    on_stack = set()
+    stack = []
+    components = []
+    counter = 0
+
+    for root in graph:
+        if root in index:
+            continue
+        work = [(root, iter(graph.get(root, ())))]
+        index[root] = lowlink[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack.add(root)
+        while work:
+            node, neighbours = work[-1]
+            advanced = False
+            for neighbour in neighbours:
+                if neighbour not in index:
+                    index[neighbour] = lowlink[neighbour] = counter
+                    counter += 1
+                    stack.append(neighbour)
+                    on_stack.add(neighbour)
+                    work.append((neighbour, iter(graph.get(neighbour, ()))))
+                    advanced = True
+                    break
+                if neighbour in on_stack:
+                    lowlink[node] = min(lowlink[node], index[neighbour])
+            if advanced:
+                continue
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                lowlink[parent] = min(lowlink[parent], lowlink[node])
+            if lowlink[node] == index[node]:
+                component = []
+                while True:
+                    member = stack.pop()
+                    on_stack.discard(member)
+                    component.append(member)
+                    if member == node:
+                        break
+                components.append(component)
+    return components
+
+
+def _balanced(incoming, outgoing, max_imbalance):
+    # The user gives the item `incoming` asks for and receives the one `outgoing` asks for
+    return max_imbalance is None or abs(outgoing.points - incoming.points) <= max_imbalance
+
+
+def _distances_to(graph_reverse, target, members, depth):
+    """Fewest edges from each member to target, up to depth"""
+    distances = {target: 0}
+    frontier = [target]
+    for distance in range(1, depth + 1):
+        next_frontier = []
+        for node in frontier:
+            for previous in graph_reverse.get(node, ()):
+                if previous in members and previous not in distances:
+                    distances[previous] = distance
+                    next_frontier.append(previous)
+        frontier = next_frontier
+    return distances
+
+
+def _find_cycle(graph, graph_reverse, start, length, members, max_imbalance, budget):
+    """A cycle through start of at most `length` users within members, or None"""
+    distances = _distances_to(graph_reverse, start, members, length - 1)
+    path = [start]
+    wants = []
+    on_path = {start}
+    work = [iter(graph[start].items())]
+    while work:
+        budget -= 1
+        if budget < 0:
+            return None
+        step = next(work[-1], None)
+        if step is None:
+            work.pop()
+            on_path.discard(path.pop())
+            if wants:
+                wants.pop()
+            continue
+        neighbour, want = step
+        if wants and not _balanced(wants[-1], want, max_imbalance):
+            continue
+        if neighbour == start:
+            if len(path) >= 2 and _balanced(want, wants[0], max_imbalance):
+                return SwapCycle(wants + [want])
+            continue
+        # Users still allowed after this one, each adding one edge towards start
+        remaining = length - len(path)
+        if neighbour in on_path or distances.get(neighbour, length) > remaining:
+            continue
+        path.append(neighbour)
+        on_path.add(neighbour)
+        wants.append(want)
+        work.append(iter(graph[neighbour].items()))
+    return None
+
+
+def find_cycles(wants, max_length=3, max_imbalance=None, search_budget=10000):
+    """Disjoint exchange cycles of 2..max_length users.
+
+    Only users in the same strongly connected component can share a cycle,
+    so everything outside a non-trivial component is dropped first. Within
+    each component, shorter cycles are taken greedily before longer ones
+    (they are the likeliest to complete), and a user joins at most one cycle.
+    max_imbalance caps, per participant, the points difference between the
+    item received and the item given. search_budget bounds the work spent
+    looking for a cycle through any one user.
+    """
+    graph = build_graph(wants)
+    graph_reverse = {}
+    for requester, edges in graph.items():
+        for owner in edges:
+            graph_reverse.setdefault(owner, []).append(requester)
+
+    cycles = []
+    for component in strongly_connected_components(graph):
+        if len(component) < 2:
+            continue
+        members = set(component)
+        component.sort()
+        for length in range(2, max_length + 1):
+            for start in component:
+                if start not in members:
+                    continue
+                cycle = _find_cycle(graph, graph_reverse, start, length, members, max_imbalance, search_budget)
+                if cycle is not None:
+                    cycles.append(cycle)
+                    members.difference_update(cycle.users)
+    return cycles
+
+
+class SwapMatcher:
+    """Runs find_cycles() over the open swap requests, on demand or every `interval` seconds.
+
+    Only requests for approved swap listings count. The result of the last
+    run is kept for the admin dashboard; cycles are proposals, and each leg
+    still goes through the normal accept flow.
+    """
+
+    def __init__(self, app=None, db=None, swap_requests=None, items=None, interval=0):
+        self.interval = interval
+        self.max_length = 3
+        self.max_imbalance = None
+        self.app = None
+        self.db = db
+        self.swap_requests = swap_requests
+        self.items = items
+        self.last_run = None
+        self._thread = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app, db, swap_requests, items)
+
+    def init_app(self, app, db, swap_requests, items):
+        self.app = app
+        self.db = db
+        self.swap_requests = swap_requests
+        self.items = items
+        self.max_length = app.config.setdefault('SWAP_CYCLE_MAX_LENGTH', self.max_length)
+        self.max_imbalance = app.config.setdefault('SWAP_CYCLE_MAX_IMBALANCE', self.max_imbalance)
+        app.extensions['swap_matcher'] = self
+        if self.interval:
+            # Started by the first request, so each forked server worker gets its own thread
+            app.before_request(self._ensure_started)
+
+    def open_wants(self):
+        requests, items = self.swap_requests, self.items
+        rows = self.db.session.execute(
+            select(
+                requests.c.requester_id, requests.c.owner_id, requests.c.item_id,
+                func.coalesce(items.c.points, 0), requests.c.id
+            )
+            .join(items, and_(items.c.id == requests.c.item_id, items.c.user_id == requests.c.owner_id))
+            .where(
+                requests.c.status == 'pending',
+                items.c.status == 'approved',
+                items.c.listing_type == 'swap'
+            )
+        )
+        return [Want(*row) for row in rows]
+
+    def run(self, max_length=None, max_imbalance=None):
+        """Match the current open requests; returns (and keeps) a summary of the run"""
+        max_length = max_length or self.max_length
+        if max_imbalance is None:
+            max_imbalance = self.max_imbalance
+        with self._lock:
+            started_at = datetime.utcnow()
+            start = time.perf_counter()
+            wants = self.open_wants()
+            loaded = time.perf_counter()
+            cycles = find_cycles(wants, max_length, max_imbalance)
+            finished = time.perf_counter()
+            self.last_run = {
+                'started_at': started_at,
+                'open_requests': len(wants),
+                'max_length': max_length,
+                'max_imbalance': max_imbalance,
+                'load_ms': round((loaded - start) * 1000, 1),
+                'match_ms': round((finished - loaded) * 1000, 1),
+                'matched_users': sum(len(cycle.wants) for cycle in cycles),
+                'cycles': [cycle.to_dict() for cycle in cycles]
+            }
+        logger.info(
+            f"Swap matching: {len(cycles)} cycles from {len(wants)} open requests "
+            f"in {self.last_run['match_ms']} ms"
+        )
+        return self.last_run
+
+    def _ensure_started(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name='swap-matcher', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                with self.app.app_context():
+                    self.run()
+            except Exception as e:
+                logger.error(f"Swap matching failed: {str(e)}")
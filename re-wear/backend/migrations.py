@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Versioned schema migrations.
+
+Each migration runs once per database, in version order, and is recorded in
+the schema_version table. Migrations must be safe to run against a database
+created by the old drop_all/create_all bootstrap, so they check for existing
+columns and use IF NOT EXISTS where they can.
+
+    python migrations.py             # apply pending migrations
+    python migrations.py --status    # show applied/pending versions
+    python migrations.py --explain   # show query plans for the hot queries
+"""
+import argparse
+import logging
+import os
+import sys
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS = []
+
+
+def migration(version, description):
+    def register(func):
+        MIGRATIONS.append((version, description, func))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return func
+    return register
+
+
+def _ensure_version_table(db):
+    db.session.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_version ("
+        "version INTEGER PRIMARY KEY, description VARCHAR(200), applied_at TIMESTAMP)"
+    ))
+    db.session.commit()
+
+
+def applied_versions(db):
+    _ensure_version_table(db)
+    return {row[0] for row in db.session.execute(text("SELECT version FROM schema_version"))}
+
+
+def migrate(db, app):
+    """Apply every pending migration; returns the versions applied"""
+    done = applied_versions(db)
+    applied = []
+    for version, description, func in MIGRATIONS:
+        if version in done:
+            continue
+        logger.info(f"Applying migration {version}: {description}")
+        try:
+            func(db, app)
+            db.session.execute(
+                text("INSERT INTO schema_version (version, description, applied_at) "
+                     "VALUES (:version, :description, :applied_at)"),
+                {'version': version, 'description': description, 'applied_at': datetime.utcnow()}
+            )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            logger.error(f"Migration {version} failed")
+            raise
+        applied.append(version)
+    return applied
+
+
+def _add_missing_columns(db, table, columns):
+    existing = {col['name'] for col in inspect(db.engine).get_columns(table)}
+    for name, ddl in columns.items():
+        if name not in existing:
+            db.session.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+
+
+@migration(1, 'Base schema')
+def create_base_schema(db, app):
+    # Creates only missing tables, so databases from the old bootstrap are kept
+    db.create_all()
+
+
+@migration(2, 'Upload processing state and image derivatives')
+def add_processing_columns(db, app):
+    _add_missing_columns(db, 'item', {'processing_state': "VARCHAR(20) DEFAULT 'ready'"})
+    _add_missing_columns(db, 'item_image', {'variants': 'JSON'})
+
+
+@migration(3, 'Full-text search index')
+def create_search_index(db, app):
+    search_index = app.extensions['item_search']
+    if search_index.create():
+        search_index.rebuild()
+
+
+@migration(4, 'Composite indexes for browse, moderation and swap history')
+def create_hot_path_indexes(db, app):
+    # The indexes are declared on the models; create whichever are missing
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+
+
+@migration(5, 'Materialized admin dashboard counters')
+def create_admin_stats(db, app):
+    admin_stats = app.extensions['admin_stats']
+    admin_stats.create()
+    admin_stats.reconcile()
+
+
+@migration(6, 'Points ledger')
+def create_points_ledger(db, app):
+    db.metadata.tables['points_transaction'].create(db.engine, checkfirst=True)
+    app.extensions['points_ledger'].open_balances()
+
+
+@migration(7, 'Precomputed recommendation feeds')
+def create_feed_tables(db, app):
+    app.extensions['feed_recommender'].create()
+
+
+@migration(8, "Idempotency keys only on the payer's side of transfers")
+def clear_credit_idempotency_keys(db, app):
+    # Transfers used to copy the payer's key onto the payee's credit entry
+    db.session.execute(text(
+        "UPDATE points_transaction SET idempotency_key = NULL "
+        "WHERE kind = 'redeem' AND delta > 0 AND idempotency_key IS NOT NULL"
+    ))
+
+
+# Hot queries that must be served by an index, as (label, SQL, params)
+HOT_QUERIES = [
+    ('browse items',
+     "SELECT id FROM item WHERE status = :status AND listing_type = :listing_type "
+     "ORDER BY created_at DESC LIMIT 20",
+     {'status': 'approved', 'listing_type': 'swap'}),
+    ('browse items by category',
+     "SELECT id FROM item WHERE status = :status AND listing_type = :listing_type "
+     "AND category_id = :category_id ORDER BY created_at DESC LIMIT 20",
+     {'status': 'approved', 'listing_type': 'swap', 'category_id': 1}),
+    ('browse items after cursor',
+     "SELECT id FROM item WHERE status = :status AND listing_type = :listing_type "
+     "AND (created_at < :created_at OR (created_at = :created_at AND id < :id)) "
+     "ORDER BY created_at DESC, id DESC LIMIT 21",
+     {'status': 'approved', 'listing_type': 'swap', 'created_at': '2025-01-01 00:00:00', 'id': 1}),
+    ('feed candidate pool',
+     "SELECT id FROM item WHERE status = :status ORDER BY created_at DESC LIMIT 2000",
+     {'status': 'approved'}),
+    ('pending items',
+     "SELECT id FROM item WHERE status = :status ORDER BY created_at DESC",
+     {'status': 'pending'}),
+    ('user items',
+     "SELECT id FROM item WHERE user_id = :user_id ORDER BY created_at DESC",
+     {'user_id': 1}),
+    ('swap requests sent',
+     "SELECT id FROM swap_request WHERE requester_id = :user_id ORDER BY created_at DESC",
+     {'user_id': 1}),
+    ('swap requests received',
+     "SELECT id FROM swap_request WHERE owner_id = :user_id ORDER BY created_at DESC",
+     {'user_id': 1}),
+    ('pending request check',
+     "SELECT id FROM swap_request WHERE item_id = :item_id AND requester_id = :user_id AND status = :status",
+     {'item_id': 1, 'user_id': 1, 'status': 'pending'}),
+    ('primary image',
+     "SELECT image_path FROM item_image WHERE item_id = :item_id AND is_primary = :is_primary",
+     {'item_id': 1, 'is_primary': True}),
+    ('images by path',
+     "SELECT item_id FROM item_image WHERE image_path = :path",
+     {'path': 'x.jpg'}),
+    ('item tags',
+     "SELECT tag FROM item_tag WHERE item_id = :item_id",
+     {'item_id': 1}),
+]
+
+
+def explain_hot_queries(db):
+    """Return {label: [plan lines]} for HOT_QUERIES; SQLite only"""
+    plans = {}
+    for label, sql, params in HOT_QUERIES:
+        rows = db.session.execute(text(f"EXPLAIN QUERY PLAN {sql}"), params).fetchall()
+        plans[label] = [row[-1] for row in rows]
+    return plans
+
+
+def unindexed_hot_queries(db):
+    """Labels of hot queries whose plan scans a table or sorts without an index"""
+    return [
+        label for label, plan in explain_hot_queries(db).items()
+        if any(line.startswith('SCAN') or 'TEMP B-TREE' in line for line in plan)
+    ]
+
+
+if __name__ == '__main__':
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+    from app import create_app, db
+
+    app = create_app()
+
+    parser = argparse.ArgumentParser(description="ReWear schema migrations")
+    parser.add_argument('--status', action='store_true', help='List applied and pending migrations')
+    parser.add_argument('--explain', action='store_true', help='Print query plans for the hot queries')
+    args = parser.parse_args()
+
+    with app.app_context():
+        if args.status:
+            done = applied_versions(db)
+            for version, description, _ in MIGRATIONS:
+                print(f"{'applied' if version in done else 'pending':<8} {version:>3}  {description}")
+        elif args.explain:
+            for label, plan in explain_hot_queries(db).items():
+                print(f"{label}:")
+                for line in plan:
+                    print(f"    {line}")
+            missing = unindexed_hot_queries(db)
+            print("All hot queries use an index." if not missing else f"Not indexed: {', '.join(missing)}")
+            sys.exit(1 if missing else 0)
+        else:
+            applied = migrate(db, app)
+            print(f"Applied migrations: {applied}" if applied else "Database is up to date.")
@@ -0,0 +1,104 @@
+"""
+Keyset (cursor) pagination over newest-first listings keyed on (created_at, id)
+"""
+import base64
+import json
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+NEXT = 'n'
+PREV = 'p'
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(direction, row):
+    payload = json.dumps([direction, row.created_at.isoformat(), row.id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return (direction, created_at, id); raises InvalidCursor for a malformed cursor"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        direction, created_at, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        if direction not in (NEXT, PREV):
+            raise ValueError(direction)
+        return direction, datetime.fromisoformat(created_at), int(row_id)
+    except (TypeError, ValueError, json.JSONDecodeError) as e:
+        raise InvalidCursor("Invalid pagination cursor.") from e
+
+
+def keyset_page(query, model, limit, cursor=None):
+    """Fetch one newest-first page of query without OFFSET or COUNT.
+
+    Returns (rows, page_info) where page_info carries opaque next/prev
+    cursors. Any ordering already on query is replaced.
+    """
+    created_at, row_id = model.created_at, model.id
+    direction = NEXT
+    if cursor:
+        direction, cursor_created_at, cursor_id = decode_cursor(cursor)
+        if direction == NEXT:
+            query = query.filter(or_(
+                created_at < cursor_created_at,
+                and_(created_at == cursor_created_at, row_id < cursor_id)
+            ))
+        else:
+            query = query.filter(or_(
+                created_at > cursor_created_at,
+                and_(created_at == cursor_created_at, row_id > cursor_id)
+            ))
+
+    if direction == NEXT:
+        query = query.order_by(None).order_by(created_at.desc(), row_id.desc())
+    else:
+        query = query.order_by(None).order_by(created_at.asc(), row_id.asc())
+
+    # One extra row tells whether another page exists in this direction
+    rows = query.limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    if direction == NEXT:
+        has_next, has_prev = has_more, cursor is not None
+    else:
+        rows.reverse()
+        has_next, has_prev = True, has_more
+
+    return rows, {
+        'mode': 'cursor',
+        'limit': limit,
+        'has_next': has_next and bool(rows),
+        'has_prev': has_prev and bool(rows),
+        'next_cursor': encode_cursor(NEXT, rows[-1]) if has_next and rows else None,
+        'prev_cursor': encode_cursor(PREV, rows[0]) if has_prev and rows else None
+    }
+
+
+class CachedCount:
+    """Short-lived cache of COUNT(*) results, keyed by the caller's filter key"""
+
+    def __init__(self, ttl=60, max_entries=1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, count_func):
+        now = time.monotonic()
+        with self._lock:
+            cached = self._values.get(key)
+            if cached and cached[1] > now:
+                return cached[0]
+        value = count_func()
+        with self._lock:
+            if len(self._values) >= self.max_entries:
+                self._values.clear()
+            self._values[key] = (value, now + self.ttl)
+        return value
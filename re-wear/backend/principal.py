@@ -0,0 +1,103 @@
+"""
+The signed-in user, loaded at most once per request (g.current_user) and
+kept for a few seconds in a per-process cache between requests
+"""
+import logging
+import threading
+import time
+
+from flask import g, session
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import make_transient_to_detached
+
+logger = logging.getLogger(__name__)
+
+STALE_KEY = 'principals_stale'
+
+
+class PrincipalCache:
+    """Request- and process-scoped cache of User rows keyed by id.
+
+    The process cache holds detached copies that are never attached to a
+    session; each request gets its own instance through
+    `session.merge(load=False)`, which costs no SQL. Anything that changes a
+    user's profile, points or role must call invalidate() after committing
+    (or invalidate_after_commit() inside the transaction). Other processes
+    see the change once PRINCIPAL_CACHE_TTL runs out.
+    """
+
+    def __init__(self, app=None, db=None, model=None, ttl=5, max_entries=10000):
+        self.db = db
+        self.model = model
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+        # Bumped by every invalidation, so a load that raced one is not cached
+        self._invalidations = 0
+        if app is not None:
+            self.init_app(app, db, model)
+
+    def init_app(self, app, db, model):
+        self.db = db
+        self.model = model
+        self.ttl = app.config.setdefault('PRINCIPAL_CACHE_TTL', self.ttl)
+        event.listen(db.session, 'after_commit', self._after_commit)
+        event.listen(db.session, 'after_rollback', self._after_rollback)
+        app.extensions['principals'] = self
+
+    def current_user(self):
+        """The signed-in user, or None; the same instance for the whole request"""
+        if 'current_user' not in g:
+            user_id = session.get('user_id')
+            g.current_user = self.get(user_id) if user_id is not None else None
+        return g.current_user
+
+    def get(self, user_id):
+        """The user attached to the current session, from the cache when fresh"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            generation = self._invalidations
+        if entry and entry[0] > now:
+            return self.db.session.merge(entry[1], load=False)
+
+        user = self.db.session.get(self.model, user_id)
+        if user is None:
+            return None
+        snapshot = self._detached_copy(user)
+        with self._lock:
+            if generation == self._invalidations:
+                if len(self._entries) >= self.max_entries:
+                    self._entries.clear()
+                self._entries[user_id] = (now + self.ttl, snapshot)
+        return user
+
+    def _detached_copy(self, user):
+        mapper = inspect(self.model)
+        copy = self.model(**{attr.key: getattr(user, attr.key) for attr in mapper.column_attrs})
+        make_transient_to_detached(copy)
+        return copy
+
+    def invalidate(self, *user_ids):
+        with self._lock:
+            self._invalidations += 1
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+
+    def invalidate_after_commit(self, user_id):
+        """Invalidate once the current transaction commits, so no reader caches the old row"""
+        self.db.session.info.setdefault(STALE_KEY, set()).add(user_id)
+
+    def _after_commit(self, db_session):
+        stale = db_session.info.pop(STALE_KEY, None)
+        if stale:
+            self.invalidate(*stale)
+
+    def _after_rollback(self, db_session):
+        db_session.info.pop(STALE_KEY, None)
+
+    def clear(self):
+        with self._lock:
+            self._invalidations += 1
+            self._entries.clear()
@@ -0,0 +1,315 @@
+"""
+Personalized item feed: candidates are scored offline per user and stored as
+a short list of item ids, so serving a feed is one primary-key lookup
+"""
+import heapq
+import logging
+import math
+import threading
+import time
+from collections import Counter, namedtuple
+from datetime import datetime, timedelta
+
+from sqlalchemy import bindparam, text
+
+logger = logging.getLogger(__name__)
+
+# How much each kind of evidence says about a user's taste
+SIGNAL_WEIGHTS = {
+    'listed': 1.0,     # items the user put up themselves (their size, their style)
+    'requested': 2.0,  # items they asked for
+    'received': 3.0    # swaps and redemptions that completed
+}
+
+# How much each score component counts towards the final ranking
+SCORE_WEIGHTS = {
+    'category': 3.0,
+    'size': 1.5,
+    'tags': 2.0,
+    'visual': 2.0,
+    'popularity': 1.0,
+    'freshness': 1.0
+}
+
+Candidate = namedtuple('Candidate', 'id user_id category_id size popularity created_at tags image')
+
+
+class Taste:
+    """Weighted counts of the categories, sizes, tags and images a user has shown interest in"""
+
+    def __init__(self):
+        self.categories = Counter()
+        self.sizes = Counter()
+        self.tags = Counter()
+        self.images = []
+        self.seen = set()
+
+    def add(self, weight, category_id, size, tags, image=None):
+        self.categories[category_id] += weight
+        self.sizes[size] += weight
+        for tag in tags:
+            self.tags[tag] += weight
+        if image and weight >= SIGNAL_WEIGHTS['requested']:
+            self.images.append(image)
+
+    def __bool__(self):
+        return bool(self.categories)
+
+
+class FeedRecommender:
+    """Precomputed top-N item ids per user, in the feed_candidate table.
+
+    Routes call mark_dirty() when a user's own signals change (a new listing,
+    a swap request, a completed swap). recompute() then rescores only those
+    users, plus any whose feed is older than `max_age` so new listings and
+    popularity changes reach everyone eventually. It runs in a background
+    thread every `interval` seconds once the first feed has been served.
+    """
+
+    feed_table = 'feed_candidate'
+    dirty_table = 'feed_dirty'
+
+    def __init__(self, app=None, db=None, visual=None, top_n=100, pool_size=2000,
+                 interval=60.0, max_age=6 * 3600):
+        self.top_n = top_n
+        self.pool_size = pool_size
+        self.interval = interval
+        self.max_age = max_age
+        self.visual = visual
+        self.app = None
+        self.db = db
+        self._thread = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app, db, visual)
+
+    def init_app(self, app, db, visual=None):
+        self.app = app
+        self.db = db
+        self.visual = visual
+        self.top_n = app.config.setdefault('FEED_TOP_N', self.top_n)
+        self.pool_size = app.config.setdefault('FEED_CANDIDATE_POOL', self.pool_size)
+        app.extensions['feed_recommender'] = self
+
+    def create(self):
+        self.db.session.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {self.feed_table} ("
+            "user_id INTEGER PRIMARY KEY, item_ids TEXT NOT NULL, computed_at TIMESTAMP NOT NULL)"
+        ))
+        self.db.session.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {self.dirty_table} ("
+            "user_id INTEGER PRIMARY KEY, marked_at TIMESTAMP NOT NULL)"
+        ))
+        self.db.session.commit()
+
+    def mark_dirty(self, *user_ids):
+        """Queue users for rescoring; runs inside the caller's transaction"""
+        now = datetime.utcnow()
+        for user_id in set(user_ids):
+            # One upsert, so concurrent requests of one user cannot both insert
+            # the mark; refreshing it keeps a running recompute from clearing it
+            self.db.session.execute(
+                text(f"INSERT INTO {self.dirty_table} (user_id, marked_at) VALUES (:user_id, :now) "
+                     "ON CONFLICT (user_id) DO UPDATE SET marked_at = excluded.marked_at"),
+                {'user_id': user_id, 'now': now}
+            )
+
+    def feed(self, user_id):
+        """(item ids best first, computed_at), or None if the user has no feed yet"""
+        self._ensure_started()
+        row = self.db.session.execute(
+            text(f"SELECT item_ids, computed_at FROM {self.feed_table} WHERE user_id = :user_id"),
+            {'user_id': user_id}
+        ).first()
+        if row is None:
+            return None
+        item_ids = [int(item_id) for item_id in row[0].split(',') if item_id]
+        return item_ids, _as_datetime(row[1])
+
+    def recompute(self, batch_size=500, max_batches=20):
+        """Rescore users marked dirty or holding a stale feed; returns how many were rescored"""
+        cutoff = datetime.utcnow() - timedelta(seconds=self.max_age)
+        self.db.session.execute(
+            text(f"INSERT INTO {self.dirty_table} (user_id, marked_at) "
+                 f"SELECT user_id, computed_at FROM {self.feed_table} f WHERE computed_at < :cutoff "
+                 f"AND NOT EXISTS (SELECT 1 FROM {self.dirty_table} d WHERE d.user_id = f.user_id)"),
+            {'cutoff': cutoff}
+        )
+        self.db.session.commit()
+
+        total = 0
+        pool = None
+        for _ in range(max_batches):
+            marks = self.db.session.execute(
+                text(f"SELECT user_id, marked_at FROM {self.dirty_table} ORDER BY marked_at LIMIT :limit"),
+                {'limit': batch_size}
+            ).fetchall()
+            if not marks:
+                break
+            if pool is None:
+                pool = self.candidate_pool()
+            self.recompute_users([user_id for user_id, _ in marks], pool)
+            for user_id, marked_at in marks:
+                # Only clear marks that were not refreshed while scoring
+                self.db.session.execute(
+                    text(f"DELETE FROM {self.dirty_table} WHERE user_id = :user_id AND marked_at <= :marked_at"),
+                    {'user_id': user_id, 'marked_at': marked_at}
+                )
+            self.db.session.commit()
+            total += len(marks)
+        return total
+
+    def recompute_users(self, user_ids, pool=None):
+        """Score and store the feeds of the given users; commits.
+
+        Returns {user_id: (item ids best first, computed_at)}, so callers need
+        not read the feeds back (a replica may not have them yet).
+        """
+        if pool is None:
+            pool = self.candidate_pool()
+        tastes = self.tastes(user_ids)
+        now = datetime.utcnow()
+        feeds = {}
+        for user_id in user_ids:
+            item_ids = self.score(tastes[user_id], pool, user_id, now)
+            feeds[user_id] = (item_ids, now)
+            params = {'user_id': user_id, 'item_ids': ','.join(map(str, item_ids)), 'now': now}
+            self.db.session.execute(
+                text(f"DELETE FROM {self.feed_table} WHERE user_id = :user_id"), params
+            )
+            self.db.session.execute(
+                text(f"INSERT INTO {self.feed_table} (user_id, item_ids, computed_at) "
+                     "VALUES (:user_id, :item_ids, :now)"), params
+            )
+        self.db.session.commit()
+        return feeds
+
+    def candidate_pool(self):
+        """The newest approved items, with what scoring needs; shared by a whole batch of users"""
+        rows = self.db.session.execute(
+            text("SELECT id, user_id, category_id, size, COALESCE(views, 0) + 3 * COALESCE(likes, 0), "
+                 "created_at FROM item WHERE status = 'approved' ORDER BY created_at DESC LIMIT :limit"),
+            {'limit': self.pool_size}
+        ).fetchall()
+        item_ids = [row[0] for row in rows]
+        tags = self._tags(item_ids)
+        images = self._primary_images(item_ids)
+        return [
+            Candidate(row[0], row[1], row[2], row[3], row[4], _as_datetime(row[5]),
+                      tags.get(row[0], ()), images.get(row[0]))
+            for row in rows
+        ]
+
+    def tastes(self, user_ids):
+        """{user id: Taste} from listings, swap requests and completed swaps, in three queries"""
+        tastes = {user_id: Taste() for user_id in user_ids}
+        if not user_ids:
+            return tastes
+        listed = self.db.session.execute(
+            text("SELECT user_id, id, category_id, size, 'listed' FROM item WHERE user_id IN :user_ids")
+            .bindparams(bindparam('user_ids', expanding=True)),
+            {'user_ids': list(user_ids)}
+        ).fetchall()
+        requested = self.db.session.execute(
+            text("SELECT r.requester_id, i.id, i.category_id, i.size, "
+                 "CASE WHEN r.status = 'completed' THEN 'received' ELSE 'requested' END "
+                 "FROM swap_request r JOIN item i ON i.id = r.item_id WHERE r.requester_id IN :user_ids")
+            .bindparams(bindparam('user_ids', expanding=True)),
+            {'user_ids': list(user_ids)}
+        ).fetchall()
+        rows = listed + requested
+        item_ids = list({row[1] for row in rows})
+        tags = self._tags(item_ids)
+        images = self._primary_images(item_ids)
+        for user_id, item_id, category_id, size, signal in rows:
+            taste = tastes[user_id]
+            taste.add(SIGNAL_WEIGHTS[signal], category_id, size, tags.get(item_id, ()), images.get(item_id))
+            taste.seen.add(item_id)
+        return tastes
+
+    def score(self, taste, pool, user_id, now):
+        """The top_n item ids of the pool for one user"""
+        visual = self._visual_scores(taste, pool)
+        max_popularity = math.log1p(max((c.popularity for c in pool), default=0)) or 1.0
+        category_total = sum(taste.categories.values()) or 1
+        size_total = sum(taste.sizes.values()) or 1
+        tag_total = sum(taste.tags.values()) or 1
+        scored = []
+        for candidate in pool:
+            if candidate.user_id == user_id or candidate.id in taste.seen:
+                continue
+            age_days = max((now - candidate.created_at).total_seconds() / 86400, 0) if candidate.created_at else 30
+            score = (
+                SCORE_WEIGHTS['popularity'] * math.log1p(candidate.popularity) / max_popularity
+                + SCORE_WEIGHTS['freshness'] / (1 + age_days / 7)
+            )
+            if taste:
+                score += (
+                    SCORE_WEIGHTS['category'] * taste.categories[candidate.category_id] / category_total
+                    + SCORE_WEIGHTS['size'] * taste.sizes[candidate.size] / size_total
+                    + SCORE_WEIGHTS['tags'] * min(sum(taste.tags[t] for t in candidate.tags) / tag_total, 1.0)
+                    + SCORE_WEIGHTS['visual'] * max(visual.get(candidate.image, 0.0), 0.0)
+                )
+            scored.append((score, candidate.id))
+        return [item_id for _, item_id in heapq.nlargest(self.top_n, scored)]
+
+    def _visual_scores(self, taste, pool):
+        # CLIP similarity only when visual search is set up; the other signals stand alone
+        if not taste.images or self.visual is None or not self.visual.enabled:
+            return {}
+        try:
+            return self.visual.taste_scores(taste.images, [c.image for c in pool if c.image])
+        except Exception as e:
+            logger.error(f"Visual feed scoring failed: {str(e)}")
+            return {}
+
+    def _tags(self, item_ids):
+        tags = {}
+        if not item_ids:
+            return tags
+        rows = self.db.session.execute(
+            text("SELECT item_id, tag FROM item_tag WHERE item_id IN :item_ids")
+            .bindparams(bindparam('item_ids', expanding=True)),
+            {'item_ids': item_ids}
+        )
+        for item_id, tag in rows:
+            tags.setdefault(item_id, []).append(tag.lower())
+        return tags
+
+    def _primary_images(self, item_ids):
+        if not item_ids or self.visual is None or not self.visual.enabled:
+            return {}
+        return dict(self.db.session.execute(
+            text("SELECT item_id, image_path FROM item_image WHERE is_primary = :primary AND item_id IN :item_ids")
+            .bindparams(bindparam('item_ids', expanding=True)),
+            {'primary': True, 'item_ids': item_ids}
+        ).fetchall())
+
+    def _ensure_started(self):
+        if self.app is None or not self.interval:
+            return
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(
+                        target=self._run, name='feed-recompute', daemon=True
+                    )
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                with self.app.app_context():
+                    rescored = self.recompute()
+                if rescored:
+                    logger.info(f"Recomputed {rescored} feeds")
+            except Exception as e:
+                logger.error(f"Recomputing feeds failed: {str(e)}")
+
+
+def _as_datetime(value):
+    # Raw SQL on SQLite returns timestamps as text
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
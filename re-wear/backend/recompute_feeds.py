@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+Rescore recommendation feeds: users marked dirty and feeds older than
+FEED_MAX_AGE, or every user with --all.
+
+    python recompute_feeds.py [--all] [--batch-size N]
+"""
+import argparse
+
+from app import create_app, db, feed_recommender, User
+
+app = create_app()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Recompute recommendation feeds")
+    parser.add_argument('--all', action='store_true', help='Rescore every active user')
+    parser.add_argument('--batch-size', type=int, default=500)
+    args = parser.parse_args()
+
+    with app.app_context():
+        if args.all:
+            user_ids = [user_id for (user_id,) in db.session.query(User.id).filter_by(is_active=True)]
+            pool = feed_recommender.candidate_pool()
+            for start in range(0, len(user_ids), args.batch_size):
+                feed_recommender.recompute_users(user_ids[start:start + args.batch_size], pool)
+            rescored = len(user_ids)
+        else:
+            rescored = feed_recommender.recompute(batch_size=args.batch_size, max_batches=10 ** 6)
+    print(f"Recomputed {rescored} feeds")
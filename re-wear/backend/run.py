@@ -1,17 +1,16 @@
 """
-Production-ready Flask application runner
+Development server runner. In production use gunicorn instead:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
 """
 import os
-from app import app, db
+from app import create_app, create_tables
+
+app = create_app()
 
 if __name__ == '__main__':
-    # Create tables if they don't exist
-    with app.app_context():
-        db.create_all()
-        
-        # Import and run initialization
-        from app import create_tables
-        create_tables()
+    # Apply pending schema migrations and seed an empty database
+    create_tables(app)
     
     # Run the application
     port = int(os.environ.get('PORT', 5001))
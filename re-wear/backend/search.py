@@ -0,0 +1,133 @@
+"""
+Full-text search over approved item listings, backed by an SQLite FTS5 index
+"""
+import logging
+import re
+
+from sqlalchemy import text, Integer, Float
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+# Relative column weights for bm25(): title, description, tags, category
+COLUMN_WEIGHTS = (10.0, 2.0, 5.0, 3.0)
+
+
+class ItemSearchIndex:
+    """Ranked prefix search over title, description, tags and category name.
+
+    Only approved items are indexed, so the routes that move an item in or out
+    of the approved state are responsible for calling index_item/remove_item.
+    On databases without FTS5 the index reports itself unavailable and callers
+    fall back to a LIKE scan.
+    """
+
+    table_name = 'item_search'
+
+    def __init__(self, db=None):
+        self.db = db
+        self._ready = False
+
+    def init_app(self, app, db):
+        self.db = db
+        app.extensions['item_search'] = self
+
+    @property
+    def ready(self):
+        """True once the FTS table is known to exist in the bound database"""
+        if not self._ready and self.db.engine.dialect.name == 'sqlite':
+            found = self.db.session.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                {'name': self.table_name}
+            ).first()
+            self._ready = found is not None
+        return self._ready
+
+    def create(self):
+        if self.db.engine.dialect.name != 'sqlite':
+            logger.info("Full-text search disabled: FTS5 requires SQLite")
+            return False
+        try:
+            self.db.session.execute(text(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.table_name} USING fts5("
+                "title, description, tags, category, "
+                "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+            ))
+            self.db.session.commit()
+        except Exception as e:
+            self.db.session.rollback()
+            logger.warning(f"Full-text search disabled: {str(e)}")
+            return False
+        self._ready = True
+        return True
+
+    def drop(self):
+        if self.db.engine.dialect.name == 'sqlite':
+            self.db.session.execute(text(f"DROP TABLE IF EXISTS {self.table_name}"))
+            self.db.session.commit()
+        self._ready = False
+
+    def index_item(self, item):
+        """Insert or refresh an item's row; runs inside the caller's transaction"""
+        if not self.ready:
+            return
+        self.remove_item(item.id)
+        self.db.session.execute(
+            text(f"INSERT INTO {self.table_name} (rowid, title, description, tags, category) "
+                 "VALUES (:id, :title, :description, :tags, :category)"),
+            {
+                'id': item.id,
+                'title': item.title,
+                'description': item.description,
+                'tags': ' '.join(tag.tag for tag in item.tags),
+                'category': item.category_ref.name if item.category_ref else ''
+            }
+        )
+
+    def remove_item(self, item_id):
+        if not self.ready:
+            return
+        self.db.session.execute(
+            text(f"DELETE FROM {self.table_name} WHERE rowid = :id"), {'id': item_id}
+        )
+
+    def rebuild(self):
+        """Repopulate the index with one INSERT ... SELECT over the item tables"""
+        if not self.ready:
+            return 0
+        self.db.session.execute(text(f"DELETE FROM {self.table_name}"))
+        result = self.db.session.execute(text(
+            f"INSERT INTO {self.table_name} (rowid, title, description, tags, category) "
+            "SELECT item.id, item.title, item.description, "
+            "COALESCE((SELECT group_concat(item_tag.tag, ' ') FROM item_tag "
+            "WHERE item_tag.item_id = item.id), ''), COALESCE(category.name, '') "
+            "FROM item LEFT JOIN category ON category.id = item.category_id "
+            "WHERE item.status = 'approved'"
+        ))
+        self.db.session.commit()
+        return result.rowcount
+
+    @staticmethod
+    def build_match_expression(search):
+        """Turn free text into an FTS5 query where every term is a quoted prefix"""
+        tokens = TOKEN_PATTERN.findall(search.lower())
+        return ' '.join(f'"{token}"*' for token in tokens)
+
+    def ranked_hits(self, search):
+        """Subquery of (item_id, rank) for matching items, best match first.
+
+        Returns None when the search text has no indexable terms.
+        """
+        expression = self.build_match_expression(search)
+        if not expression:
+            return None
+        weights = ', '.join(str(w) for w in COLUMN_WEIGHTS)
+        # LIMIT -1 stops SQLite flattening the subquery into the join: without
+        # it, a COUNT(*) over the join re-runs the MATCH for every item row
+        return text(
+            f"SELECT rowid AS item_id, bm25({self.table_name}, {weights}) AS rank "
+            f"FROM {self.table_name} WHERE {self.table_name} MATCH :expression LIMIT -1"
+        ).bindparams(expression=expression).columns(
+            item_id=Integer, rank=Float
+        ).subquery('search_hits')
@@ -0,0 +1,219 @@
+"""
+Named projections for item and swap request payloads.
+
+Rows are built from column tuples selected for the requested fields, with
+images and tags fetched in one batched query each, instead of hydrating ORM
+objects and their relationships. Owners are embedded as a short public
+summary; contact details only appear in the admin projection. Datetimes are
+left to the app's JSON provider to encode.
+"""
+from collections import namedtuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import aliased
+
+Projection = namedtuple('Projection', 'fields owner_fields')
+
+PUBLIC_OWNER_FIELDS = ('id', 'name', 'avatar', 'location', 'created_at')
+ADMIN_OWNER_FIELDS = PUBLIC_OWNER_FIELDS + ('email', 'points')
+
+CARD_FIELDS = (
+    'id', 'title', 'category', 'type', 'size', 'condition', 'points', 'status',
+    'listing_type', 'views', 'likes', 'processing_state', 'created_at', 'owner',
+    'images', 'tags', 'primary_image', 'primary_image_variants'
+)
+DETAIL_FIELDS = (
+    'id', 'title', 'description', 'category', 'type', 'size', 'condition', 'points',
+    'status', 'listing_type', 'views', 'likes', 'processing_state', 'created_at',
+    'owner', 'images', 'image_variants', 'tags', 'primary_image', 'primary_image_variants'
+)
+# Items nested inside another payload, e.g. the two sides of a swap request
+ITEM_REF_FIELDS = ('id', 'title', 'points', 'status', 'listing_type', 'primary_image', 'primary_image_variants')
+
+ITEM_PROJECTIONS = {
+    'card': Projection(CARD_FIELDS, PUBLIC_OWNER_FIELDS),
+    'detail': Projection(DETAIL_FIELDS, PUBLIC_OWNER_FIELDS),
+    'admin': Projection(DETAIL_FIELDS + ('has_bill', 'bill_path'), ADMIN_OWNER_FIELDS),
+    'ref': Projection(ITEM_REF_FIELDS, ()),
+}
+
+SWAP_PROJECTIONS = {
+    'swap-summary': Projection((
+        'id', 'item_id', 'requester_id', 'owner_id', 'offered_item_id', 'points_offered',
+        'message', 'status', 'created_at', 'updated_at', 'requester', 'requested_item', 'offered_item'
+    ), PUBLIC_OWNER_FIELDS),
+}
+
+# Fields read straight from the column of the same name
+ITEM_COLUMNS = (
+    'id', 'title', 'description', 'type', 'size', 'condition', 'points', 'status',
+    'listing_type', 'views', 'likes', 'processing_state', 'created_at', 'bill_path'
+)
+SWAP_COLUMNS = (
+    'id', 'item_id', 'requester_id', 'owner_id', 'offered_item_id', 'points_offered',
+    'message', 'status', 'created_at', 'updated_at'
+)
+IMAGE_FIELDS = frozenset(('images', 'image_variants', 'primary_image', 'primary_image_variants'))
+
+
+class InvalidProjection(ValueError):
+    pass
+
+
+def select_projection(projections, allowed, default, view=None, fields=None):
+    """Projection for the ?view= and ?fields= parameters of a request.
+
+    `allowed` lists the views the endpoint may serve, narrowest first. fields
+    picks a subset of the view's fields (of the widest allowed view when no
+    view is given).
+    """
+    if view and view not in allowed:
+        raise InvalidProjection(f"Unknown view '{view}'. Choose one of: {', '.join(allowed)}.")
+    projection = projections[view or (allowed[-1] if fields else default)]
+    if not fields:
+        return projection
+
+    requested = {name.strip() for name in fields.split(',') if name.strip()}
+    unknown = requested.difference(projection.fields)
+    if unknown:
+        raise InvalidProjection(f"Unknown fields: {', '.join(sorted(unknown))}.")
+    return projection._replace(fields=tuple(f for f in projection.fields if f in requested))
+
+
+def _with_id(fields):
+    # The id column tells a missing related row apart from one with empty fields
+    return fields if 'id' in fields else ('id',) + fields
+
+
+def _summary(row, prefix, fields):
+    if getattr(row, f'{prefix}id') is None:
+        return None
+    return {name: getattr(row, f'{prefix}{name}') for name in fields}
+
+
+class Serializer:
+    """Builds projection payloads for the app's models"""
+
+    def __init__(self, db, item, user, category, image, tag, swap_request):
+        self.db = db
+        self.item = item
+        self.user = user
+        self.category = category
+        self.image = image
+        self.tag = tag
+        self.swap_request = swap_request
+
+    def item_query(self, query, projection):
+        """Narrow an Item query to the columns the projection needs.
+
+        id and created_at are always selected, so the result can be keyset
+        paginated.
+        """
+        Item = self.item
+        fields = projection.fields
+        columns = [Item.id.label('id'), Item.created_at.label('created_at')]
+        columns += [
+            getattr(Item, name).label(name) for name in ITEM_COLUMNS
+            if name in fields and name not in ('id', 'created_at')
+        ]
+        if 'has_bill' in fields and 'bill_path' not in fields:
+            columns.append(Item.bill_path.label('bill_path'))
+        if 'category' in fields:
+            columns.append(self.category.name.label('category'))
+        if 'owner' in fields:
+            columns += [getattr(self.user, name).label(f'owner_{name}')
+                        for name in _with_id(projection.owner_fields)]
+
+        query = query.with_entities(*columns)
+        if 'category' in fields:
+            query = query.outerjoin(self.category, self.category.id == Item.category_id)
+        if 'owner' in fields:
+            query = query.outerjoin(self.user, self.user.id == Item.user_id)
+        return query
+
+    def items(self, rows, projection):
+        """Payload dicts for rows returned by an item_query()"""
+        fields = projection.fields
+        ids = [row.id for row in rows]
+        images = self._grouped(self.image, ids, self.image.id) if IMAGE_FIELDS.intersection(fields) else {}
+        tags = self._grouped(self.tag, ids, self.tag.id) if 'tags' in fields else {}
+        return [
+            self._item(row, projection, images.get(row.id, ()), tags.get(row.id, ()))
+            for row in rows
+        ]
+
+    def items_by_id(self, ids, projection):
+        """{item id: payload} for the given ids"""
+        if not ids:
+            return {}
+        query = self.db.session.query(self.item).filter(self.item.id.in_(ids))
+        rows = self.item_query(query, projection).all()
+        return {row.id: data for row, data in zip(rows, self.items(rows, projection))}
+
+    def _grouped(self, model, item_ids, order_by):
+        grouped = {}
+        if not item_ids:
+            return grouped
+        rows = self.db.session.execute(
+            select(*model.__table__.columns).where(model.item_id.in_(item_ids)).order_by(order_by)
+        )
+        for row in rows:
+            grouped.setdefault(row.item_id, []).append(row)
+        return grouped
+
+    def _item(self, row, projection, images, tags):
+        data = {}
+        for name in projection.fields:
+            if name == 'owner':
+                data['owner'] = _summary(row, 'owner_', projection.owner_fields)
+            elif name == 'images':
+                data['images'] = [img.image_path for img in images]
+            elif name == 'image_variants':
+                data['image_variants'] = [img.variants for img in images]
+            elif name == 'primary_image':
+                data['primary_image'] = next((img.image_path for img in images if img.is_primary), None)
+            elif name == 'primary_image_variants':
+                data['primary_image_variants'] = next((img.variants for img in images if img.is_primary), None)
+            elif name == 'tags':
+                data['tags'] = [tag.tag for tag in tags]
+            elif name == 'has_bill':
+                data['has_bill'] = bool(row.bill_path)
+            else:
+                data[name] = getattr(row, name)
+        return data
+
+    def swap_query(self, query, projection):
+        """Narrow a SwapRequest query to the columns the projection needs"""
+        SwapRequest = self.swap_request
+        columns = [getattr(SwapRequest, name).label(name) for name in SWAP_COLUMNS]
+        if 'requester' in projection.fields:
+            requester = aliased(self.user)
+            columns += [getattr(requester, name).label(f'requester_{name}')
+                        for name in _with_id(projection.owner_fields)]
+            return query.with_entities(*columns).outerjoin(requester, requester.id == SwapRequest.requester_id)
+        return query.with_entities(*columns)
+
+    def swap_requests(self, rows, projection):
+        """Payload dicts for rows returned by a swap_query()"""
+        fields = projection.fields
+        item_ids = set()
+        if 'requested_item' in fields:
+            item_ids.update(row.item_id for row in rows)
+        if 'offered_item' in fields:
+            item_ids.update(row.offered_item_id for row in rows if row.offered_item_id)
+        refs = self.items_by_id(item_ids, ITEM_PROJECTIONS['ref'])
+
+        results = []
+        for row in rows:
+            data = {}
+            for name in fields:
+                if name == 'requester':
+                    data['requester'] = _summary(row, 'requester_', projection.owner_fields)
+                elif name == 'requested_item':
+                    data['requested_item'] = refs.get(row.item_id)
+                elif name == 'offered_item':
+                    data['offered_item'] = refs.get(row.offered_item_id)
+                else:
+                    data[name] = getattr(row, name)
+            results.append(data)
+        return results
@@ -0,0 +1,146 @@
+"""
+Materialized admin dashboard counters, maintained by the routes that change
+them and periodically reconciled against the source tables
+"""
+import logging
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+# Source of truth for each counter; reconcile() recomputes from these.
+# Booleans are compared with a bound :true so the SQL runs on any backend.
+STAT_QUERIES = {
+    'pending_items': "SELECT COUNT(*) FROM item WHERE status = 'pending'",
+    'approved_items': "SELECT COUNT(*) FROM item WHERE status = 'approved'",
+    'total_users': 'SELECT COUNT(*) FROM "user" WHERE is_active = :true',
+    'total_swaps': "SELECT COUNT(*) FROM swap_request WHERE status = 'completed'",
+    'reports': "SELECT COUNT(*) FROM report WHERE status = 'pending'"
+}
+
+# Item statuses that have a counter of their own
+ITEM_STATUS_STATS = {
+    'pending': 'pending_items',
+    'approved': 'approved_items'
+}
+
+
+class AdminStats:
+    """One row per dashboard counter in the admin_stat table.
+
+    adjust() issues `UPDATE ... SET value = value + :delta` inside the caller's
+    transaction, so a counter changes exactly when the row it counts does.
+    Anything the routes do not track (reports, direct database edits) is
+    picked up by reconcile(), which runs every `interval` seconds.
+    """
+
+    table_name = 'admin_stat'
+
+    def __init__(self, app=None, db=None, interval=600.0):
+        self.interval = interval
+        self.app = None
+        self.db = db
+        self._thread = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        self.app = app
+        self.db = db
+        app.extensions['admin_stats'] = self
+
+    def create(self):
+        self.db.session.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {self.table_name} ("
+            "name VARCHAR(50) PRIMARY KEY, value INTEGER NOT NULL DEFAULT 0, "
+            "reconciled_at TIMESTAMP)"
+        ))
+        self.db.session.commit()
+
+    def adjust(self, **deltas):
+        """Apply counter deltas; runs inside the caller's transaction"""
+        for name, delta in deltas.items():
+            if delta:
+                self.db.session.execute(
+                    text(f"UPDATE {self.table_name} SET value = value + :delta WHERE name = :name"),
+                    {'name': name, 'delta': delta}
+                )
+
+    def item_status_changed(self, old_status, new_status):
+        """Move an item between the per-status counters (old_status None for a new item)"""
+        deltas = {}
+        if old_status in ITEM_STATUS_STATS:
+            deltas[ITEM_STATUS_STATS[old_status]] = -1
+        if new_status in ITEM_STATUS_STATS:
+            name = ITEM_STATUS_STATS[new_status]
+            deltas[name] = deltas.get(name, 0) + 1
+        self.adjust(**deltas)
+
+    def read(self):
+        """Current counter values: a single read of a handful of rows"""
+        self._ensure_started()
+        rows = self.db.session.execute(
+            text(f"SELECT name, value FROM {self.table_name}")
+        ).fetchall()
+        values = dict(rows)
+        if any(name not in values for name in STAT_QUERIES):
+            self.reconcile()
+            return self.read()
+        return {name: values[name] for name in STAT_QUERIES}
+
+    def reconcile(self):
+        """Recompute every counter from its source table; returns the drift found.
+
+        Each counter is rewritten with a single UPDATE ... SET value = (SELECT
+        COUNT(*) ...), so an adjust() committed concurrently is never lost.
+        """
+        now = datetime.utcnow()
+        before = dict(self.db.session.execute(
+            text(f"SELECT name, value FROM {self.table_name}")
+        ).fetchall())
+        for name, query in STAT_QUERIES.items():
+            if name not in before:
+                self.db.session.execute(
+                    text(f"INSERT INTO {self.table_name} (name, value) VALUES (:name, 0)"),
+                    {'name': name}
+                )
+            self.db.session.execute(
+                text(f"UPDATE {self.table_name} SET value = ({query}), reconciled_at = :now "
+                     "WHERE name = :name"),
+                {'name': name, 'now': now, 'true': True}
+            )
+        self.db.session.commit()
+
+        after = dict(self.db.session.execute(
+            text(f"SELECT name, value FROM {self.table_name}")
+        ).fetchall())
+        return {
+            name: after[name] - before[name]
+            for name in STAT_QUERIES if name in before and after[name] != before[name]
+        }
+
+    def _ensure_started(self):
+        if self.app is None or not self.interval:
+            return
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(
+                        target=self._run, name='admin-stats-reconciler', daemon=True
+                    )
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                with self.app.app_context():
+                    drift = self.reconcile()
+                if drift:
+                    logger.warning(f"Admin stats drifted and were corrected: {drift}")
+            except Exception as e:
+                logger.error(f"Reconciling admin stats failed: {str(e)}")
@@ -0,0 +1,89 @@
+"""
+Content-addressed storage for uploads: each distinct file is stored once,
+named by the SHA-256 of its bytes
+"""
+import hashlib
+import logging
+import os
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+
+def store_blob(stream, folder, file_ext):
+    """Write stream into folder under its content hash.
+
+    The hash is computed while the bytes are streamed to a temp file, which
+    is then hard-linked into place; linking fails if the blob already exists,
+    so concurrent uploads of the same content still store it exactly once.
+    A duplicate has its mtime renewed, like a fresh upload, so collect_garbage()
+    does not take it while the new reference is being committed.
+
+    Returns (filename, created) where created is False for a duplicate.
+    """
+    digest = hashlib.sha256()
+    tmp_path = os.path.join(folder, f".{uuid.uuid4().hex}.upload")
+    try:
+        with open(tmp_path, 'wb') as out:
+            for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+                out.write(chunk)
+            out.flush()
+            os.fsync(out.fileno())
+
+        filename = f"{digest.hexdigest()}.{file_ext}"
+        path = os.path.join(folder, filename)
+        try:
+            os.link(tmp_path, path)
+            created = True
+        except FileExistsError:
+            created = False
+            try:
+                # The blob may be an old orphan: renew its mtime so the GC
+                # grace period covers the row about to reference it again
+                os.utime(path)
+            except FileNotFoundError:
+                # Collected in the meantime; store this copy after all
+                os.link(tmp_path, path)
+                created = True
+        return filename, created
+    finally:
+        os.remove(tmp_path)
+
+
+def collect_garbage(folder, referenced, grace_seconds=3600, is_blob=None, related=None):
+    """Delete blobs in folder that nothing references any more.
+
+    referenced is the set of filenames still in use. Files younger than
+    grace_seconds are kept, since an upload in flight is on disk before the
+    row that references it is committed. is_blob(filename) filters out files
+    that are not blobs themselves (e.g. derivatives); related(filename) may
+    return extra paths to delete along with a blob. Temp files left behind
+    by interrupted uploads are removed too.
+
+    Returns the list of deleted blob filenames.
+    """
+    cutoff = time.time() - grace_seconds
+    deleted = []
+    for filename in os.listdir(folder):
+        path = os.path.join(folder, filename)
+        if filename in referenced or not os.path.isfile(path):
+            continue
+        if os.path.getmtime(path) > cutoff:
+            continue
+        if filename.endswith('.upload') and filename.startswith('.'):
+            os.remove(path)
+            continue
+        if filename.startswith('.') or (is_blob and not is_blob(filename)):
+            continue
+        for extra_path in (related(filename) if related else ()):
+            if os.path.exists(extra_path):
+                os.remove(extra_path)
+        os.remove(path)
+        deleted.append(filename)
+    if deleted:
+        logger.info(f"Removed {len(deleted)} unreferenced uploads from {folder}")
+    return deleted
@@ -0,0 +1,121 @@
+"""
+Visual similarity search over item photos, backed by the CLIP embedding
+index in ml/. The model is loaded once per process, on first use.
+"""
+import importlib.util
+import logging
+import os
+import sys
+import threading
+
+from jobs import JobQueue
+
+logger = logging.getLogger(__name__)
+
+# The ml/ folder sits next to backend/ and is not an installed package
+ML_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'ml')
+if ML_DIR not in sys.path:
+    sys.path.append(ML_DIR)
+
+
+class VisualSearch:
+    """Process-wide encoder + embedding index for item images.
+
+    Index keys are image filenames under UPLOAD_FOLDER/items, i.e. the same
+    values stored in ItemImage.image_path.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.index = None
+        self.image_folder = None
+        self.index_dir = None
+        self.enabled = False
+        self.queue = JobQueue('visual-embed')
+        self._lock = threading.RLock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        upload_folder = app.config['UPLOAD_FOLDER']
+        self.image_folder = os.path.join(upload_folder, 'items')
+        self.index_dir = app.config.setdefault(
+            'VISUAL_INDEX_DIR', os.path.join(upload_folder, 'embeddings')
+        )
+        dependencies = all(importlib.util.find_spec(m) for m in ('clip', 'torch', 'numpy'))
+        self.enabled = app.config.setdefault('VISUAL_SEARCH_ENABLED', dependencies)
+        self.queue.init_app(app)
+        app.extensions['visual_search'] = self
+
+    def get_index(self):
+        """Load the encoder and index on first use; later calls reuse them"""
+        with self._lock:
+            if self.index is None:
+                from embedding_index import ClipEncoder, EmbeddingIndex
+
+                encoder = ClipEncoder(self.app.config.get('VISUAL_MODEL', 'ViT-B/32'))
+                self.index = EmbeddingIndex(self.index_dir, encoder)
+                logger.info(f"Visual index loaded with {len(self.index)} images")
+            return self.index
+
+    def embed_async(self, filenames):
+        """Queue item images for embedding without waiting on the model"""
+        if self.enabled and filenames:
+            self.queue.submit(self.embed, list(filenames))
+
+    def embed(self, filenames):
+        from embedding_index import encode_paths
+
+        index = self.get_index()
+        paths = [os.path.join(self.image_folder, name) for name in filenames]
+        # Inference runs outside the lock so queries are not blocked behind it
+        vectors = encode_paths(index.encoder, paths)
+        with self._lock:
+            for name, vector in zip(filenames, vectors):
+                index.put(name, vector)
+            index.save()
+
+    def similar_to_image(self, filename, top_k=10):
+        """Nearest stored images to an already-uploaded item image"""
+        index = self.get_index()
+        if filename not in index:
+            try:
+                self.embed([filename])
+            except Exception as e:
+                # Missing or undecodable file: nothing to compare against
+                logger.warning(f"Could not embed {filename}: {str(e)}")
+        with self._lock:
+            entry = index.manifest['entries'].get(filename)
+            if entry is None:
+                return []
+            vector = index.matrix()[entry['row']]
+            return index.search(vector, top_k=top_k, exclude={filename})
+
+    def taste_scores(self, liked, candidates):
+        """{candidate filename: cosine similarity to the mean of the liked images}.
+
+        Images that are not embedded yet are skipped; nothing is encoded here.
+        """
+        from embedding_index import normalize
+
+        index = self.get_index()
+        with self._lock:
+            entries = index.manifest['entries']
+            rows = [entries[name]['row'] for name in liked if name in entries]
+            names = [name for name in candidates if name in entries]
+            if not rows or not names:
+                return {}
+            matrix = index.matrix()
+            taste = normalize(matrix[rows].mean(axis=0)).reshape(-1)
+            scores = matrix[[entries[name]['row'] for name in names]] @ taste
+        return dict(zip(names, scores.tolist()))
+
+    def similar_to_file(self, path, top_k=10):
+        """Nearest stored images to an arbitrary image file"""
+        from embedding_index import encode_paths
+
+        index = self.get_index()
+        vector = encode_paths(index.encoder, [path])[0]
+        with self._lock:
+            return index.search(vector, top_k=top_k)
@@ -0,0 +1,65 @@
+"""
+WSGI entry point for production servers:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+production_app() builds the app with create_app(), migrates the schema and
+warms per-process state once; with gunicorn's preload_app that happens in
+the master, and forked workers start from the warmed memory. init_worker()
+and shutdown_worker() are called from the gunicorn hooks in gunicorn.conf.py.
+"""
+import logging
+import os
+
+from app import create_app, create_tables, db, get_categories, visual_search
+
+logger = logging.getLogger(__name__)
+
+
+def production_app(preload=True):
+    """A new application, with the schema up to date and caches warm"""
+    application = create_app()
+    create_tables(application)
+    if preload:
+        warm(application)
+    return application
+
+
+def warm(application):
+    """Load state every worker would otherwise build on its first requests"""
+    # Fills the response cache; forked workers inherit the entry
+    with application.test_request_context('/api/categories'):
+        get_categories()
+    # The CLIP model is large, so share one copy between workers when asked to
+    if visual_search.enabled and os.environ.get('PRELOAD_VISUAL_MODEL') == '1':
+        index = visual_search.get_index()
+        index.encoder.load()
+        logger.info(f"Preloaded visual model for {len(index)} images")
+    # Connections must not cross a fork
+    with application.app_context():
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+def init_worker():
+    """Run in each worker right after the fork"""
+    with app.app_context():
+        for engine in db.engines.values():
+            # Forget connections inherited from the master without closing them under it
+            engine.dispose(close=False)
+
+
+def shutdown_worker(timeout=10.0):
+    """Write buffered counters and finish queued jobs before the worker exits"""
+    for name, queue in app.extensions.get('job_queues', {}).items():
+        if not queue.join(timeout=timeout):
+            # Journaled jobs are picked up again by the next worker
+            logger.warning(f"Job queue {name} still had {queue.pending} jobs at shutdown")
+    for name, counter in app.extensions.get('counters', {}).items():
+        try:
+            counter.flush()
+        except Exception as e:
+            logger.error(f"Flushing {name} at shutdown failed: {str(e)}")
+
+
+app = production_app(preload=os.environ.get('PRELOAD_STATE', '1') == '1')
@@ -4,3 +4,8 @@ import { twMerge } from "tailwind-merge"
 export function cn(...inputs: ClassValue[]) {
   return twMerge(clsx(inputs))
 }
+
+// URL of an item photo, preferring a smaller WebP derivative when the backend has made one
+export function itemImageUrl(image: string, variants?: Record<string, Record<string, string>> | null, size = "card") {
+  return `http://localhost:5001/uploads/items/${variants?.[size]?.webp ?? image}`
+}
@@ -0,0 +1,72 @@
+"""
+Recall vs latency benchmark for the similarity search backends.
+
+Generates a clustered synthetic gallery (CLIP embeddings of product photos
+are strongly clustered by category), then compares IVFSearch at several
+nprobe settings against the exact argpartition path.
+
+    python bench_ann.py --rows 200000 --dim 512 --queries 200
+"""
+import argparse
+import time
+
+import numpy as np
+
+from ann import ExactSearch, IVFSearch
+
+
+def synthetic_gallery(rows, dim, clusters, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, size=rows)
+    matrix = centers[labels] + 0.6 * rng.standard_normal((rows, dim)).astype(np.float32)
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+
+def time_queries(backend, queries, k, **kwargs):
+    results = []
+    started = time.perf_counter()
+    for query in queries:
+        results.append(backend.search(query, k, **kwargs)[0])
+    return results, (time.perf_counter() - started) / len(queries) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=None)
+    args = parser.parse_args()
+
+    print(f"📦 Building gallery: {args.rows} x {args.dim}")
+    matrix = synthetic_gallery(args.rows, args.dim, args.clusters)
+    rng = np.random.default_rng(1)
+    queries = matrix[rng.choice(args.rows, size=args.queries, replace=False)]
+    queries = queries + 0.1 * rng.standard_normal(queries.shape).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    exact = ExactSearch().build(matrix)
+    truth, exact_ms = time_queries(exact, queries, args.top_k)
+
+    started = time.perf_counter()
+    ivf = IVFSearch(nlist=args.nlist).build(matrix)
+    build_s = time.perf_counter() - started
+    print(f"⚙️  IVF build: {len(ivf.centroids)} lists in {build_s:.1f}s\n")
+
+    print(f"{'backend':<16}{'recall@' + str(args.top_k):>12}{'ms/query':>12}{'speedup':>10}")
+    print(f"{'exact':<16}{1.0:>12.3f}{exact_ms:>12.2f}{1.0:>10.1f}")
+    for nprobe in (1, 2, 4, 8, 16, 32, 64):
+        if nprobe > len(ivf.centroids):
+            break
+        found, ivf_ms = time_queries(ivf, queries, args.top_k, nprobe=nprobe)
+        recall = np.mean([
+            len(np.intersect1d(a, b)) / len(a) for a, b in zip(truth, found)
+        ])
+        print(f"{'ivf nprobe=' + str(nprobe):<16}{recall:>12.3f}{ivf_ms:>12.2f}{exact_ms / ivf_ms:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
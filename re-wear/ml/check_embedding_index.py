@@ -0,0 +1,110 @@
+"""
+Offline check of EmbeddingIndex with a stub encoder (no CLIP, no GPU).
+
+Builds a throwaway gallery of fake image files and checks that sync() only
+encodes new or changed files, refreshes touched-but-unchanged ones without
+encoding, removes deleted ones and reuses their rows, survives a reload
+from disk, and copes with entries put() without file metadata.
+
+    python check_embedding_index.py
+
+Exits non-zero if any check fails.
+"""
+import hashlib
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+from embedding_index import EmbeddingIndex
+
+
+class StubEncoder:
+    """Deterministic vectors derived from the file bytes"""
+
+    dim = 16
+
+    def __init__(self):
+        self.encoded = 0
+
+    def encode(self, paths):
+        self.encoded += len(paths)
+        vectors = []
+        for path in paths:
+            with open(path, "rb") as f:
+                seed = int.from_bytes(hashlib.sha1(f.read()).digest()[:8], "little")
+            vectors.append(np.random.default_rng(seed).standard_normal(self.dim))
+        return np.array(vectors, dtype=np.float32)
+
+
+def write_image(folder, name, content):
+    with open(os.path.join(folder, name), "wb") as f:
+        f.write(content)
+
+
+def main():
+    failures = []
+
+    def check(label, ok):
+        print(f"{'✅' if ok else '❌'} {label}")
+        if not ok:
+            failures.append(label)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        gallery = os.path.join(tmp, "gallery")
+        index_dir = os.path.join(tmp, "index")
+        os.makedirs(gallery)
+        for i in range(20):
+            write_image(gallery, f"img{i:02d}.jpg", f"image {i}".encode())
+        write_image(gallery, "notes.txt", b"not an image")
+
+        encoder = StubEncoder()
+        index = EmbeddingIndex(index_dir, encoder)
+        result = index.sync(gallery, batch_size=8)
+        check("first sync encodes every image", result["encoded"] == 20 and len(index) == 20)
+
+        result = index.sync(gallery)
+        check("second sync encodes nothing", result["encoded"] == 0)
+
+        path = os.path.join(gallery, "img03.jpg")
+        os.utime(path, (1, 1))
+        result = index.sync(gallery)
+        check("touched but unchanged file is not re-encoded",
+              result["encoded"] == 0 and index.manifest["entries"]["img03.jpg"]["mtime"] == 1)
+
+        write_image(gallery, "img04.jpg", b"image 4, edited")
+        result = index.sync(gallery)
+        check("changed file is re-encoded", result["encoded"] == 1)
+
+        row = index.manifest["entries"]["img05.jpg"]["row"]
+        os.remove(os.path.join(gallery, "img05.jpg"))
+        result = index.sync(gallery)
+        check("deleted file is removed", result["removed"] == 1 and "img05.jpg" not in index)
+        write_image(gallery, "img20.jpg", b"image 20")
+        index.sync(gallery)
+        check("new file reuses the freed row", index.manifest["entries"]["img20.jpg"]["row"] == row)
+
+        reloaded = EmbeddingIndex(index_dir, StubEncoder())
+        hits = reloaded.search_image(os.path.join(gallery, "img07.jpg"), top_k=3)
+        check("reloaded index finds an image as its own best match",
+              len(reloaded) == 20 and hits[0][0] == "img07.jpg" and hits[0][1] > 0.999)
+
+        # The backend stores uploads with put(key, vector) and no file metadata
+        write_image(gallery, "img21.jpg", b"image 21")
+        reloaded.put("img21.jpg", StubEncoder().encode([os.path.join(gallery, "img21.jpg")])[0])
+        try:
+            result = reloaded.sync(gallery)
+            check("sync handles entries put() without metadata",
+                  result["encoded"] == 1 and "mtime" in reloaded.manifest["entries"]["img21.jpg"])
+        except KeyError as e:
+            check(f"sync handles entries put() without metadata (KeyError {e})", False)
+
+    if failures:
+        print(f"\n{len(failures)} check(s) failed")
+        sys.exit(1)
+    print("\nAll embedding index checks passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,43 +1,38 @@
 import os
-import clip
-import torch
-import numpy as np
 from PIL import Image
-from tqdm import tqdm
 import matplotlib.pyplot as plt
 
-# Load model
-device = "cuda" if torch.cuda.is_available() else "cpu"
-model, preprocess = clip.load("ViT-B/32", device=device)
+from embedding_index import ClipEncoder, EmbeddingIndex
 
-def get_image_features(image_path):
-    image = preprocess(Image.open(image_path).convert("RGB")).unsqueeze(0).to(device)
-    with torch.no_grad():
-        return model.encode_image(image).cpu().numpy()
+# Model is loaded lazily, the first time an image actually needs encoding
+encoder = ClipEncoder("ViT-B/32")
 
-def show_similar_images(query_path, gallery_folder, top_k=5):
-    print(f"🔍 Query: {query_path}")
-    query_feature = get_image_features(query_path)
+def default_index_dir(gallery_folder):
+    return os.path.normpath(gallery_folder) + "_index"
+
+def print_progress(done, total, images_per_sec):
+    print(f"\r⚙️  Encoded {done}/{total} images ({images_per_sec:.1f} img/s)", end="", flush=True)
 
-    gallery_features = []
-    gallery_paths = []
+def show_similar_images(query_path, gallery_folder, top_k=5, index_dir=None, batch_size=32, workers=None, backend=None):
+    print(f"🔍 Query: {query_path}")
+    # backend: None for exact search, or e.g. ann.IVFSearch(nprobe=8) for large galleries
+    index = EmbeddingIndex(index_dir or default_index_dir(gallery_folder), encoder, backend=backend)
 
-    for filename in os.listdir(gallery_folder):
-        if filename.lower().endswith((".jpg", ".jpeg", ".png")):
-            path = os.path.join(gallery_folder, filename)
-            feature = get_image_features(path)
-            gallery_features.append(feature)
-            gallery_paths.append(path)
+    # Only new or changed gallery images are encoded
+    stats = index.sync(gallery_folder, batch_size=batch_size, workers=workers, progress=print_progress)
+    if stats['encoded']:
+        print()
+    print(f"📦 Index: {stats['total']} images ({stats['encoded']} encoded at "
+          f"{stats['images_per_sec']:.1f} img/s, {stats['removed']} removed)")
 
-    gallery_features = np.vstack(gallery_features)
-    similarities = (query_feature @ gallery_features.T).flatten()
-    top_indices = similarities.argsort()[-top_k:][::-1]
+    matches = index.search_image(query_path, top_k=top_k)
 
     print("\n🎯 Top Matches:")
     plt.figure(figsize=(15, 5))
-    for i, idx in enumerate(top_indices):
-        print(f"{i+1}: {gallery_paths[idx]} (score: {(similarities[idx]/2.0):.3f})")
-        img = Image.open(gallery_paths[idx])
+    for i, (key, score) in enumerate(matches):
+        path = os.path.join(gallery_folder, key)
+        print(f"{i+1}: {path} (score: {score:.3f})")
+        img = Image.open(path)
         plt.subplot(1, top_k, i+1)
         plt.imshow(img)
         plt.axis("off")
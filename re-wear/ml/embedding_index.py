@@ -0,0 +1,311 @@
+"""
+Persistent image embedding index for visual similarity search.
+
+Vectors live in a flat, memory-mapped matrix (vectors.bin) and a JSON
+manifest maps each image key to its row together with the file's mtime,
+size and SHA-1, so re-syncing a folder only encodes new or changed images.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from ann import ExactSearch
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+MANIFEST_NAME = "manifest.json"
+VECTORS_NAME = "vectors.bin"
+
+
+class ClipEncoder:
+    """Encodes images with OpenAI CLIP; the model is loaded on first use.
+
+    Any object with a ``dim`` attribute and an ``encode(paths)`` method that
+    returns an (n, dim) array can be used in its place, e.g. a stub encoder
+    for running the index offline. Encoders that also provide
+    ``prepare(path)`` and ``encode_batch(prepared)`` let the ingestion
+    pipeline decode and preprocess on worker threads.
+    """
+
+    def __init__(self, model_name="ViT-B/32", device=None):
+        self.model_name = model_name
+        self.device = device
+        self.model = None
+        self.preprocess = None
+        self._load_lock = threading.Lock()
+
+    def load(self):
+        with self._load_lock:
+            if self.model is None:
+                import clip
+                import torch
+
+                if self.device is None:
+                    self.device = "cuda" if torch.cuda.is_available() else "cpu"
+                self.model, self.preprocess = clip.load(self.model_name, device=self.device)
+        return self
+
+    @property
+    def dim(self):
+        return self.load().model.visual.output_dim
+
+    def prepare(self, path):
+        """Decode and preprocess one image; safe to call from worker threads"""
+        from PIL import Image
+
+        self.load()
+        with Image.open(path) as img:
+            return self.preprocess(img.convert("RGB"))
+
+    def encode_batch(self, prepared):
+        import torch
+
+        batch = torch.stack(prepared).to(self.device)
+        with torch.no_grad():
+            return self.model.encode_image(batch).float().cpu().numpy()
+
+    def encode(self, paths):
+        return self.encode_batch([self.prepare(path) for path in paths])
+
+
+def encode_paths(encoder, paths):
+    """Encode a small list of paths on the calling thread"""
+    if hasattr(encoder, "prepare") and hasattr(encoder, "encode_batch"):
+        return encoder.encode_batch([encoder.prepare(path) for path in paths])
+    return encoder.encode(paths)
+
+
+def encode_stream(encoder, paths, batch_size=32, workers=None, max_pending=None):
+    """Yield (paths, vectors) batches, decoding images on a thread pool.
+
+    At most max_pending images are decoded ahead of the encoder, so memory
+    stays bounded however large the input is. Images that fail to decode are
+    logged and skipped.
+    """
+    prepare = getattr(encoder, "prepare", None)
+    if prepare is None or not hasattr(encoder, "encode_batch"):
+        for start in range(0, len(paths), batch_size):
+            chunk = paths[start:start + batch_size]
+            yield chunk, encoder.encode(chunk)
+        return
+
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or batch_size * 2
+    pending = deque()
+    remaining = iter(paths)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="image-decode") as pool:
+        def fill():
+            while len(pending) < max_pending:
+                path = next(remaining, None)
+                if path is None:
+                    return
+                pending.append((path, pool.submit(prepare, path)))
+
+        fill()
+        batch_paths, batch_items = [], []
+        while pending:
+            path, future = pending.popleft()
+            fill()
+            try:
+                batch_items.append(future.result())
+                batch_paths.append(path)
+            except Exception as e:
+                logger.warning(f"Skipping unreadable image {path}: {str(e)}")
+            if len(batch_items) == batch_size:
+                yield batch_paths, encoder.encode_batch(batch_items)
+                batch_paths, batch_items = [], []
+        if batch_items:
+            yield batch_paths, encoder.encode_batch(batch_items)
+
+
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def file_sha1(path, chunk_size=1 << 20):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class EmbeddingIndex:
+    """Normalized image embeddings keyed by a caller-chosen string (usually a filename).
+
+    Queries go through a search backend from ann.py (exact by default); the
+    backend is rebuilt lazily on the first search after the index changes.
+    """
+
+    def __init__(self, index_dir, encoder, dtype="float32", backend=None):
+        self.index_dir = index_dir
+        self.encoder = encoder
+        self.backend = backend or ExactSearch()
+        self._backend_stale = True
+        self.manifest_path = os.path.join(index_dir, MANIFEST_NAME)
+        self.vectors_path = os.path.join(index_dir, VECTORS_NAME)
+        os.makedirs(index_dir, exist_ok=True)
+
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path) as f:
+                self.manifest = json.load(f)
+        else:
+            self.manifest = {"dim": None, "dtype": dtype, "rows": 0, "entries": {}, "free": []}
+        self.dtype = np.dtype(self.manifest["dtype"])
+
+    def __len__(self):
+        return len(self.manifest["entries"])
+
+    def __contains__(self, key):
+        return key in self.manifest["entries"]
+
+    @property
+    def dim(self):
+        if self.manifest["dim"] is None:
+            self.manifest["dim"] = int(self.encoder.dim)
+        return self.manifest["dim"]
+
+    def save(self):
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.manifest, f)
+        os.replace(tmp_path, self.manifest_path)
+
+    def matrix(self):
+        """Read-only memory map of all rows, including free (zeroed) ones"""
+        rows = self.manifest["rows"]
+        if rows == 0:
+            return np.zeros((0, self.dim), dtype=self.dtype)
+        return np.memmap(self.vectors_path, dtype=self.dtype, mode="r", shape=(rows, self.dim))
+
+    def _write_row(self, row, vector):
+        mode = "r+b" if os.path.exists(self.vectors_path) else "w+b"
+        with open(self.vectors_path, mode) as f:
+            f.seek(row * self.dim * self.dtype.itemsize)
+            f.write(np.asarray(vector, dtype=self.dtype).tobytes())
+
+    def _allocate_row(self):
+        if self.manifest["free"]:
+            return self.manifest["free"].pop()
+        row = self.manifest["rows"]
+        self.manifest["rows"] += 1
+        return row
+
+    def put(self, key, vector, meta=None):
+        """Store a vector under key, reusing the key's row if it already has one"""
+        entry = self.manifest["entries"].get(key)
+        row = entry["row"] if entry else self._allocate_row()
+        self._write_row(row, normalize(vector).reshape(-1))
+        self.manifest["entries"][key] = dict(meta or {}, row=row)
+        self._backend_stale = True
+
+    def remove(self, key):
+        entry = self.manifest["entries"].pop(key, None)
+        if entry is not None:
+            self._write_row(entry["row"], np.zeros(self.dim, dtype=self.dtype))
+            self.manifest["free"].append(entry["row"])
+            self._backend_stale = True
+
+    def _file_meta(self, path):
+        stat = os.stat(path)
+        return {"mtime": stat.st_mtime, "size": stat.st_size}
+
+    def stale_files(self, folder):
+        """Scan folder and return (paths by key, keys to encode, keys that no longer exist)"""
+        present = {}
+        for filename in sorted(os.listdir(folder)):
+            if filename.lower().endswith(IMAGE_EXTENSIONS):
+                present[filename] = os.path.join(folder, filename)
+
+        to_encode = []
+        for key, path in present.items():
+            entry = self.manifest["entries"].get(key)
+            meta = self._file_meta(path)
+            # Entries put() without file metadata are re-encoded once to record it
+            if entry and entry.get("mtime") == meta["mtime"] and entry.get("size") == meta["size"]:
+                continue
+            if entry and entry.get("size") == meta["size"] and entry.get("sha1") == file_sha1(path):
+                # Touched but unchanged: just refresh the recorded mtime
+                entry["mtime"] = meta["mtime"]
+                continue
+            to_encode.append(key)
+
+        removed = [key for key in self.manifest["entries"] if key not in present]
+        return present, to_encode, removed
+
+    def sync(self, folder, batch_size=32, workers=None, max_pending=None, progress=None):
+        """Bring the index in line with the images in folder.
+
+        The manifest is saved after every batch, so an interrupted sync resumes
+        where it stopped. progress, if given, is called as
+        progress(done, total, images_per_sec) after each batch.
+
+        Returns a dict with the number of encoded, removed and total entries
+        and the encoding throughput in images/sec.
+        """
+        present, to_encode, removed = self.stale_files(folder)
+        for key in removed:
+            self.remove(key)
+        self.save()
+
+        keys_by_path = {present[key]: key for key in to_encode}
+        started = time.perf_counter()
+        done = 0
+        for paths, vectors in encode_stream(
+            self.encoder, [present[key] for key in to_encode],
+            batch_size=batch_size, workers=workers, max_pending=max_pending
+        ):
+            for path, vector in zip(paths, vectors):
+                meta = self._file_meta(path)
+                meta["sha1"] = file_sha1(path)
+                self.put(keys_by_path[path], vector, meta)
+            self.save()
+            done += len(paths)
+            if progress:
+                progress(done, len(to_encode), done / max(time.perf_counter() - started, 1e-9))
+
+        elapsed = time.perf_counter() - started
+        return {
+            "encoded": done,
+            "removed": len(removed),
+            "total": len(self),
+            "images_per_sec": done / elapsed if done else 0.0
+        }
+
+    def search(self, query_vector, top_k=5, exclude=()):
+        """Return [(key, cosine score)] for the top_k most similar entries"""
+        keys_by_row = {entry["row"]: key for key, entry in self.manifest["entries"].items()}
+        if not keys_by_row:
+            return []
+        if self._backend_stale:
+            self.backend.build(self.matrix())
+            self._backend_stale = False
+
+        # Over-fetch so free rows and excluded keys can't starve the result
+        query = normalize(query_vector).reshape(-1)
+        k = top_k + len(exclude) + len(self.manifest["free"])
+        rows, scores = self.backend.search(query, k)
+
+        results = []
+        for row, score in zip(rows, scores):
+            key = keys_by_row.get(int(row))
+            if key is None or key in exclude:
+                continue
+            results.append((key, float(score)))
+            if len(results) == top_k:
+                break
+        return results
+
+    def search_image(self, image_path, top_k=5, exclude=()):
+        return self.search(encode_paths(self.encoder, [image_path])[0], top_k, exclude)